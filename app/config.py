@@ -9,6 +9,7 @@ load_dotenv()
 
 # Base paths
 BASE_DIR = Path(__file__).parent.parent
+ENV_FILE = BASE_DIR / ".env"
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
@@ -21,21 +22,175 @@ def _safe_int(value: str, default: int = 0) -> int:
         return default
 
 
+def _safe_float(value: str, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def _safe_bool(value: str, default: bool = False) -> bool:
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 TG_API_ID = _safe_int(os.getenv("TG_API_ID", "0"))
 TG_API_HASH = os.getenv("TG_API_HASH", "")
 TG_CHANNEL = os.getenv("TG_CHANNEL", "@D_wusun")
+# TG_CHANNEL may list several channels, comma separated; more can be added at
+# runtime through the WebUI (stored in the tg_channels table)
+TG_CHANNELS = [channel.strip() for channel in TG_CHANNEL.split(",") if channel.strip()]
+# Seconds between checks for channels added at runtime (also flushes counters)
+TG_CHANNEL_REFRESH = _safe_float(os.getenv("TG_CHANNEL_REFRESH", "60"), 60.0)
 TG_SESSION_NAME = os.getenv("TG_SESSION", "quarkflow")
 
+# History backfill: messages per ingestion batch, and seconds to wait between
+# history requests during automatic catch-up (the backfill CLI doesn't wait)
+BACKFILL_BATCH_SIZE = _safe_int(os.getenv("BACKFILL_BATCH_SIZE", "100"), 100)
+BACKFILL_WAIT_TIME = _safe_float(os.getenv("BACKFILL_WAIT_TIME", "1"), 1.0)
+
+# Notifications go to the account's Saved Messages. Saves and failures are
+# summarised every NOTIFY_DIGEST_INTERVAL seconds (0 disables the digest).
+NOTIFY_DIGEST_INTERVAL = _safe_float(
+    os.getenv("NOTIFY_DIGEST_INTERVAL", "3600"), 3600.0
+)
+NOTIFY_QUEUE_SIZE = _safe_int(os.getenv("NOTIFY_QUEUE_SIZE", "100"), 100)
+# Worker-only processes never open the Telegram session; their alerts are
+# stored in the DB and sent by the main process every NOTIFY_RELAY_INTERVAL s
+NOTIFY_RELAY_INTERVAL = _safe_float(os.getenv("NOTIFY_RELAY_INTERVAL", "10"), 10.0)
+
+# Live settings: .env and the DB settings table are checked this often (in
+# seconds) and changes to the cookie, poll interval, concurrency and target
+# folder are applied without a restart, see app.settings
+CONFIG_WATCH_INTERVAL = _safe_float(os.getenv("CONFIG_WATCH_INTERVAL", "5"), 5.0)
+
+
+def clean_cookie(value: str) -> str:
+    """Strip non-ASCII characters, which are invalid in an HTTP header."""
+    return "".join(c for c in (value or "").strip() if ord(c) < 128)
+
+
 # Quark configuration
-_raw_cookie = os.getenv("QUARK_COOKIE", "")
-QUARK_COOKIE = "".join(c for c in _raw_cookie if ord(c) < 128)
+QUARK_COOKIE = clean_cookie(os.getenv("QUARK_COOKIE", ""))
+# Extra Quark accounts, see app.quark.pool. QUARK_ACCOUNTS names them, comma
+# separated; each reads QUARK_COOKIE_<NAME> and optionally
+# TARGET_FOLDER_NAME_<NAME> and WORKER_CONCURRENT_TASKS_<NAME> (unset: same
+# as the main account). QUARK_COOKIE stays the account called "default".
+QUARK_ACCOUNTS = {
+    name: {
+        "cookie": clean_cookie(os.getenv(f"QUARK_COOKIE_{name.upper()}", "")),
+        "target_folder": os.getenv(f"TARGET_FOLDER_NAME_{name.upper()}"),
+        "concurrency": _safe_int(os.getenv(f"WORKER_CONCURRENT_TASKS_{name.upper()}")),
+    }
+    for name in dict.fromkeys(
+        name.strip().lower()
+        for name in os.getenv("QUARK_ACCOUNTS", "").split(",")
+        if name.strip() and name.strip().lower() != "default"
+    )
+}
+# Seconds an account whose cookie expired gets no saves before it is tried
+# again; a new cookie for it ends the quarantine at once
+QUARK_ACCOUNT_QUARANTINE = _safe_float(
+    os.getenv("QUARK_ACCOUNT_QUARANTINE", "3600"), 3600.0
+)
+# API hosts; point both at a stand-in server (bench/mock_quark.py) to test offline
+QUARK_BASE_URL_PC = os.getenv("QUARK_BASE_URL_PC", "https://drive-h.quark.cn")
+QUARK_BASE_URL_APP = os.getenv("QUARK_BASE_URL_APP", "https://drive-m.quark.cn")
+
+# Quark HTTP connection pool
+QUARK_HTTP2 = _safe_bool(os.getenv("QUARK_HTTP2"), True)
+QUARK_MAX_CONNECTIONS = _safe_int(os.getenv("QUARK_MAX_CONNECTIONS", "20"), 20)
+QUARK_MAX_KEEPALIVE = _safe_int(os.getenv("QUARK_MAX_KEEPALIVE", "10"), 10)
+QUARK_KEEPALIVE_EXPIRY = _safe_float(os.getenv("QUARK_KEEPALIVE_EXPIRY", "60"), 60.0)
+QUARK_CONNECT_TIMEOUT = _safe_float(os.getenv("QUARK_CONNECT_TIMEOUT", "10"), 10.0)
+QUARK_TIMEOUT = _safe_float(os.getenv("QUARK_TIMEOUT", "30"), 30.0)
+
+# Quark API rate limits (requests/second per endpoint, 0 = unlimited)
+QUARK_RATE_TOKEN = _safe_float(os.getenv("QUARK_RATE_TOKEN", "2"), 2.0)
+QUARK_RATE_SAVE = _safe_float(os.getenv("QUARK_RATE_SAVE", "1"), 1.0)
+QUARK_RATE_LIST = _safe_float(os.getenv("QUARK_RATE_LIST", "2"), 2.0)
+QUARK_RATE_TASK = _safe_float(os.getenv("QUARK_RATE_TASK", "5"), 5.0)
+QUARK_RATE_BURST = _safe_int(os.getenv("QUARK_RATE_BURST", "3"), 3)
+# Adaptive concurrency grows while requests finish under the target latency
+# and halves on throttling (HTTP 429/5xx or a "too frequent" API error)
+QUARK_TARGET_LATENCY = _safe_float(os.getenv("QUARK_TARGET_LATENCY", "3"), 3.0)
+QUARK_THROTTLE_PENALTY = _safe_float(os.getenv("QUARK_THROTTLE_PENALTY", "5"), 5.0)
+QUARK_THROTTLE_COOLDOWN = _safe_float(os.getenv("QUARK_THROTTLE_COOLDOWN", "10"), 10.0)
 
 # Database
-DB_PATH = DATA_DIR / "quarkflow.db"
+DB_PATH = Path(os.getenv("DB_PATH") or DATA_DIR / "quarkflow.db")
+DB_BUSY_TIMEOUT_MS = _safe_int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"), 5000)
+# Page cache per connection (KiB) and memory-mapped I/O window (bytes), kept
+# small enough for the 256M container limit.
+DB_CACHE_SIZE_KB = _safe_int(os.getenv("DB_CACHE_SIZE_KB", "8192"), 8192)
+DB_MMAP_SIZE = _safe_int(os.getenv("DB_MMAP_SIZE", "67108864"), 67108864)
+DB_STATEMENT_CACHE = _safe_int(os.getenv("DB_STATEMENT_CACHE", "128"), 128)
+# Threads serving reads for app.db_async; writes always use one writer thread
+DB_READ_THREADS = _safe_int(os.getenv("DB_READ_THREADS", "2"), 2)
+# Messages arriving within this window are ingested in one transaction (0 = off)
+INGEST_BATCH_WINDOW_MS = _safe_int(os.getenv("INGEST_BATCH_WINDOW_MS", "5"), 5)
+INGEST_BATCH_MAX = _safe_int(os.getenv("INGEST_BATCH_MAX", "100"), 100)
+# In-memory dedup front: recently seen message keys and share ids (entries per
+# LRU, 0 = off), and a Bloom filter over every processed message key sized for
+# DEDUP_BLOOM_CAPACITY keys (0 = off). The defaults take roughly 20 MB.
+DEDUP_CACHE_SIZE = _safe_int(os.getenv("DEDUP_CACHE_SIZE", "50000"), 50000)
+DEDUP_BLOOM_CAPACITY = _safe_int(os.getenv("DEDUP_BLOOM_CAPACITY", "1000000"), 1000000)
+DEDUP_BLOOM_ERROR_RATE = _safe_float(os.getenv("DEDUP_BLOOM_ERROR_RATE", "0.01"), 0.01)
+# Retention, see app.tasks.retention. Message-dedup rows older than
+# RETENTION_MESSAGE_DAYS are deleted (a channel's newest row is always kept);
+# saved/failed/duplicate/cancelled shares untouched for RETENTION_SHARE_DAYS
+# move to the archive, whose rows go after RETENTION_ARCHIVE_DAYS. Archived
+# share ids stay deduplicated either way. 0 disables a step.
+RETENTION_MESSAGE_DAYS = _safe_float(os.getenv("RETENTION_MESSAGE_DAYS", "90"), 90.0)
+RETENTION_SHARE_DAYS = _safe_float(os.getenv("RETENTION_SHARE_DAYS", "30"), 30.0)
+RETENTION_ARCHIVE_DAYS = _safe_float(os.getenv("RETENTION_ARCHIVE_DAYS", "0"), 0.0)
+RETENTION_INTERVAL = _safe_float(os.getenv("RETENTION_INTERVAL", "3600"), 3600.0)
+# Rows per write job and pages per incremental vacuum step, kept small so
+# ingestion writes interleave with the cleanup
+RETENTION_BATCH_SIZE = _safe_int(os.getenv("RETENTION_BATCH_SIZE", "500"), 500)
+RETENTION_VACUUM_PAGES = _safe_int(os.getenv("RETENTION_VACUUM_PAGES", "256"), 256)
+
+# Per-share traces (queue wait, Quark calls, DB writes) are kept for the most
+# recent TRACE_MAX_SPANS spans, see /api/traces
+TRACE_ENABLED = _safe_bool(os.getenv("TRACE_ENABLED", "true"), True)
+TRACE_MAX_SPANS = _safe_int(os.getenv("TRACE_MAX_SPANS", "50000"), 50000)
 
 # Worker settings
-WORKER_POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", "10"))  # seconds
+# New shares wake the worker directly; polling is only a recovery fallback
+WORKER_POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", "60"))  # seconds
+# Upper bound on in-flight saves; the adaptive limit starts at the minimum
 WORKER_CONCURRENT_TASKS = int(os.getenv("WORKER_CONCURRENT_TASKS", "1"))
+WORKER_MIN_CONCURRENCY = _safe_int(os.getenv("WORKER_MIN_CONCURRENCY", "1"), 1)
+# Most pending rows claimed per DB round-trip; only the free slots are claimed
+WORKER_BATCH_SIZE = _safe_int(os.getenv("WORKER_BATCH_SIZE", "50"), 50)
+# Claimed shares are leased to one worker; expired leases are reclaimed
+WORKER_LEASE_SECONDS = _safe_int(os.getenv("WORKER_LEASE_SECONDS", "120"), 120)
+# Retryable failures back off exponentially (with jitter) up to the max delay;
+# after WORKER_MAX_ATTEMPTS failed tries the share is marked failed for good
+WORKER_MAX_ATTEMPTS = _safe_int(os.getenv("WORKER_MAX_ATTEMPTS", "5"), 5)
+WORKER_RETRY_BASE_DELAY = _safe_float(os.getenv("WORKER_RETRY_BASE_DELAY", "30"), 30.0)
+WORKER_RETRY_MAX_DELAY = _safe_float(
+    os.getenv("WORKER_RETRY_MAX_DELAY", "3600"), 3600.0
+)
+# Seconds to let in-flight saves finish on shutdown before cancelling them
+WORKER_SHUTDOWN_TIMEOUT = _safe_float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "20"), 20.0)
+
+# Save task tracker: submitted saves are polled until the server-side task
+# finishes, backing off from the initial to the max interval per task
+TRACKER_BATCH_SIZE = _safe_int(os.getenv("TRACKER_BATCH_SIZE", "20"), 20)
+TRACKER_POLL_INTERVAL = _safe_float(os.getenv("TRACKER_POLL_INTERVAL", "5"), 5.0)
+TRACKER_INITIAL_DELAY = _safe_float(os.getenv("TRACKER_INITIAL_DELAY", "2"), 2.0)
+TRACKER_MAX_DELAY = _safe_float(os.getenv("TRACKER_MAX_DELAY", "300"), 300.0)
+TRACKER_MAX_CHECKS = _safe_int(os.getenv("TRACKER_MAX_CHECKS", "30"), 30)
 
-# Optional: Target folder name for organizing saved files
+# Optional: Target folder for organizing saved files. May be a nested path
+# such as "Archive/2026/Movies"; missing folders are created if enabled.
 TARGET_FOLDER_NAME = os.getenv("TARGET_FOLDER_NAME", "")
+TARGET_FOLDER_CREATE = _safe_bool(os.getenv("TARGET_FOLDER_CREATE", "false"), False)
+
+# Skip files already saved from other shares (matched by name and size)
+CONTENT_DEDUP = _safe_bool(os.getenv("CONTENT_DEDUP", "true"), True)
+
+# Seconds a cached drive folder listing stays valid
+DRIVE_TREE_TTL = _safe_float(os.getenv("DRIVE_TREE_TTL", "600"), 600.0)
@@ -0,0 +1,9 @@
+"""Point the tests at a throwaway database instead of data/quarkflow.db."""
+
+import os
+import tempfile
+
+# Set before any test module imports app.config, which reads it once
+os.environ["DB_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="quarkflow-test-"), "quarkflow.db"
+)
@@ -1,29 +1,114 @@
 """SQLite database layer for QuarkFlow."""
 
 import sqlite3
+import json
 import logging
+import threading
+import time
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 from contextlib import contextmanager
 
-from app.config import DB_PATH
+from app.config import (
+    DB_PATH,
+    TRACE_MAX_SPANS,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_STATEMENT_CACHE,
+)
 
 logger = logging.getLogger(__name__)
 
+# Callbacks fired after a new share row is committed, see add_share_listener()
+_share_listeners: list[Callable[[str], None]] = []
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3.Connection subclass so open connections can be tracked weakly."""
+
+
+# One persistent connection per thread. Connections die with their thread;
+# close_db() bumps the generation so surviving threads reconnect lazily.
+_local = threading.local()
+_connections: "weakref.WeakSet[_Connection]" = weakref.WeakSet()
+_connections_lock = threading.Lock()
+_generation = 0
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_STATEMENT_CACHE,
+        check_same_thread=False,
+        factory=_Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    # Takes effect only on a new, empty database; existing ones need
+    # vacuum() once, see app.tasks.retention
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _get_connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = _connect()
+        _local.conn = conn
+        _local.generation = _generation
+        with _connections_lock:
+            _connections.add(conn)
+    return conn
+
 
 @contextmanager
 def get_db():
-    """Get database connection with context manager."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    Get this thread's persistent connection with context manager.
+
+    Commits on success and rolls back on error. Blocks must not be nested,
+    since the inner commit would end the outer transaction.
+    """
+    conn = _get_connection()
     try:
         yield conn
         conn.commit()
     except Exception:
         conn.rollback()
         raise
-    finally:
-        conn.close()
+
+
+def close_db():
+    """Close every open connection, e.g. on shutdown or before removing the file."""
+    global _generation
+
+    with _connections_lock:
+        _generation += 1
+        connections = list(_connections)
+        _connections.clear()
+
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to close connection: {e}")
+
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: dict[str, str]):
+    """Add columns missing from an existing table (lightweight migration)."""
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"Migrated {table}: added column {name}")
 
 
 def init_db():
@@ -38,6 +123,22 @@ def init_db():
             )
         """)
 
+        # Watched channels. peer_id is the resolved (marked) Telegram id that
+        # tg_messages is keyed by; the counters are running totals.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tg_channels (
+                channel TEXT PRIMARY KEY,
+                peer_id INTEGER,
+                title TEXT,
+                enabled INTEGER NOT NULL DEFAULT 1,
+                messages INTEGER NOT NULL DEFAULT 0,
+                link_messages INTEGER NOT NULL DEFAULT 0,
+                new_shares INTEGER NOT NULL DEFAULT 0,
+                duplicate_shares INTEGER NOT NULL DEFAULT 0,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
         conn.execute("""
             CREATE TABLE IF NOT EXISTS quark_shares (
                 share_id TEXT PRIMARY KEY,
@@ -49,9 +150,149 @@ def init_db():
             )
         """)
 
+        # Lease and retry columns for claim_tasks(). Times are unix timestamps;
+        # attempts counts failed tries, and a pending share is not claimed
+        # before next_attempt_at. For 'submitted' shares next_attempt_at is
+        # when the save task is checked next, and account is the Quark
+        # account (see app.quark.pool) the save went to.
+        _ensure_columns(
+            conn,
+            "quark_shares",
+            {
+                "owner": "TEXT",
+                "lease_expires_at": "REAL",
+                "attempts": "INTEGER NOT NULL DEFAULT 0",
+                "next_attempt_at": "REAL NOT NULL DEFAULT 0",
+                "task_id": "TEXT",
+                "task_checks": "INTEGER NOT NULL DEFAULT 0",
+                "content": "TEXT",
+                "dedup_files": "INTEGER NOT NULL DEFAULT 0",
+                "dedup_bytes": "INTEGER NOT NULL DEFAULT 0",
+                "passcode": "TEXT",
+                "account": "TEXT",
+            },
+        )
+
+        # Fingerprints of files already saved to the drive, see
+        # record_share_content(). A share's own files are indexed once it is saved.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS content_index (
+                fingerprint TEXT PRIMARY KEY,
+                share_id TEXT NOT NULL,
+                file_name TEXT,
+                size INTEGER,
+                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Live settings overriding .env, see app.settings. updated_at is a
+        # unix timestamp, so watchers only read rows changed since their last look.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+        # Messages from notifiers without a Telegram client (worker-only
+        # processes), sent and deleted by the one that has it, see
+        # app.utils.notifier
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY,
+                message TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+        # History backfills requested by the CLI, run by the listener that
+        # holds the Telegram session and deleted once done
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_requests (
+                id INTEGER PRIMARY KEY,
+                channel TEXT NOT NULL,
+                from_id INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+
+        # Spans of per-share traces, see app.utils.tracing. Capped at
+        # TRACE_MAX_SPANS rows by record_spans(); times are unix timestamps.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS trace_spans (
+                id INTEGER PRIMARY KEY,
+                share_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                duration_ms REAL NOT NULL,
+                depth INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+
         conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_quark_shares_status
-            ON quark_shares(status)
+            CREATE INDEX IF NOT EXISTS idx_trace_spans_share
+            ON trace_spans(share_id, started_at)
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_trace_spans_started
+            ON trace_spans(started_at)
+        """)
+
+        # Terminal shares moved out of quark_shares by archive_shares(), with
+        # last_error truncated. share_keys keeps every archived share id, also
+        # after purge_archive(), so archived shares stay deduplicated.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS share_archive (
+                share_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                file_id TEXT,
+                last_error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                dedup_files INTEGER NOT NULL DEFAULT 0,
+                dedup_bytes INTEGER NOT NULL DEFAULT 0,
+                first_seen TIMESTAMP,
+                updated_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS share_keys (
+                share_id TEXT PRIMARY KEY
+            ) WITHOUT ROWID
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_share_archive_archived
+            ON share_archive(archived_at)
+        """)
+
+        # Every status lookup is served by a (status, ...) index below, so a
+        # plain status index would only slow down status updates
+        conn.execute("DROP INDEX IF EXISTS idx_quark_shares_status")
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quark_shares_lease
+            ON quark_shares(status, lease_expires_at)
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quark_shares_due
+            ON quark_shares(status, next_attempt_at)
+        """)
+
+        # Keyset pagination for list_shares(), with and without a status filter
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quark_shares_updated
+            ON quark_shares(updated_at, share_id)
+        """)
+
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quark_shares_status_updated
+            ON quark_shares(status, updated_at, share_id)
         """)
 
     logger.info("Database initialized")
@@ -75,6 +316,10 @@ def insert_tg_message(channel_id: str, message_id: int) -> bool:
         return False
 
 
+# Keeps archived share ids from being queued again
+_NOT_ARCHIVED = "WHERE NOT EXISTS (SELECT 1 FROM share_keys WHERE share_id = ?)"
+
+
 def insert_share_pending(share_id: str) -> bool:
     """
     Insert new share link with pending status.
@@ -83,16 +328,248 @@ def insert_share_pending(share_id: str) -> bool:
     """
     try:
         with get_db() as conn:
-            conn.execute(
-                "INSERT INTO quark_shares (share_id, status) VALUES (?, 'pending')",
-                (share_id,),
-            )
-        logger.info(f"New share: {share_id}")
-        return True
+            inserted = conn.execute(
+                f"INSERT INTO quark_shares (share_id, status) SELECT ?, 'pending' {_NOT_ARCHIVED}",
+                (share_id, share_id),
+            ).rowcount
     except sqlite3.IntegrityError:
+        inserted = 0
+    if not inserted:
         logger.debug(f"Share already exists: {share_id}")
         return False
 
+    logger.info(f"New share: {share_id}")
+    _notify_new_share(share_id)
+    return True
+
+
+def ingest_messages(
+    messages: list[tuple[str, int, list]],
+) -> list[Optional[list[str]]]:
+    """
+    Record Telegram messages and their share ids in a single transaction.
+
+    Each item is (channel_id, message_id, shares), where a share is a share
+    id or a (share_id, passcode) pair. Returns one entry per message: None if
+    the message was already processed, otherwise the share ids from it that
+    were newly queued (duplicates are left out). A passcode also fills in a
+    known share that has none.
+    """
+    results = []
+    new_share_ids = []
+
+    with get_db() as conn:
+        for channel_id, message_id, shares in messages:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tg_messages (channel_id, message_id) VALUES (?, ?)",
+                (channel_id, message_id),
+            )
+            if cursor.rowcount == 0:
+                results.append(None)
+                continue
+
+            inserted = []
+            passcodes = {}
+            for share in shares:
+                share_id, passcode = (share, "") if isinstance(share, str) else share
+                passcodes[share_id] = passcodes.get(share_id) or passcode
+
+            for share_id, passcode in passcodes.items():
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO quark_shares (share_id, status, passcode) SELECT ?, 'pending', ? {_NOT_ARCHIVED}",
+                    (share_id, passcode or None, share_id),
+                )
+                if cursor.rowcount:
+                    inserted.append(share_id)
+                elif passcode:
+                    conn.execute(
+                        "UPDATE quark_shares SET passcode = ? WHERE share_id = ? AND passcode IS NULL",
+                        (passcode, share_id),
+                    )
+
+            results.append(inserted)
+            new_share_ids.extend(inserted)
+
+    for share_id in new_share_ids:
+        logger.info(f"New share: {share_id}")
+        _notify_new_share(share_id)
+
+    return results
+
+
+def ingest_message(
+    channel_id: str, message_id: int, shares: list
+) -> Optional[list[str]]:
+    """Single-message form of ingest_messages()."""
+    return ingest_messages([(channel_id, message_id, shares)])[0]
+
+
+def add_channel(channel: str, enable: bool = True) -> bool:
+    """
+    Add a channel to watch. Returns True if it was new.
+
+    With enable set, a previously removed channel is watched again.
+    """
+    with get_db() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO tg_channels (channel) VALUES (?)", (channel,)
+        )
+        if cursor.rowcount:
+            return True
+        if enable:
+            conn.execute(
+                "UPDATE tg_channels SET enabled = 1 WHERE channel = ?", (channel,)
+            )
+        return False
+
+
+def remove_channel(channel: str) -> bool:
+    """Stop watching a channel; its counters and history are kept."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            "UPDATE tg_channels SET enabled = 0 WHERE channel = ? AND enabled = 1",
+            (channel,),
+        )
+        return cursor.rowcount > 0
+
+
+def sync_channels(configured: list[str]) -> list[dict]:
+    """
+    Register configured channels and return every enabled one.
+
+    Configured channels are only inserted, so removing one in the WebUI
+    sticks across restarts.
+    """
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO tg_channels (channel) VALUES (?)",
+            [(channel,) for channel in configured],
+        )
+        cursor = conn.execute(
+            "SELECT channel, peer_id FROM tg_channels WHERE enabled = 1"
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def list_channels() -> list[dict]:
+    with get_db() as conn:
+        cursor = conn.execute("SELECT * FROM tg_channels ORDER BY added_at")
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def set_channel_peer(
+    channel: str, peer_id: int, title: str, legacy_key: Optional[str] = None
+):
+    """
+    Store a channel's resolved peer id.
+
+    Messages recorded under legacy_key (the old "@username" key) are moved
+    to the peer id so dedup and the high-water mark carry over.
+    """
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE tg_channels SET peer_id = ?, title = ? WHERE channel = ?",
+            (peer_id, title, channel),
+        )
+        if legacy_key:
+            cursor = conn.execute(
+                "UPDATE OR IGNORE tg_messages SET channel_id = ? WHERE channel_id = ?",
+                (str(peer_id), legacy_key),
+            )
+            if cursor.rowcount:
+                logger.info(
+                    f"Migrated {cursor.rowcount} messages from {legacy_key} to {peer_id}"
+                )
+
+
+def add_channel_counts(counts: dict[str, dict[str, int]]):
+    """Add counter deltas, keyed by channel, to the running totals."""
+    with get_db() as conn:
+        conn.executemany(
+            """
+            UPDATE tg_channels
+            SET messages = messages + ?, link_messages = link_messages + ?,
+                new_shares = new_shares + ?, duplicate_shares = duplicate_shares + ?
+            WHERE channel = ?
+            """,
+            [
+                (
+                    delta.get("messages", 0),
+                    delta.get("link_messages", 0),
+                    delta.get("new_shares", 0),
+                    delta.get("duplicate_shares", 0),
+                    channel,
+                )
+                for channel, delta in counts.items()
+            ],
+        )
+
+
+def get_last_message_id(channel_id: str) -> Optional[int]:
+    """Highest processed message id of a channel (its high-water mark), if any."""
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT MAX(message_id) FROM tg_messages WHERE channel_id = ?",
+            (channel_id,),
+        ).fetchone()
+        return row[0]
+
+
+def find_processed_messages(keys: list[tuple[str, int]]) -> set[tuple[str, int]]:
+    """The (channel_id, message_id) keys among keys that are already recorded."""
+    found = set()
+    with get_db() as conn:
+        for start in range(0, len(keys), 400):
+            chunk = keys[start : start + 400]
+            placeholders = ",".join("(?, ?)" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT channel_id, message_id FROM tg_messages WHERE (channel_id, message_id) IN (VALUES {placeholders})",
+                [value for key in chunk for value in key],
+            )
+            found.update((row[0], row[1]) for row in rows)
+    return found
+
+
+def iter_message_keys() -> Iterator[tuple[str, int]]:
+    """Every recorded (channel_id, message_id), streamed rather than loaded."""
+    with get_db() as conn:
+        for row in conn.execute("SELECT channel_id, message_id FROM tg_messages"):
+            yield row[0], row[1]
+
+
+def get_recent_shares(limit: int) -> list[tuple[str, bool]]:
+    """(share_id, has_passcode) of the most recently queued shares, newest first."""
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT share_id, passcode IS NOT NULL FROM quark_shares ORDER BY rowid DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    return [(row[0], bool(row[1])) for row in rows]
+
+
+def add_share_listener(callback: Callable[[str], None]):
+    """
+    Register a callback invoked with the share_id of every newly queued share.
+
+    Callbacks run synchronously in the inserting thread after the commit, so
+    they must be cheap and thread-safe. The database stays the source of truth;
+    a missed notification is picked up by the worker's fallback poll.
+    """
+    _share_listeners.append(callback)
+
+
+def remove_share_listener(callback: Callable[[str], None]):
+    if callback in _share_listeners:
+        _share_listeners.remove(callback)
+
+
+def _notify_new_share(share_id: str):
+    for callback in list(_share_listeners):
+        try:
+            callback(share_id)
+        except Exception as e:
+            logger.warning(f"Share listener failed for {share_id}: {e}")
+
 
 def get_pending_tasks(limit: int = 10) -> list:
     """Get pending share tasks."""
@@ -104,31 +581,854 @@ def get_pending_tasks(limit: int = 10) -> list:
         return [row["share_id"] for row in cursor.fetchall()]
 
 
-def mark_share_saved(share_id: str, file_id: str):
-    """Mark share as successfully saved."""
+def claim_tasks(
+    owner: str,
+    limit: int = 10,
+    lease_seconds: float = 120,
+    share_ids: Optional[list[str]] = None,
+) -> list[dict]:
+    """
+    Atomically claim due pending shares for one worker.
+
+    Claimed rows move to status 'processing' with the owner id and a lease
+    expiry. Only rows whose next_attempt_at has passed are eligible, oldest
+    due first, via the (status, next_attempt_at) index. When share_ids is
+    given only those rows are considered. Expired leases are returned to the
+    queue by reclaim_expired_leases().
+    """
+    now = time.time()
+    if share_ids is not None:
+        if not share_ids:
+            return []
+        placeholders = ",".join("?" * len(share_ids))
+        candidates = f"AND share_id IN ({placeholders})"
+        params = list(share_ids)
+    else:
+        candidates = ""
+        params = []
+
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'processing', owner = ?, lease_expires_at = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE share_id IN (
+                SELECT share_id FROM quark_shares
+                WHERE status = 'pending' AND next_attempt_at <= ? {candidates}
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING share_id, attempts, passcode
+            """,
+            (owner, now + lease_seconds, now, *params, limit),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_next_attempt_at() -> Optional[float]:
+    """Earliest next_attempt_at among pending shares, or None if none are queued."""
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT MIN(next_attempt_at) AS due FROM quark_shares WHERE status = 'pending'"
+        ).fetchone()
+        return row["due"]
+
+
+def renew_leases(owner: str, share_ids: list[str], lease_seconds: float = 120) -> int:
+    """Extend the lease on shares still held by owner. Returns rows renewed."""
+    if not share_ids:
+        return 0
+
+    placeholders = ",".join("?" * len(share_ids))
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares SET lease_expires_at = ?
+            WHERE owner = ? AND status = 'processing'
+            AND share_id IN ({placeholders})
+            """,
+            (time.time() + lease_seconds, owner, *share_ids),
+        )
+        return cursor.rowcount
+
+
+def release_tasks(owner: str, share_ids: list[str]) -> int:
+    """Hand claimed shares back to the queue, e.g. on graceful shutdown."""
+    if not share_ids:
+        return 0
+
+    placeholders = ",".join("?" * len(share_ids))
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'pending', owner = NULL, lease_expires_at = NULL
+            WHERE owner = ? AND status = 'processing'
+            AND share_id IN ({placeholders})
+            """,
+            (owner, *share_ids),
+        )
+        return cursor.rowcount
+
+
+def reclaim_expired_leases() -> int:
+    """Move shares whose lease has expired back to pending."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE quark_shares
+            SET status = 'pending', owner = NULL, lease_expires_at = NULL
+            WHERE status = 'processing' AND lease_expires_at < ?
+            """,
+            (time.time(),),
+        )
+        count = cursor.rowcount
+
+    if count:
+        logger.warning(f"Reclaimed {count} shares with expired leases")
+    return count
+
+
+def _held_by(owner: Optional[str], task_id: Optional[str]) -> tuple[str, list]:
+    """
+    WHERE clause keeping a status write to the share's current holder.
+
+    owner is the worker whose lease covers the share, task_id the save task
+    the tracker follows. Once the lease expired and the share was claimed
+    again, or its task was released, a late write from the old holder
+    matches no row. Without either the write is unconditional.
+    """
+    if owner is not None:
+        return "AND owner = ? AND status = 'processing'", [owner]
+    if task_id is not None:
+        return "AND task_id = ? AND status = 'submitted'", [task_id]
+    return "", []
+
+
+def mark_share_submitted(
+    share_id: str,
+    task_id: str,
+    check_delay: float,
+    account: Optional[str] = None,
+    owner: Optional[str] = None,
+) -> int:
+    """
+    Record an accepted save request whose server-side task is still running.
+
+    Returns rows updated: 0 if owner no longer holds the share.
+    """
+    guard, params = _held_by(owner, None)
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'submitted', task_id = ?, task_checks = 0, account = ?,
+                next_attempt_at = ?, owner = NULL, lease_expires_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE share_id = ? {guard}
+            """,
+            (task_id, account, time.time() + check_delay, share_id, *params),
+        )
+    if cursor.rowcount:
+        logger.info(f"Submitted: {share_id} -> task {task_id}")
+    return cursor.rowcount
+
+
+def claim_submitted_tasks(limit: int, recheck_after: float) -> list[dict]:
+    """
+    Pick submitted shares whose task check is due.
+
+    The check time is pushed back by recheck_after in the same statement, so
+    concurrent trackers don't poll the same task and a crashed tracker's
+    tasks come back on their own.
+    """
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE quark_shares
+            SET next_attempt_at = ?, task_checks = task_checks + 1
+            WHERE share_id IN (
+                SELECT share_id FROM quark_shares
+                WHERE status = 'submitted' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING share_id, task_id, task_checks, attempts, account
+            """,
+            (now + recheck_after, now, limit),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def release_account_tasks(account: str) -> list[str]:
+    """
+    Queue the shares submitted through an account again, due now.
+
+    For an account whose cookie expired: its save tasks can't be checked
+    any more, so another account saves the shares. Returns their ids.
+    """
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            UPDATE quark_shares
+            SET status = 'pending', next_attempt_at = 0, task_id = NULL,
+                task_checks = 0, account = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'submitted' AND account = ?
+            RETURNING share_id
+            """,
+            (account,),
+        )
+        released = [row[0] for row in cursor.fetchall()]
+
+    for share_id in released:
+        _notify_new_share(share_id)
+    if released:
+        logger.warning(f"Released {len(released)} shares submitted via {account}")
+    return released
+
+
+def schedule_task_check(share_id: str, delay: float):
+    """Set when a submitted share's save task is checked next."""
     with get_db() as conn:
         conn.execute(
-            "UPDATE quark_shares SET status = 'saved', file_id = ?, updated_at = CURRENT_TIMESTAMP WHERE share_id = ?",
-            (file_id, share_id),
+            "UPDATE quark_shares SET next_attempt_at = ? WHERE share_id = ? AND status = 'submitted'",
+            (time.time() + delay, share_id),
+        )
+
+
+def find_indexed_content(fingerprints: list[str]) -> set[str]:
+    """Return the fingerprints that are already in the content index."""
+    if not fingerprints:
+        return set()
+
+    placeholders = ",".join("?" * len(fingerprints))
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"SELECT fingerprint FROM content_index WHERE fingerprint IN ({placeholders})",
+            fingerprints,
+        )
+        return {row["fingerprint"] for row in cursor.fetchall()}
+
+
+def record_share_content(
+    share_id: str,
+    content: list[tuple[str, str, int]],
+    dedup_files: int = 0,
+    dedup_bytes: int = 0,
+    owner: Optional[str] = None,
+) -> int:
+    """
+    Remember the files a share is about to save and what dedup skipped.
+
+    content is (fingerprint, file_name, size) per saved file; it moves into
+    the content index when the share is marked saved.
+    """
+    guard, params = _held_by(owner, None)
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET content = ?, dedup_files = ?, dedup_bytes = ?
+            WHERE share_id = ? {guard}
+            """,
+            (json.dumps(content), dedup_files, dedup_bytes, share_id, *params),
+        )
+        return cursor.rowcount
+
+
+def mark_share_duplicate(
+    share_id: str, dedup_files: int, dedup_bytes: int, owner: Optional[str] = None
+) -> int:
+    """Mark share as skipped because all of its files are already saved."""
+    guard, params = _held_by(owner, None)
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'duplicate', dedup_files = ?, dedup_bytes = ?,
+                owner = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE share_id = ? {guard}
+            """,
+            (dedup_files, dedup_bytes, share_id, *params),
+        )
+    if cursor.rowcount:
+        logger.info(f"Duplicate: {share_id} ({dedup_files} files already saved)")
+    return cursor.rowcount
+
+
+def get_dedup_report() -> dict:
+    """Saves and bytes avoided by content dedup so far, archived shares included."""
+    with get_db() as conn:
+        row = conn.execute("""
+            SELECT
+                SUM(status = 'duplicate') AS shares_skipped,
+                SUM(status != 'duplicate' AND dedup_files > 0) AS shares_partial,
+                COALESCE(SUM(dedup_files), 0) AS files_skipped,
+                COALESCE(SUM(dedup_bytes), 0) AS bytes_skipped
+            FROM (
+                SELECT status, dedup_files, dedup_bytes FROM quark_shares
+                UNION ALL
+                SELECT status, dedup_files, dedup_bytes FROM share_archive
+            )
+            """).fetchone()
+        indexed = conn.execute("SELECT COUNT(*) FROM content_index").fetchone()[0]
+
+    return {
+        "shares_skipped": row["shares_skipped"] or 0,
+        "shares_partial": row["shares_partial"] or 0,
+        "files_skipped": row["files_skipped"],
+        "bytes_skipped": row["bytes_skipped"],
+        "indexed_files": indexed,
+    }
+
+
+def mark_share_saved(
+    share_id: str,
+    file_id: str,
+    account: Optional[str] = None,
+    owner: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> int:
+    """
+    Mark share as successfully saved and index the files it saved.
+
+    Held by owner's lease when the save finished at once, by task_id when
+    the tracker saw its task finish. Returns rows updated.
+    """
+    guard, params = _held_by(owner, task_id)
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'saved', file_id = ?, owner = NULL,
+                account = COALESCE(?, account), lease_expires_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE share_id = ? {guard}
+            """,
+            (file_id, account, share_id, *params),
         )
+        if not cursor.rowcount:
+            return 0
+
+        # Read in the update's transaction, so it is the holder's content
+        row = conn.execute(
+            "SELECT content FROM quark_shares WHERE share_id = ?", (share_id,)
+        ).fetchone()
+        if row["content"]:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO content_index (fingerprint, share_id, file_name, size)
+                VALUES (?, ?, ?, ?)
+                """,
+                [
+                    (fingerprint, share_id, file_name, size)
+                    for fingerprint, file_name, size in json.loads(row["content"])
+                ],
+            )
+            conn.execute(
+                "UPDATE quark_shares SET content = NULL WHERE share_id = ?",
+                (share_id,),
+            )
     logger.info(f"Saved: {share_id} -> {file_id}")
+    return 1
+
+
+def mark_share_failed(
+    share_id: str,
+    error: str,
+    owner: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> int:
+    """Mark share as permanently failed. Returns rows updated."""
+    guard, params = _held_by(owner, task_id)
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'failed', last_error = ?, attempts = attempts + 1,
+                owner = NULL, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE share_id = ? {guard}
+            """,
+            (error, share_id, *params),
+        )
+    if cursor.rowcount:
+        logger.error(f"Failed: {share_id} - {error}")
+    return cursor.rowcount
+
+
+def mark_share_retry(
+    share_id: str,
+    error: str,
+    delay: float,
+    count_attempt: bool = True,
+    owner: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> int:
+    """Put share back in the queue, due again after delay seconds. Returns rows updated."""
+    guard, params = _held_by(owner, task_id)
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'pending', last_error = ?, attempts = attempts + ?,
+                next_attempt_at = ?, owner = NULL, lease_expires_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE share_id = ? {guard}
+            """,
+            (
+                error,
+                1 if count_attempt else 0,
+                time.time() + delay,
+                share_id,
+                *params,
+            ),
+        )
+    if cursor.rowcount:
+        logger.warning(f"Retry: {share_id} in {delay:.0f}s - {error}")
+    return cursor.rowcount
+
+
+def list_shares(
+    status: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    error: Optional[str] = None,
+    after: Optional[tuple[str, str]] = None,
+    limit: int = 50,
+) -> list[dict]:
+    """
+    A page of shares, most recently updated first.
+
+    since/until bound updated_at (unix timestamps); error matches a
+    substring of last_error, ignoring case. after is the (updated_at,
+    share_id) of the previous page's last row: pages are found by index
+    seek rather than OFFSET, so a deep page costs the same as the first.
+    Archived shares are not listed.
+    """
+    clauses, params = [], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if since is not None:
+        clauses.append("updated_at >= datetime(?, 'unixepoch')")
+        params.append(since)
+    if until is not None:
+        clauses.append("updated_at < datetime(?, 'unixepoch')")
+        params.append(until)
+    if error:
+        clauses.append("instr(lower(last_error), lower(?)) > 0")
+        params.append(error)
+    if after is not None:
+        clauses.append("(updated_at, share_id) < (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            SELECT share_id, status, passcode IS NOT NULL AS has_passcode, file_id,
+                last_error, attempts, next_attempt_at, dedup_files, dedup_bytes,
+                account, first_seen, updated_at
+            FROM quark_shares {where}
+            ORDER BY updated_at DESC, share_id DESC
+            LIMIT ?
+            """,
+            (*params, limit),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+# Shares in these states are not held by a worker, so they can be requeued
+_REQUEUEABLE = "('pending', 'failed', 'duplicate', 'cancelled')"
+
+
+def requeue_shares(share_ids: list[str]) -> list[str]:
+    """
+    Queue the given failed, duplicate or cancelled shares again, due now.
+
+    Pending ones lose their retry backoff. Shares being processed or
+    already saved are left alone. Returns the ids requeued.
+    """
+    if not share_ids:
+        return []
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'pending', attempts = 0, next_attempt_at = 0,
+                owner = NULL, lease_expires_at = NULL, task_id = NULL,
+                task_checks = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE share_id IN ({','.join('?' * len(share_ids))})
+                AND status IN {_REQUEUEABLE}
+            RETURNING share_id
+            """,
+            share_ids,
+        )
+        requeued = [row[0] for row in cursor.fetchall()]
+
+    for share_id in requeued:
+        _notify_new_share(share_id)
+    if requeued:
+        logger.info(f"Requeued {len(requeued)} shares")
+    return requeued
+
+
+def cancel_shares(share_ids: list[str]) -> int:
+    """Mark the given pending shares 'cancelled', so no worker claims them."""
+    if not share_ids:
+        return 0
+    with get_db() as conn:
+        cancelled = conn.execute(
+            f"""
+            UPDATE quark_shares
+            SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+            WHERE share_id IN ({','.join('?' * len(share_ids))})
+                AND status = 'pending'
+            """,
+            share_ids,
+        ).rowcount
+    if cancelled:
+        logger.info(f"Cancelled {cancelled} shares")
+    return cancelled
+
+
+def set_settings(values: dict[str, str]) -> float:
+    """Store settings; returns the timestamp they were stored with."""
+    now = time.time()
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO settings (key, value, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value, updated_at = excluded.updated_at
+            """,
+            [(key, value, now) for key, value in values.items()],
+        )
+    return now
+
+
+def get_settings_since(version: float = 0.0) -> list[dict]:
+    """Settings changed after version (an updated_at timestamp), oldest first."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            "SELECT key, value, updated_at FROM settings "
+            "WHERE updated_at > ? ORDER BY updated_at",
+            (version,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def queue_notifications(messages: list[str]):
+    """Store messages for the process that owns the Telegram session to send."""
+    now = time.time()
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT INTO notifications (message, created_at) VALUES (?, ?)",
+            [(message, now) for message in messages],
+        )
 
 
-def mark_share_failed(share_id: str, error: str):
-    """Mark share as failed."""
+def take_notifications(limit: int) -> list[str]:
+    """Remove and return up to limit stored messages, oldest first."""
+    if limit <= 0:
+        return []
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            DELETE FROM notifications
+            WHERE id IN (SELECT id FROM notifications ORDER BY id LIMIT ?)
+            RETURNING id, message
+            """,
+            (limit,),
+        )
+        rows = sorted(cursor.fetchall(), key=lambda row: row["id"])
+        return [row["message"] for row in rows]
+
+
+def queue_backfill(channel: str, from_id: int = 0):
+    """Ask the running listener to backfill a channel's messages after from_id."""
     with get_db() as conn:
         conn.execute(
-            "UPDATE quark_shares SET status = 'failed', last_error = ?, updated_at = CURRENT_TIMESTAMP WHERE share_id = ?",
-            (error, share_id),
+            "INSERT INTO backfill_requests (channel, from_id, created_at) VALUES (?, ?, ?)",
+            (channel, from_id, time.time()),
         )
-    logger.error(f"Failed: {share_id} - {error}")
 
 
-def get_share_status(share_id: str) -> Optional[str]:
-    """Get current status of a share."""
+def get_backfill_requests() -> list[dict]:
+    """Backfills not done yet, oldest first."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            "SELECT id, channel, from_id FROM backfill_requests ORDER BY id"
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def finish_backfill_request(request_id: int):
+    with get_db() as conn:
+        conn.execute("DELETE FROM backfill_requests WHERE id = ?", (request_id,))
+
+
+def retry_cookie_expired() -> int:
+    """Make shares held back by an expired cookie due now. Returns how many."""
+    with get_db() as conn:
+        cursor = conn.execute("""
+            UPDATE quark_shares
+            SET next_attempt_at = 0
+            WHERE status = 'pending' AND last_error LIKE 'Cookie expired:%'
+            """)
+        return cursor.rowcount
+
+
+def record_spans(spans: list[tuple], max_spans: int = TRACE_MAX_SPANS):
+    """
+    Store (share_id, name, started_at, duration_ms, depth, error) spans.
+
+    The oldest rows beyond max_spans are deleted in the same transaction.
+    """
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO trace_spans
+                (share_id, name, started_at, duration_ms, depth, error)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            spans,
+        )
+        # ids only grow, so everything below the newest max_spans goes
+        conn.execute(
+            "DELETE FROM trace_spans WHERE id <= (SELECT MAX(id) FROM trace_spans) - ?",
+            (max_spans,),
+        )
+
+
+def get_trace(share_id: str) -> list[dict]:
+    """A share's spans in start order."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            SELECT name, started_at, duration_ms, depth, error
+            FROM trace_spans WHERE share_id = ?
+            ORDER BY started_at, id
+            """,
+            (share_id,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_slowest_traces(since: float, limit: int = 20) -> list[dict]:
+    """
+    Shares with the longest traces that started after since.
+
+    total_ms runs from the first span's start to the last span's end, so it
+    includes waiting on the save task between tracker checks.
+    """
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            SELECT share_id,
+                   MIN(started_at) AS started_at,
+                   (MAX(started_at + duration_ms / 1000.0) - MIN(started_at))
+                       * 1000 AS total_ms,
+                   COUNT(*) AS spans,
+                   SUM(error IS NOT NULL) AS errors
+            FROM trace_spans
+            WHERE share_id IN (
+                SELECT DISTINCT share_id FROM trace_spans WHERE started_at >= ?
+            )
+            GROUP BY share_id
+            ORDER BY total_ms DESC
+            LIMIT ?
+            """,
+            (since, limit),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+# Retention, see app.tasks.retention. The find_* reads may scan a table, so
+# they run on a reader thread; the writes then recheck their conditions and
+# touch only the rows found, keeping each write job short.
+
+_TERMINAL = "('saved', 'failed', 'duplicate', 'cancelled')"
+_ARCHIVE_ERROR_CHARS = 200
+
+# A channel's newest message row is its catch-up high-water mark, see
+# get_last_message_id(), so it is never aged out
+_EXPIRED_MESSAGE = """
+    processed_at < datetime('now', ?)
+    AND message_id < (
+        SELECT MAX(message_id) FROM tg_messages AS newest
+        WHERE newest.channel_id = tg_messages.channel_id
+    )
+"""
+
+
+def _age(days: float) -> str:
+    return f"-{days * 86400:.0f} seconds"
+
+
+def find_expired_messages(days: float, limit: int) -> list[int]:
+    """Rowids of up to limit message rows processed more than days ago."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"SELECT rowid FROM tg_messages WHERE {_EXPIRED_MESSAGE} ORDER BY rowid LIMIT ?",
+            (_age(days), limit),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_messages(rowids: list[int], days: float) -> int:
+    """Delete the given message rows that are still expired; returns how many."""
+    if not rowids:
+        return 0
     with get_db() as conn:
         cursor = conn.execute(
-            "SELECT status FROM quark_shares WHERE share_id = ?", (share_id,)
+            f"DELETE FROM tg_messages WHERE rowid IN ({','.join('?' * len(rowids))}) AND {_EXPIRED_MESSAGE}",
+            (*rowids, _age(days)),
+        )
+        return cursor.rowcount
+
+
+def find_archivable_shares(days: float, limit: int) -> list[str]:
+    """Up to limit saved, failed, duplicate or cancelled shares not updated for days."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            f"""
+            SELECT share_id FROM quark_shares
+            WHERE status IN {_TERMINAL} AND updated_at < datetime('now', ?)
+            LIMIT ?
+            """,
+            (_age(days), limit),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def archive_shares(share_ids: list[str], days: float) -> int:
+    """
+    Move the given shares that are still archivable to share_archive.
+
+    Their ids go to share_keys, so they are never queued again. Returns
+    how many were moved.
+    """
+    if not share_ids:
+        return 0
+    condition = (
+        f"share_id IN ({','.join('?' * len(share_ids))}) "
+        f"AND status IN {_TERMINAL} AND updated_at < datetime('now', ?)"
+    )
+    params = (*share_ids, _age(days))
+    with get_db() as conn:
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO share_archive (
+                share_id, status, file_id, last_error, attempts,
+                dedup_files, dedup_bytes, first_seen, updated_at
+            )
+            SELECT share_id, status, file_id, substr(last_error, 1, ?), attempts,
+                dedup_files, dedup_bytes, first_seen, updated_at
+            FROM quark_shares WHERE {condition}
+            """,
+            (_ARCHIVE_ERROR_CHARS, *params),
+        )
+        conn.execute(
+            f"INSERT OR IGNORE INTO share_keys (share_id) SELECT share_id FROM quark_shares WHERE {condition}",
+            params,
         )
-        row = cursor.fetchone()
-        return row["status"] if row else None
+        return conn.execute(
+            f"DELETE FROM quark_shares WHERE {condition}", params
+        ).rowcount
+
+
+def purge_archive(days: float, limit: int) -> int:
+    """Delete up to limit archive rows older than days; their keys stay."""
+    with get_db() as conn:
+        return conn.execute(
+            """
+            DELETE FROM share_archive WHERE share_id IN (
+                SELECT share_id FROM share_archive
+                WHERE archived_at < datetime('now', ?) LIMIT ?
+            )
+            """,
+            (_age(days), limit),
+        ).rowcount
+
+
+def incremental_vacuum(pages: int) -> int:
+    """Return up to pages free pages to the OS; returns how many were freed."""
+    with get_db() as conn:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # execute() would step the pragma once, freeing a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return before - after
+
+
+def checkpoint():
+    """Copy the WAL into the database file, so freed pages leave it."""
+    with get_db() as conn:
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+
+def vacuum():
+    """
+    Rebuild the database file, switching it to incremental auto-vacuum.
+
+    Rewrites every page and blocks all writers while it runs, so it is
+    meant for the compact command with the app stopped.
+    """
+    conn = _get_connection()
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+_AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def get_storage_stats() -> dict:
+    """Database file size, free space and the row counts retention works on."""
+    with get_db() as conn:
+
+        def pragma(name: str) -> int:
+            return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+        page_size = pragma("page_size")
+        stats = {
+            "auto_vacuum": _AUTO_VACUUM_MODES.get(pragma("auto_vacuum"), "unknown"),
+            "page_size": page_size,
+            "size_bytes": pragma("page_count") * page_size,
+            "free_bytes": pragma("freelist_count") * page_size,
+        }
+        for table in ("tg_messages", "quark_shares", "share_archive", "share_keys"):
+            stats[f"{table}_rows"] = conn.execute(
+                f"SELECT COUNT(*) FROM {table}"
+            ).fetchone()[0]
+    return stats
+
+
+def get_status_counts() -> dict[str, int]:
+    """Number of shares in each status, not counting archived ones."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            "SELECT status, COUNT(*) FROM quark_shares GROUP BY status"
+        )
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def get_share_status(share_id: str) -> Optional[str]:
+    """
+    Get current status of a share.
+
+    An archived share reports its final status, or 'archived' once its
+    archive row has been purged.
+    """
+    with get_db() as conn:
+        for query in (
+            "SELECT status FROM quark_shares WHERE share_id = ?",
+            "SELECT status FROM share_archive WHERE share_id = ?",
+            "SELECT 'archived' AS status FROM share_keys WHERE share_id = ?",
+        ):
+            row = conn.execute(query, (share_id,)).fetchone()
+            if row:
+                return row["status"]
+        return None
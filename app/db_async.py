@@ -0,0 +1,555 @@
+"""Async facade over app.db for coroutines running on the event loop.
+
+Writes are funnelled through one dedicated thread in submission order, so a
+commit never blocks the loop and SQLite sees a single writer. Reads run on a
+small thread pool; WAL mode lets them proceed while the writer is busy.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+from app import db
+from app.config import DB_READ_THREADS, INGEST_BATCH_WINDOW_MS, INGEST_BATCH_MAX
+from app.utils.dedup_cache import DedupCache
+from app.utils.metrics import DB_OPERATION_SECONDS
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class _Writer:
+    """Single background thread executing write jobs from a queue."""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="db-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            future, fn, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+_writer = _Writer()
+_readers: Optional[ThreadPoolExecutor] = None
+_readers_lock = threading.Lock()
+
+
+def _get_readers() -> ThreadPoolExecutor:
+    global _readers
+
+    with _readers_lock:
+        if _readers is None:
+            _readers = ThreadPoolExecutor(
+                max_workers=DB_READ_THREADS, thread_name_prefix="db-read"
+            )
+        return _readers
+
+
+def _timed(fn: Callable, *args):
+    # Timed on the DB thread, so queueing behind other jobs is not counted
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        DB_OPERATION_SECONDS.observe(
+            time.perf_counter() - started, operation=fn.__name__
+        )
+
+
+async def run_write(fn: Callable, *args):
+    """Run a blocking app.db write function on the writer thread."""
+    # The span covers waiting for the writer too, that is time the caller lost
+    with span(f"db.{fn.__name__}"):
+        return await asyncio.wrap_future(_writer.submit(_timed, fn, *args))
+
+
+async def run_read(fn: Callable, *args):
+    """Run a blocking app.db read function on the reader pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_readers(), partial(_timed, fn, *args))
+
+
+def writer_backlog() -> int:
+    """Number of write jobs waiting for the writer thread."""
+    return _writer.pending()
+
+
+def shutdown():
+    """Flush queued writes and stop the writer and reader threads."""
+    global _readers
+
+    _writer.stop()
+    with _readers_lock:
+        readers, _readers = _readers, None
+    if readers is not None:
+        readers.shutdown(wait=True)
+
+
+class _IngestBatcher:
+    """Coalesces messages arriving within a short window into one transaction."""
+
+    def __init__(self, window_ms: int, max_size: int):
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self.pending: list[tuple[tuple, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop keeps only weak references to tasks
+        self._flushes: set[asyncio.Task] = set()
+
+    async def submit(
+        self, channel_id: str, message_id: int, shares: list
+    ) -> Optional[list[str]]:
+        if self.window <= 0:
+            return await run_write(db.ingest_message, channel_id, message_id, shares)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(((channel_id, message_id, shares), future))
+
+        if len(self.pending) >= self.max_size:
+            self._schedule_flush(loop, 0)
+        elif self._timer is None:
+            self._schedule_flush(loop, self.window)
+
+        return await future
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop):
+        task = loop.create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._on_flush_done)
+
+    def _on_flush_done(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[DB] ingest batch flush failed: {task.exception()}")
+
+    async def _flush(self):
+        self._timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        try:
+            results = await run_write(db.ingest_messages, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_ingest_batcher = _IngestBatcher(INGEST_BATCH_WINDOW_MS, INGEST_BATCH_MAX)
+
+# Keys confirmed by the DB, checked before ingestion touches it
+dedup_cache = DedupCache()
+
+
+def _warm_message_keys(cache: DedupCache) -> int:
+    return cache.warm_messages(db.iter_message_keys())
+
+
+async def warm_dedup_cache():
+    """Fill dedup_cache from the DB: recent share ids and every message key."""
+    started = time.perf_counter()
+    cache = dedup_cache
+    cache.warm_shares(await run_read(db.get_recent_shares, cache.size))
+    keys = await run_read(_warm_message_keys, cache)
+    if cache.bloom is not None and keys > cache.bloom.capacity:
+        logger.warning(
+            f"[DEDUP] {keys} message keys exceed DEDUP_BLOOM_CAPACITY={cache.bloom.capacity}, "
+            "more duplicate checks will hit the DB"
+        )
+    logger.info(
+        f"[DEDUP] cache warmed with {len(cache.shares)} shares and {keys} message keys "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def _normalize_shares(shares: list) -> list[tuple[str, str]]:
+    return [(share, "") if isinstance(share, str) else tuple(share) for share in shares]
+
+
+async def _ingest(
+    messages: list[tuple[str, int, list]], write: Callable
+) -> list[Optional[list[str]]]:
+    """
+    Screen messages with dedup_cache, then ingest the rest with write(batch).
+
+    Cached messages come back as None and cached shares are left out of the
+    batch, without a query. Messages the Bloom filter cannot rule out are
+    checked with a read first, so a known one costs no write.
+    """
+    cache = dedup_cache
+    results: list[Optional[list[str]]] = [None] * len(messages)
+    todo = [
+        i
+        for i, (channel_id, message_id, _) in enumerate(messages)
+        if not cache.has_message(channel_id, message_id)
+    ]
+
+    check = [messages[i][:2] for i in todo if cache.needs_check(*messages[i][:2])]
+    if check:
+        processed = await run_read(db.find_processed_messages, check)
+        cache.record_false_positives(len(check) - len(processed))
+        for channel_id, message_id in processed:
+            cache.add_message(channel_id, message_id)
+        todo = [i for i in todo if messages[i][:2] not in processed]
+
+    if not todo:
+        return results
+
+    batch = []
+    for i in todo:
+        channel_id, message_id, shares = messages[i]
+        shares = [
+            (share_id, passcode)
+            for share_id, passcode in _normalize_shares(shares)
+            if not cache.has_share(share_id, passcode)
+        ]
+        batch.append((channel_id, message_id, shares))
+
+    for i, (channel_id, message_id, shares), result in zip(
+        todo, batch, await write(batch)
+    ):
+        results[i] = result
+        cache.add_message(channel_id, message_id)
+        if result is not None:
+            # Every share of a processed message now has a row
+            for share_id, passcode in shares:
+                cache.add_share(share_id, bool(passcode))
+    return results
+
+
+async def _submit_one(batch: list[tuple[str, int, list]]) -> list:
+    return [await _ingest_batcher.submit(*batch[0])]
+
+
+async def ingest_message(
+    channel_id: str, message_id: int, shares: list
+) -> Optional[list[str]]:
+    """
+    Record a message and its share ids, micro-batched with concurrent callers.
+
+    Returns None for an already-processed message, otherwise the newly
+    queued share ids.
+    """
+    return (await _ingest([(channel_id, message_id, shares)], _submit_one))[0]
+
+
+async def ingest_messages(
+    messages: list[tuple[str, int, list]],
+) -> list[Optional[list[str]]]:
+    return await _ingest(messages, partial(run_write, db.ingest_messages))
+
+
+async def add_channel(channel: str, enable: bool = True) -> bool:
+    return await run_write(db.add_channel, channel, enable)
+
+
+async def remove_channel(channel: str) -> bool:
+    return await run_write(db.remove_channel, channel)
+
+
+async def list_channels() -> list[dict]:
+    return await run_read(db.list_channels)
+
+
+async def sync_channels(configured: list[str]) -> list[dict]:
+    return await run_write(db.sync_channels, configured)
+
+
+async def set_channel_peer(
+    channel: str, peer_id: int, title: str, legacy_key: Optional[str] = None
+):
+    await run_write(db.set_channel_peer, channel, peer_id, title, legacy_key)
+
+
+async def add_channel_counts(counts: dict[str, dict[str, int]]):
+    await run_write(db.add_channel_counts, counts)
+
+
+async def get_last_message_id(channel_id: str) -> Optional[int]:
+    return await run_read(db.get_last_message_id, channel_id)
+
+
+async def insert_tg_message(channel_id: str, message_id: int) -> bool:
+    if dedup_cache.has_message(channel_id, message_id):
+        return False
+    inserted = await run_write(db.insert_tg_message, channel_id, message_id)
+    dedup_cache.add_message(channel_id, message_id)
+    return inserted
+
+
+async def insert_share_pending(share_id: str) -> bool:
+    if dedup_cache.has_share(share_id):
+        return False
+    inserted = await run_write(db.insert_share_pending, share_id)
+    dedup_cache.add_share(share_id)
+    return inserted
+
+
+async def mark_share_saved(
+    share_id: str,
+    file_id: str,
+    account: Optional[str] = None,
+    owner: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> int:
+    return await run_write(
+        db.mark_share_saved, share_id, file_id, account, owner, task_id
+    )
+
+
+async def mark_share_submitted(
+    share_id: str,
+    task_id: str,
+    check_delay: float,
+    account: Optional[str] = None,
+    owner: Optional[str] = None,
+) -> int:
+    return await run_write(
+        db.mark_share_submitted, share_id, task_id, check_delay, account, owner
+    )
+
+
+async def claim_submitted_tasks(limit: int, recheck_after: float) -> list[dict]:
+    return await run_write(db.claim_submitted_tasks, limit, recheck_after)
+
+
+async def release_account_tasks(account: str) -> list[str]:
+    return await run_write(db.release_account_tasks, account)
+
+
+async def schedule_task_check(share_id: str, delay: float):
+    await run_write(db.schedule_task_check, share_id, delay)
+
+
+async def find_indexed_content(fingerprints: list[str]) -> set[str]:
+    return await run_read(db.find_indexed_content, fingerprints)
+
+
+async def record_share_content(
+    share_id: str,
+    content: list[tuple[str, str, int]],
+    dedup_files: int = 0,
+    dedup_bytes: int = 0,
+    owner: Optional[str] = None,
+) -> int:
+    return await run_write(
+        db.record_share_content, share_id, content, dedup_files, dedup_bytes, owner
+    )
+
+
+async def mark_share_duplicate(
+    share_id: str, dedup_files: int, dedup_bytes: int, owner: Optional[str] = None
+) -> int:
+    return await run_write(
+        db.mark_share_duplicate, share_id, dedup_files, dedup_bytes, owner
+    )
+
+
+async def get_dedup_report() -> dict:
+    return await run_read(db.get_dedup_report)
+
+
+async def mark_share_failed(
+    share_id: str,
+    error: str,
+    owner: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> int:
+    return await run_write(db.mark_share_failed, share_id, error, owner, task_id)
+
+
+async def claim_tasks(
+    owner: str,
+    limit: int = 10,
+    lease_seconds: float = 120,
+    share_ids: Optional[list[str]] = None,
+) -> list[dict]:
+    return await run_write(db.claim_tasks, owner, limit, lease_seconds, share_ids)
+
+
+async def renew_leases(
+    owner: str, share_ids: list[str], lease_seconds: float = 120
+) -> int:
+    return await run_write(db.renew_leases, owner, share_ids, lease_seconds)
+
+
+async def release_tasks(owner: str, share_ids: list[str]) -> int:
+    return await run_write(db.release_tasks, owner, share_ids)
+
+
+async def reclaim_expired_leases() -> int:
+    return await run_write(db.reclaim_expired_leases)
+
+
+async def get_next_attempt_at() -> Optional[float]:
+    return await run_read(db.get_next_attempt_at)
+
+
+async def mark_share_retry(
+    share_id: str,
+    error: str,
+    delay: float,
+    count_attempt: bool = True,
+    owner: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> int:
+    return await run_write(
+        db.mark_share_retry, share_id, error, delay, count_attempt, owner, task_id
+    )
+
+
+async def get_pending_tasks(limit: int = 10) -> list:
+    return await run_read(db.get_pending_tasks, limit)
+
+
+async def list_shares(
+    status: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    error: Optional[str] = None,
+    after: Optional[tuple[str, str]] = None,
+    limit: int = 50,
+) -> list[dict]:
+    return await run_read(db.list_shares, status, since, until, error, after, limit)
+
+
+async def requeue_shares(share_ids: list[str]) -> list[str]:
+    return await run_write(db.requeue_shares, share_ids)
+
+
+async def cancel_shares(share_ids: list[str]) -> int:
+    return await run_write(db.cancel_shares, share_ids)
+
+
+async def set_settings(values: dict[str, str]) -> float:
+    return await run_write(db.set_settings, values)
+
+
+async def get_settings_since(version: float = 0.0) -> list[dict]:
+    return await run_read(db.get_settings_since, version)
+
+
+async def queue_notifications(messages: list[str]):
+    await run_write(db.queue_notifications, messages)
+
+
+async def take_notifications(limit: int) -> list[str]:
+    return await run_write(db.take_notifications, limit)
+
+
+async def get_backfill_requests() -> list[dict]:
+    return await run_read(db.get_backfill_requests)
+
+
+async def finish_backfill_request(request_id: int):
+    await run_write(db.finish_backfill_request, request_id)
+
+
+async def retry_cookie_expired() -> int:
+    return await run_write(db.retry_cookie_expired)
+
+
+async def record_spans(spans: list[tuple]):
+    await run_write(db.record_spans, spans)
+
+
+async def get_trace(share_id: str) -> list[dict]:
+    return await run_read(db.get_trace, share_id)
+
+
+async def get_slowest_traces(since: float, limit: int = 20) -> list[dict]:
+    return await run_read(db.get_slowest_traces, since, limit)
+
+
+async def find_expired_messages(days: float, limit: int) -> list[int]:
+    return await run_read(db.find_expired_messages, days, limit)
+
+
+async def delete_messages(rowids: list[int], days: float) -> int:
+    return await run_write(db.delete_messages, rowids, days)
+
+
+async def find_archivable_shares(days: float, limit: int) -> list[str]:
+    return await run_read(db.find_archivable_shares, days, limit)
+
+
+async def archive_shares(share_ids: list[str], days: float) -> int:
+    return await run_write(db.archive_shares, share_ids, days)
+
+
+async def purge_archive(days: float, limit: int) -> int:
+    return await run_write(db.purge_archive, days, limit)
+
+
+async def incremental_vacuum(pages: int) -> int:
+    return await run_write(db.incremental_vacuum, pages)
+
+
+async def checkpoint():
+    await run_write(db.checkpoint)
+
+
+async def get_storage_stats() -> dict:
+    return await run_read(db.get_storage_stats)
+
+
+async def get_status_counts() -> dict[str, int]:
+    return await run_read(db.get_status_counts)
+
+
+async def get_share_status(share_id: str) -> Optional[str]:
+    return await run_read(db.get_share_status, share_id)
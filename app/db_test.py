@@ -11,13 +11,55 @@ from app.db import (
     insert_share_pending,
     get_share_status,
     init_db,
+    get_db,
+    close_db,
+    ingest_messages,
+    claim_tasks,
+    renew_leases,
+    release_tasks,
+    reclaim_expired_leases,
+    mark_share_retry,
+    get_next_attempt_at,
+    mark_share_submitted,
+    claim_submitted_tasks,
+    release_account_tasks,
+    schedule_task_check,
+    mark_share_saved,
+    find_indexed_content,
+    record_share_content,
+    mark_share_duplicate,
+    get_dedup_report,
+    add_channel,
+    remove_channel,
+    sync_channels,
+    set_channel_peer,
+    get_last_message_id,
+    record_spans,
+    get_trace,
+    get_slowest_traces,
+    list_shares,
+    requeue_shares,
+    cancel_shares,
+    mark_share_failed,
+    queue_backfill,
+    get_backfill_requests,
+    finish_backfill_request,
 )
-from app.config import DB_PATH
+from app.config import DATA_DIR, DB_PATH
+
+
+def reset_db():
+    # pytest points DB_PATH elsewhere (app/conftest.py); a direct run must too
+    assert DB_PATH != DATA_DIR / "quarkflow.db", "set DB_PATH to a scratch database"
+    close_db()
+    for suffix in ("", "-wal", "-shm"):
+        path = f"{DB_PATH}{suffix}"
+        if os.path.exists(path):
+            os.remove(path)
 
 
 def test_db():
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    reset_db()
 
     print("Initializing database...")
     init_db()
@@ -52,5 +94,309 @@ def test_db():
     print("\n✅ All tests passed!")
 
 
+def test_connection_reuse():
+    reset_db()
+    init_db()
+
+    with get_db() as conn1:
+        journal_mode = conn1.execute("PRAGMA journal_mode").fetchone()[0]
+    with get_db() as conn2:
+        pass
+
+    assert conn1 is conn2
+    assert journal_mode == "wal"
+
+    close_db()
+    with get_db() as conn3:
+        assert conn3 is not conn1
+
+
+def test_ingest_messages():
+    reset_db()
+    init_db()
+
+    insert_share_pending("known")
+
+    results = ingest_messages(
+        [
+            ("@test", 1, ["known", "fresh1", "fresh1"]),
+            ("@test", 2, ["fresh2"]),
+            ("@test", 1, ["fresh3"]),
+        ]
+    )
+
+    assert results == [["fresh1"], ["fresh2"], None]
+    assert get_share_status("fresh1") == "pending"
+    assert get_share_status("fresh3") is None
+
+    # Passcodes are stored, and fill in a known share that had none
+    ingest_messages([("@test", 3, [("locked", "ab12"), ("known", "zz99")])])
+    rows = claim_tasks("worker-a", limit=10, share_ids=["locked", "known"])
+    assert {row["share_id"]: row["passcode"] for row in rows} == {
+        "locked": "ab12",
+        "known": "zz99",
+    }
+
+
+def test_claim_tasks():
+    reset_db()
+    init_db()
+
+    for i in range(5):
+        insert_share_pending(f"share{i}")
+
+    first = {row["share_id"] for row in claim_tasks("worker-a", limit=3)}
+    second = {row["share_id"] for row in claim_tasks("worker-b", limit=10)}
+
+    assert len(first) == 3
+    assert len(second) == 2
+    assert not first & second
+    assert get_share_status("share0") == "processing"
+    assert claim_tasks("worker-c", limit=10) == []
+
+    assert renew_leases("worker-a", sorted(first)) == 3
+    assert renew_leases("worker-b", sorted(first)) == 0
+
+    assert release_tasks("worker-b", sorted(second)) == 2
+    assert {row["share_id"] for row in claim_tasks("worker-c", limit=10)} == second
+
+    # An expired lease is reclaimable by anyone
+    claim_tasks("worker-d", limit=1, lease_seconds=-1, share_ids=["share9"])
+    insert_share_pending("stale")
+    claim_tasks("worker-d", limit=1, lease_seconds=-1, share_ids=["stale"])
+    assert reclaim_expired_leases() == 1
+    assert get_share_status("stale") == "pending"
+
+
+def test_stale_lease():
+    reset_db()
+    init_db()
+
+    insert_share_pending("slow")
+    claim_tasks("worker-a", limit=1, lease_seconds=-1)
+    record_share_content("slow", [("fp-a", "a.mkv", 100)], owner="worker-a")
+    assert reclaim_expired_leases() == 1
+    claim_tasks("worker-b", limit=1)
+
+    # worker-a's late results don't touch the share worker-b now holds
+    assert mark_share_submitted("slow", "task-a", 60, owner="worker-a") == 0
+    assert mark_share_saved("slow", "fid-a", owner="worker-a") == 0
+    assert mark_share_failed("slow", "boom", owner="worker-a") == 0
+    assert mark_share_retry("slow", "boom", 60, owner="worker-a") == 0
+    assert mark_share_duplicate("slow", 1, 100, owner="worker-a") == 0
+    assert get_share_status("slow") == "processing"
+    assert find_indexed_content(["fp-a"]) == set()
+
+    # The tracker writes only while the share still waits on its task
+    assert mark_share_submitted("slow", "task-b", 60, owner="worker-b") == 1
+    assert mark_share_saved("slow", "fid-a", task_id="task-a") == 0
+    assert mark_share_saved("slow", "fid-b", task_id="task-b") == 1
+    assert get_share_status("slow") == "saved"
+
+
+def test_retry_schedule():
+    reset_db()
+    init_db()
+
+    insert_share_pending("later")
+    insert_share_pending("due")
+    claim_tasks("worker-a", limit=10)
+
+    mark_share_retry("later", "HTTP 502", delay=3600)
+    mark_share_retry("due", "HTTP 502", delay=-1)
+    mark_share_retry("due", "HTTP 502", delay=-1)
+
+    rows = claim_tasks("worker-a", limit=10)
+    assert rows == [{"share_id": "due", "attempts": 2, "passcode": None}]
+    assert get_share_status("later") == "pending"
+    assert get_next_attempt_at() > 0
+
+
+def test_submitted_tasks():
+    reset_db()
+    init_db()
+
+    insert_share_pending("big")
+    claim_tasks("worker-a", limit=10)
+    mark_share_submitted("big", "task-1", check_delay=-1, account="alt")
+    assert get_share_status("big") == "submitted"
+    assert claim_tasks("worker-a", limit=10) == []
+
+    rows = claim_submitted_tasks(limit=10, recheck_after=300)
+    assert rows == [
+        {
+            "share_id": "big",
+            "task_id": "task-1",
+            "task_checks": 1,
+            "attempts": 0,
+            "account": "alt",
+        }
+    ]
+    # Pushed back until the check is rescheduled
+    assert claim_submitted_tasks(limit=10, recheck_after=300) == []
+
+    schedule_task_check("big", delay=-1)
+    assert claim_submitted_tasks(limit=10, recheck_after=300)[0]["task_checks"] == 2
+
+    # An account that lost its cookie hands its tasks back to the queue
+    assert release_account_tasks("other") == []
+    assert release_account_tasks("alt") == ["big"]
+    assert get_share_status("big") == "pending"
+    claim_tasks("worker-a", limit=10)
+    mark_share_submitted("big", "task-2", check_delay=-1, account="default")
+
+    mark_share_saved("big", "fid-1,fid-2")
+    assert get_share_status("big") == "saved"
+    assert list_shares()[0]["account"] == "default"
+
+
+def test_content_index():
+    reset_db()
+    init_db()
+
+    insert_share_pending("first")
+    insert_share_pending("reshare")
+    record_share_content("first", [("fp-a", "a.mkv", 100), ("fp-b", "b.mkv", 50)])
+    assert find_indexed_content(["fp-a", "fp-b"]) == set()
+
+    mark_share_saved("first", "fid-1")
+    assert find_indexed_content(["fp-a", "fp-c"]) == {"fp-a"}
+
+    mark_share_duplicate("reshare", 2, 150)
+    assert get_share_status("reshare") == "duplicate"
+    report = get_dedup_report()
+    assert report["shares_skipped"] == 1
+    assert report["bytes_skipped"] == 150
+    assert report["indexed_files"] == 2
+
+
+def test_channels():
+    reset_db()
+    init_db()
+
+    insert_tg_message("@legacy", 41)
+    assert sync_channels(["@legacy"]) == [{"channel": "@legacy", "peer_id": None}]
+
+    set_channel_peer("@legacy", -1001, "Legacy", legacy_key="@legacy")
+    assert get_last_message_id("-1001") == 41
+    assert get_last_message_id("@legacy") is None
+
+    assert add_channel("@added")
+    assert remove_channel("@legacy")
+    # Configured channels removed at runtime stay removed
+    assert [row["channel"] for row in sync_channels(["@legacy"])] == ["@added"]
+
+
+def test_trace_spans():
+    reset_db()
+    init_db()
+
+    record_spans(
+        [
+            ("slow", "queue_wait", 100.0, 2000.0, 0, None),
+            ("slow", "save_share", 102.0, 500.0, 1, "TimeoutError"),
+            ("fast", "save_share", 101.0, 10.0, 0, None),
+        ]
+    )
+    assert [span["name"] for span in get_trace("slow")] == ["queue_wait", "save_share"]
+
+    slowest = get_slowest_traces(since=0, limit=10)
+    assert [row["share_id"] for row in slowest] == ["slow", "fast"]
+    assert slowest[0]["total_ms"] == 2500.0
+    assert slowest[0]["errors"] == 1
+
+    # Only the newest max_spans rows are kept
+    record_spans([("new", "save_share", 103.0, 1.0, 0, None)], max_spans=2)
+    assert get_trace("slow") == []
+    assert len(get_trace("fast")) == 1
+
+
+def test_list_shares():
+    reset_db()
+    init_db()
+    ingest_messages([("chan", i, [f"s{i:02d}"]) for i in range(25)])
+    with get_db() as conn:
+        # Distinct times, newest last; two rows share one to test the tie-break
+        conn.execute(
+            "UPDATE quark_shares SET updated_at = datetime(1000 + CAST(substr(share_id, 2) AS INTEGER) / 2 * 60, 'unixepoch')"
+        )
+    for i in range(0, 25, 5):
+        mark_share_failed(f"s{i:02d}", f"Share expired #{i}")
+
+    # Keyset pages cover every row exactly once, newest first
+    seen, after = [], None
+    while True:
+        page = list_shares(after=after, limit=4)
+        seen += [row["share_id"] for row in page]
+        if len(page) < 4:
+            break
+        after = (page[-1]["updated_at"], page[-1]["share_id"])
+    assert len(seen) == 25 and len(set(seen)) == 25
+    assert seen[:5] == ["s20", "s15", "s10", "s05", "s00"]
+
+    assert len(list_shares(status="failed", error="EXPIRED")) == 5
+    assert [row["share_id"] for row in list_shares(since=1000, until=1120)] == [
+        "s03",
+        "s02",
+        "s01",
+    ]
+
+    # Only pending shares are cancelled; failed and cancelled ones requeue
+    assert cancel_shares(["s01", "s02", "s05"]) == 2
+    assert get_share_status("s05") == "failed"
+    assert sorted(requeue_shares(["s01", "s05", "s06"])) == ["s01", "s05", "s06"]
+    assert get_share_status("s01") == "pending"
+    assert get_share_status("s02") == "cancelled"
+    assert claim_tasks("w", limit=100)
+
+
+def test_backfill_requests():
+    reset_db()
+    init_db()
+
+    queue_backfill("@first")
+    queue_backfill("@second", from_id=5000)
+    requests = get_backfill_requests()
+    assert [(r["channel"], r["from_id"]) for r in requests] == [
+        ("@first", 0),
+        ("@second", 5000),
+    ]
+    finish_backfill_request(requests[0]["id"])
+    assert [r["channel"] for r in get_backfill_requests()] == ["@second"]
+
+
+def test_redundant_status_index_dropped():
+    reset_db()
+    init_db()
+    with get_db() as conn:
+        conn.execute("CREATE INDEX idx_quark_shares_status ON quark_shares(status)")
+    init_db()
+
+    with get_db() as conn:
+        names = {
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM quark_shares WHERE status = 'pending'"
+        ).fetchone()
+    assert "idx_quark_shares_status" not in names
+    assert "USING COVERING INDEX" in plan[-1]
+
+
 if __name__ == "__main__":
     test_db()
+    test_connection_reuse()
+    test_ingest_messages()
+    test_claim_tasks()
+    test_stale_lease()
+    test_retry_schedule()
+    test_submitted_tasks()
+    test_content_index()
+    test_channels()
+    test_trace_spans()
+    test_list_shares()
+    test_backfill_requests()
+    test_redundant_status_index_dropped()
@@ -1,11 +1,18 @@
+import argparse
 import asyncio
 import logging
+import signal
 import sys
-import threading
 from app.telegram.listener import TelegramListener
 from app.tasks.worker import QuarkWorker
-from app.db import init_db
-from app.web.app import run_web_server
+from app import db_async
+from app.db import init_db, close_db, get_storage_stats, queue_backfill, vacuum
+from app.utils.loop_monitor import LoopLagMonitor
+from app.utils.notifier import TelegramNotifier
+from app.settings import LiveSettings
+from app.tasks.retention import RetentionJob
+from app.config import TG_CHANNEL_REFRESH, WORKER_SHUTDOWN_TIMEOUT
+from app.web.app import start_web_server
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,32 +31,163 @@ async def main():
 
     init_db()
     logger.info("Database initialized")
+    # Ingestion works meanwhile; the DB catches what the cache does not know yet
+    warm_task = asyncio.create_task(db_async.warm_dedup_cache())
 
-    web_thread = threading.Thread(
-        target=run_web_server, kwargs={"host": "0.0.0.0", "port": 8080}, daemon=True
+    # Watches .env and the settings table; the worker and WebUI share it
+    settings = LiveSettings()
+    await settings.load()
+    settings_task = asyncio.create_task(settings.run())
+
+    retention = RetentionJob()
+    retention_task = asyncio.create_task(retention.run())
+
+    listener = TelegramListener()
+    # The WebUI shares this loop, the DB facade and the listener's client
+    await listener.connect()
+    # Notifications go out over the listener's connection once it is logged in
+    notifier = TelegramNotifier(listener.client)
+    worker = QuarkWorker(notifier=notifier, settings=settings)
+    web_runner = await start_web_server(
+        host="0.0.0.0",
+        port=8080,
+        listener=listener,
+        settings=settings,
+        retention=retention,
+        worker=worker,
     )
-    web_thread.start()
     logger.info("WebUI started on http://0.0.0.0:8080")
 
-    listener = TelegramListener()
-    worker = QuarkWorker()
+    worker_task = None
+    notifier_task = None
+
+    loop_monitor = LoopLagMonitor()
+    monitor_task = asyncio.create_task(loop_monitor.run())
 
     try:
         await listener.start()
 
+        notifier_task = asyncio.create_task(notifier.run())
         worker_task = asyncio.create_task(worker.run())
 
         await listener.listen()
 
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("Shutting down...")
-        worker.stop()
+
+    finally:
+        if worker_task is not None:
+            worker.stop()
+            try:
+                await asyncio.wait_for(worker_task, timeout=WORKER_SHUTDOWN_TIMEOUT + 5)
+            except asyncio.TimeoutError:
+                logger.warning("Worker did not stop gracefully")
+        if notifier_task is not None:
+            await notifier.stop()
+            await asyncio.gather(notifier_task, return_exceptions=True)
+        retention.stop()
+        warm_task.cancel()
+        await asyncio.gather(warm_task, retention_task, return_exceptions=True)
+        await web_runner.cleanup()
         await listener.stop()
-        try:
-            await asyncio.wait_for(worker_task, timeout=5)
-        except asyncio.TimeoutError:
-            logger.warning("Worker did not stop gracefully")
+        settings.stop()
+        settings_task.cancel()
+        loop_monitor.stop()
+        monitor_task.cancel()
+        db_async.shutdown()
+        close_db()
+
+
+async def run_worker():
+    """Worker-only mode: process the shared queue without listener or WebUI."""
+    logger.info("Starting QuarkFlow worker...")
+
+    init_db()
+
+    worker = QuarkWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    loop_monitor = LoopLagMonitor()
+    monitor_task = asyncio.create_task(loop_monitor.run())
+
+    try:
+        await worker.run()
+    finally:
+        loop_monitor.stop()
+        monitor_task.cancel()
+        db_async.shutdown()
+        close_db()
+
+
+def request_backfill(channel: str, from_id: int):
+    """
+    Queue a backfill of a channel's history for the running app.
+
+    The app's listener holds the Telegram session, so the CLI doesn't open
+    it; the listener runs the request on its own connection.
+    """
+    init_db()
+    try:
+        queue_backfill(channel, from_id)
+        logger.info(
+            f"Backfill of {channel} after id={from_id} queued; the running app "
+            f"picks it up within {TG_CHANNEL_REFRESH:.0f}s"
+        )
+    finally:
+        close_db()
+
+
+def compact():
+    """Rebuild the database file with incremental vacuum; the app must be stopped."""
+    init_db()
+    try:
+        before = get_storage_stats()
+        logger.info(
+            f"Compacting {before['size_bytes'] / 1024 / 1024:.1f} MB "
+            f"(auto_vacuum={before['auto_vacuum']})..."
+        )
+        vacuum()
+        after = get_storage_stats()
+        logger.info(
+            f"Compacted to {after['size_bytes'] / 1024 / 1024:.1f} MB "
+            f"(auto_vacuum={after['auto_vacuum']})"
+        )
+    finally:
+        close_db()
+
+
+def cli():
+    parser = argparse.ArgumentParser(prog="python -m app.main")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="listener, worker and WebUI (default)")
+    subparsers.add_parser(
+        "worker", help="worker only; run several against the same database"
+    )
+    backfill = subparsers.add_parser(
+        "backfill",
+        help="queue a channel's full history for the running app to ingest",
+    )
+    backfill.add_argument("channel", help="channel username, e.g. @D_wusun")
+    backfill.add_argument(
+        "--from-id", type=int, default=0, help="only messages after this id"
+    )
+    subparsers.add_parser(
+        "compact",
+        help="rebuild the database file and enable incremental vacuum (stop the app first)",
+    )
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        asyncio.run(run_worker())
+    elif args.command == "backfill":
+        request_backfill(args.channel, args.from_id)
+    elif args.command == "compact":
+        compact()
+    else:
+        asyncio.run(main())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    cli()
@@ -1,11 +1,39 @@
 """Quark cloud drive client for saving shared links (Mobile API)."""
 
 import httpx
+import json
 import logging
 import re
+import time
+from typing import Optional
 from urllib.parse import urlencode
 
-from app.config import QUARK_COOKIE
+from app.config import (
+    QUARK_COOKIE,
+    QUARK_BASE_URL_PC,
+    QUARK_BASE_URL_APP,
+    QUARK_HTTP2,
+    QUARK_MAX_CONNECTIONS,
+    QUARK_MAX_KEEPALIVE,
+    QUARK_KEEPALIVE_EXPIRY,
+    QUARK_CONNECT_TIMEOUT,
+    QUARK_TIMEOUT,
+    QUARK_RATE_TOKEN,
+    QUARK_RATE_SAVE,
+    QUARK_RATE_LIST,
+    QUARK_RATE_TASK,
+    QUARK_RATE_BURST,
+    QUARK_TARGET_LATENCY,
+    QUARK_THROTTLE_PENALTY,
+    QUARK_THROTTLE_COOLDOWN,
+    WORKER_CONCURRENT_TASKS,
+    WORKER_MIN_CONCURRENCY,
+    DRIVE_TREE_TTL,
+)
+from app.quark.ratelimit import AIMDController, TokenBucket
+from app.quark.tree import DriveTree
+from app.utils.metrics import QUARK_CALL_SECONDS
+from app.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +43,112 @@ logging.getLogger("httpx").propagate = False
 logging.getLogger("httpcore").setLevel(logging.CRITICAL)
 logging.getLogger("httpcore").propagate = False
 
+# Failed results carry an "error_class"; these are worth retrying later.
+# Errors without a recognizable reason ("unknown", "stoken") are retried
+# too, until WORKER_MAX_ATTEMPTS; only a share known to be unusable
+# (share_invalid) fails at once.
+RETRYABLE_ERRORS = {
+    "network",
+    "http_5xx",
+    "throttled",
+    "cookie_expired",
+    "stoken",
+    "invalid_response",
+    "unknown",
+}
+
+_THROTTLE_MARKERS = ("频繁", "稍后", "too many", "rate limit")
+# The share itself is gone or unusable, retrying cannot help
+_PERMANENT_MARKERS = (
+    "不存在",
+    "失效",
+    "过期",
+    "取消",
+    "删除",
+    "违规",
+    "封禁",
+    "提取码",
+    "not exist",
+    "expired",
+)
+
+
+def _is_cookie_expired(message: str, code=None) -> bool:
+    lowered = message.lower()
+    return (
+        code == 401
+        or code == 403
+        or "登录" in message
+        or "require login" in lowered
+        or "cookie" in lowered
+        or "token" in lowered
+        and "invalid" in lowered
+    )
+
+
+def classify_api_error(message: str, code=None) -> str:
+    """Map a Quark API error message/code to an error class."""
+    lowered = message.lower()
+    if _is_cookie_expired(message, code):
+        return "cookie_expired"
+    if any(marker in lowered for marker in _THROTTLE_MARKERS):
+        return "throttled"
+    if any(marker in lowered for marker in _PERMANENT_MARKERS):
+        return "share_invalid"
+    return "unknown"
+
+
+def classify_exception(e: Exception) -> tuple[str, str]:
+    """Map a request exception to (error message, error class)."""
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        if status == 429:
+            error_class = "throttled"
+        elif status in (401, 403):
+            error_class = "cookie_expired"
+        elif status >= 500:
+            error_class = "http_5xx"
+        else:
+            error_class = "http_4xx"
+        return f"HTTP {status}", error_class
+    if isinstance(e, httpx.TransportError):
+        return f"HTTP request failed ({type(e).__name__})", "network"
+    if isinstance(e, ValueError):
+        return "Invalid response", "invalid_response"
+    return "HTTP request failed", "network"
+
+
+def _failure(share_id: str, error: str, error_class: str) -> dict:
+    return {
+        "success": False,
+        "error": error,
+        "share_id": share_id,
+        "error_class": error_class,
+        "retryable": error_class in RETRYABLE_ERRORS,
+        "cookie_expired": error_class == "cookie_expired",
+    }
+
 
 class QuarkClient:
-    def __init__(self):
-        self.cookie = QUARK_COOKIE
-        self.base_url_pc = "https://drive-h.quark.cn"
-        self.base_url_app = "https://drive-m.quark.cn"
+    """
+    One Quark account: its cookie, connection pool, rate limits and
+    concurrency limit. Without arguments it is the main account (QUARK_COOKIE).
+    """
+
+    def __init__(
+        self,
+        cookie: Optional[str] = None,
+        name: str = "default",
+        max_concurrency: Optional[int] = None,
+    ):
+        self.name = name
+        self.cookie = QUARK_COOKIE if cookie is None else cookie
+        self.base_url_pc = QUARK_BASE_URL_PC.rstrip("/")
+        self.base_url_app = QUARK_BASE_URL_APP.rstrip("/")
         self.share_url = "https://pan.quark.cn"
 
         # Extract mparam from cookie (kps, sign, vcode)
-        self.mparam = self._extract_mparam_from_cookie()
+        self.mparam = self._extract_mparam_from_cookie(self.cookie)
 
         self.headers = {
             "Content-Type": "application/json",
@@ -34,25 +158,185 @@ class QuarkClient:
             "Cookie": self.cookie,
         }
 
-    def reload_cookie(self):
-        """Reload cookie from config and update headers."""
-        from app.config import QUARK_COOKIE
+        # Shared connection pool, created lazily and closed by close()
+        self._http = None
+        self.pool_stats = {
+            "http2": False,
+            "requests": 0,
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "handshake_ms_total": 0.0,
+            "handshake_ms_max": 0.0,
+        }
 
-        if QUARK_COOKIE != self.cookie:
-            logger.info("[QUARK] Cookie changed, reloading...")
-            self.cookie = QUARK_COOKIE
-            self.mparam = self._extract_mparam_from_cookie()
-            self.headers["Cookie"] = self.cookie
-            logger.info("[QUARK] Cookie reloaded successfully")
+        # Per-endpoint request rate, plus an adaptive limit on concurrent
+        # saves that the worker reads before dispatching
+        self.buckets = {
+            "token": TokenBucket(QUARK_RATE_TOKEN, QUARK_RATE_BURST),
+            "detail": TokenBucket(QUARK_RATE_TOKEN, QUARK_RATE_BURST),
+            "save": TokenBucket(QUARK_RATE_SAVE, QUARK_RATE_BURST),
+            "sort": TokenBucket(QUARK_RATE_LIST, QUARK_RATE_BURST),
+            "task": TokenBucket(QUARK_RATE_TASK, QUARK_RATE_BURST),
+            "file": TokenBucket(QUARK_RATE_LIST, QUARK_RATE_BURST),
+        }
+        # Folder lookups go through this cache, shared by everything using the client
+        self.tree = DriveTree(self, DRIVE_TREE_TTL)
+        self.concurrency = AIMDController(
+            minimum=WORKER_MIN_CONCURRENCY,
+            maximum=max_concurrency or WORKER_CONCURRENT_TASKS,
+            target_latency=QUARK_TARGET_LATENCY,
+            cooldown=QUARK_THROTTLE_COOLDOWN,
+        )
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        http2 = QUARK_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("[QUARK] h2 not installed, falling back to HTTP/1.1")
+                http2 = False
+
+        self.pool_stats["http2"] = http2
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=QUARK_MAX_CONNECTIONS,
+                max_keepalive_connections=QUARK_MAX_KEEPALIVE,
+                keepalive_expiry=QUARK_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(QUARK_TIMEOUT, connect=QUARK_CONNECT_TIMEOUT),
+        )
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = self._create_http_client()
+        return self._http
+
+    async def _request(
+        self, method: str, url: str, endpoint: str = None, **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request over the shared pool and record connection stats.
+
+        With an endpoint name the call waits on that endpoint's token bucket
+        and feeds its outcome to the concurrency controller.
+        """
+        if endpoint:
+            await self.buckets[endpoint].acquire()
+
+        handshake = {}
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                handshake["started"] = time.perf_counter()
+            elif event_name in (
+                "connection.connect_tcp.complete",
+                "connection.start_tls.complete",
+            ):
+                handshake["complete"] = time.perf_counter()
+
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(
+                method, url, extensions={"trace": trace}, **kwargs
+            )
+        except httpx.TransportError:
+            if endpoint:
+                self.concurrency.on_error()
+            raise
+
+        if endpoint:
+            if response.status_code == 429 or response.status_code >= 500:
+                self._on_throttled(endpoint)
+            else:
+                self.concurrency.on_success(time.perf_counter() - started)
+
+        stats = self.pool_stats
+        stats["requests"] += 1
+        if "started" in handshake:
+            elapsed_ms = (
+                handshake.get("complete", handshake["started"]) - handshake["started"]
+            ) * 1000
+            stats["connections_opened"] += 1
+            stats["handshake_ms_total"] += elapsed_ms
+            stats["handshake_ms_max"] = max(stats["handshake_ms_max"], elapsed_ms)
+        else:
+            stats["connections_reused"] += 1
+
+        return response
+
+    def _on_throttled(self, endpoint: str):
+        logger.warning(f"[QUARK] {self.name}: throttled on {endpoint}, backing off")
+        self.concurrency.on_throttle()
+        self.buckets[endpoint].penalize(QUARK_THROTTLE_PENALTY)
+
+    def get_limits(self) -> dict:
+        """Current concurrency limit and per-endpoint rate limiter state."""
+        return {
+            "concurrency": self.concurrency.snapshot(),
+            "buckets": {
+                name: bucket.snapshot() for name, bucket in self.buckets.items()
+            },
+        }
 
-    def _extract_mparam_from_cookie(self) -> dict:
+    def get_pool_stats(self) -> dict:
+        """Snapshot of connection pool counters."""
+        stats = dict(self.pool_stats)
+        opened = stats["connections_opened"]
+        stats["handshake_ms_avg"] = (
+            stats["handshake_ms_total"] / opened if opened else 0.0
+        )
+        return stats
+
+    async def warmup(self):
+        """Open pooled connections to the Quark API hosts ahead of the first share."""
+        base_url = self.base_url_app if self.mparam else self.base_url_pc
+        hosts = {base_url, self.base_url_pc}
+        for host in hosts:
+            try:
+                await self._request("HEAD", host)
+            except Exception as e:
+                logger.warning(f"[QUARK] warm-up failed for {host}: {type(e).__name__}")
+
+        stats = self.get_pool_stats()
+        logger.info(
+            f"[QUARK] connection pool warmed up "
+            f"(http2={stats['http2']}, opened={stats['connections_opened']}, "
+            f"handshake_avg={stats['handshake_ms_avg']:.0f}ms)"
+        )
+
+    async def close(self):
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    def set_cookie(self, cookie: str):
+        """
+        Switch to a new cookie.
+
+        Cookie, mparam and headers are replaced together (headers as a new
+        dict), so requests already built keep the old ones and every later
+        request uses the new ones.
+        """
+        if cookie == self.cookie:
+            return
+
+        mparam = self._extract_mparam_from_cookie(cookie)
+        self.cookie = cookie
+        self.mparam = mparam
+        self.headers = {**self.headers, "Cookie": cookie}
+        logger.info(f"[QUARK] {self.name}: cookie updated")
+
+    def _extract_mparam_from_cookie(self, cookie: str) -> dict:
         """Extract kps, sign, vcode from Quark cookie."""
         mparam = {}
 
         # Try to extract kps, sign, vcode from cookie
-        kps_match = re.search(r"(?<!\w)kps=([a-zA-Z0-9%+/=]+)[;&]?", self.cookie)
-        sign_match = re.search(r"(?<!\w)sign=([a-zA-Z0-9%+/=]+)[;&]?", self.cookie)
-        vcode_match = re.search(r"(?<!\w)vcode=([a-zA-Z0-9%+/=]+)[;&]?", self.cookie)
+        kps_match = re.search(r"(?<!\w)kps=([a-zA-Z0-9%+/=]+)[;&]?", cookie)
+        sign_match = re.search(r"(?<!\w)sign=([a-zA-Z0-9%+/=]+)[;&]?", cookie)
+        vcode_match = re.search(r"(?<!\w)vcode=([a-zA-Z0-9%+/=]+)[;&]?", cookie)
 
         if kps_match and sign_match and vcode_match:
             mparam = {
@@ -66,7 +350,14 @@ class QuarkClient:
 
         return mparam
 
-    async def get_stoken(self, share_id: str) -> str:
+    async def get_stoken(self, share_id: str, passcode: str = "") -> str:
+        result = await self._request_stoken(share_id, passcode)
+        return result.get("stoken", "")
+
+    @traced("get_stoken")
+    @QUARK_CALL_SECONDS.time(call="get_stoken")
+    async def _request_stoken(self, share_id: str, passcode: str = "") -> dict:
+        """Fetch the share token; failures are classified like save_share()."""
         # Use mobile API if mparam is available, otherwise use PC API
         if self.mparam:
             base_url = self.base_url_app
@@ -80,7 +371,7 @@ class QuarkClient:
             "fr": "pc",
             "uc_param_str": "",
             "__dt": "597",
-            "__t": str(int(__import__("time").time() * 1000)),
+            "__t": str(int(time.time() * 1000)),
         }
 
         # Add mobile-specific parameters if using mobile API
@@ -98,58 +389,160 @@ class QuarkClient:
 
         payload = {
             "pwd_id": share_id,
-            "passcode": "",
+            "passcode": passcode or "",
             "support_visit_limit_private_share": "true",
         }
 
         url = f"{base_url}{endpoint}"
 
         try:
-            import warnings
+            response = await self._request(
+                "POST",
+                url,
+                endpoint="token",
+                params=params,
+                headers=self.headers,
+                json=payload,
+            )
+            response.raise_for_status()
+
+            # 手动解码避免 ASCII 编码错误
+            text = response.content.decode("utf-8", errors="ignore")
+            data = json.loads(text)
+
+            if data.get("status") == 200 and data.get("data", {}).get("stoken"):
+                stoken = data["data"]["stoken"]
+                logger.info(f"[QUARK] got stoken for share_id={share_id}")
+                return {"success": True, "stoken": stoken, "share_id": share_id}
+            else:
+                logger.error(f"[QUARK] failed to get stoken: {data}")
+                message = str(data.get("message") or "")
+                error_class = classify_api_error(message, data.get("code"))
+                if error_class == "throttled":
+                    self._on_throttled("token")
+                elif error_class == "unknown":
+                    error_class = "stoken"
+                error = (
+                    f"Failed to get stoken: {message}"
+                    if message
+                    else "Failed to get stoken"
+                )
+                return _failure(share_id, error, error_class)
+
+        except Exception as e:
+            logger.error("[QUARK] exception getting stoken")
+            logger.error(f"[QUARK] error type: {type(e).__name__}")
+            # 不记录异常详情，避免编码错误
+            error, error_class = classify_exception(e)
+            return _failure(share_id, f"Failed to get stoken: {error}", error_class)
+
+    @traced("get_share_files")
+    async def get_share_files(
+        self, share_id: str, passcode: str = "", page_size: int = 100
+    ) -> dict:
+        """
+        Top-level entries of a share, with the stoken needed to save them.
 
-            warnings.filterwarnings("ignore", category=Warning)
+        Each file has fid, share_fid_token, file_name, size and dir.
+        """
+        token_result = await self._request_stoken(share_id, passcode)
 
-            event_hooks = {"request": [], "response": []}
+        if not token_result["success"]:
+            return token_result
 
-            async with httpx.AsyncClient(
-                timeout=30.0, event_hooks=event_hooks
-            ) as client:
-                response = await client.post(
-                    url, params=params, headers=self.headers, json=payload
+        stoken = token_result["stoken"]
+        base_url = self.base_url_app if self.mparam else self.base_url_pc
+        url = f"{base_url}/1/clouddrive/share/sharepage/detail"
+        files = []
+        page = 1
+
+        try:
+            while True:
+                params = {
+                    "pr": "ucpro",
+                    "fr": "pc",
+                    "uc_param_str": "",
+                    "pwd_id": share_id,
+                    "stoken": stoken,
+                    "pdir_fid": "0",
+                    "force": "0",
+                    "_page": str(page),
+                    "_size": str(page_size),
+                    "_fetch_banner": "0",
+                    "_fetch_share": "0",
+                    "_fetch_total": "1",
+                    "_sort": "file_type:asc,file_name:asc",
+                    "__dt": "1589",
+                    "__t": str(int(time.time() * 1000)),
+                }
+
+                response = await self._request(
+                    "GET", url, endpoint="detail", params=params, headers=self.headers
                 )
                 response.raise_for_status()
 
-                # 手动解码避免 ASCII 编码错误
-                import json
-
                 text = response.content.decode("utf-8", errors="ignore")
                 data = json.loads(text)
 
-                if data.get("status") == 200 and data.get("data", {}).get("stoken"):
-                    stoken = data["data"]["stoken"]
-                    logger.info(f"[QUARK] got stoken for share_id={share_id}")
-                    return stoken
-                else:
-                    logger.error(f"[QUARK] failed to get stoken: {data}")
-                    return ""
-
-        except Exception as e:
-            import traceback
-
-            logger.error("[QUARK] exception getting stoken")
-            logger.error(f"[QUARK] error type: {type(e).__name__}")
-            # 不记录异常详情，避免编码错误
-            return ""
+                if data.get("status") != 200:
+                    message = str(data.get("message") or "Unknown error")
+                    error_class = classify_api_error(message, data.get("code"))
+                    if error_class == "throttled":
+                        self._on_throttled("detail")
+                    return _failure(share_id, message, error_class)
+
+                batch = (data.get("data") or {}).get("list") or []
+                files.extend(
+                    {
+                        "fid": item.get("fid"),
+                        "share_fid_token": item.get("share_fid_token"),
+                        "file_name": item.get("file_name", ""),
+                        "size": item.get("size") or 0,
+                        "dir": bool(item.get("dir")),
+                    }
+                    for item in batch
+                )
 
-    async def save_share(self, share_id: str, to_pdir_fid: str = "0") -> dict:
-        stoken = await self.get_stoken(share_id)
+                total = (data.get("metadata") or {}).get("_total")
+                if len(batch) < page_size or (
+                    total is not None and len(files) >= total
+                ):
+                    return {
+                        "success": True,
+                        "stoken": stoken,
+                        "files": files,
+                        "share_id": share_id,
+                    }
+                page += 1
 
-        if not stoken:
-            return {
-                "success": False,
-                "error": "Failed to get stoken",
-                "share_id": share_id,
-            }
+        except Exception as e:
+            logger.error(
+                f"[QUARK] exception getting share detail for share_id={share_id}"
+            )
+            return _failure(share_id, *classify_exception(e))
+
+    @traced("save_share")
+    async def save_share(
+        self,
+        share_id: str,
+        to_pdir_fid: str = "0",
+        stoken: str = None,
+        files: list[dict] = None,
+        passcode: str = "",
+    ) -> dict:
+        """
+        Save a share to to_pdir_fid.
+
+        Saves everything unless files (entries from get_share_files) picks
+        a subset. Pass the stoken from get_share_files to skip fetching it again.
+        """
+        if stoken is None:
+            token_result = await self._request_stoken(share_id, passcode)
+
+            if not token_result["success"]:
+                return token_result
+
+            stoken = token_result["stoken"]
 
         # Use mobile API if mparam is available, otherwise use PC API
         if self.mparam:
@@ -182,112 +575,209 @@ class QuarkClient:
             "pdir_save_all": True,
             "scene": "link",
         }
+        if files is not None:
+            payload.update(
+                {
+                    "pdir_save_all": False,
+                    "fid_list": [file["fid"] for file in files],
+                    "fid_token_list": [file["share_fid_token"] for file in files],
+                }
+            )
 
         url = f"{base_url}{endpoint}?{urlencode(params)}"
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, headers=self.headers, json=payload)
-                response.raise_for_status()
-
-                import json
+            # Only the save request; a stoken fetched above is timed as get_stoken
+            with QUARK_CALL_SECONDS.time(call="save_share"):
+                response = await self._request(
+                    "POST", url, endpoint="save", headers=self.headers, json=payload
+                )
+            response.raise_for_status()
 
-                text = response.content.decode("utf-8", errors="ignore")
-                data = json.loads(text)
+            text = response.content.decode("utf-8", errors="ignore")
+            data = json.loads(text)
 
-                if data.get("code") == 0:
-                    logger.info(
-                        f"[QUARK] saved share_id={share_id}, task_id={data['data'].get('task_id')}"
-                    )
-                    return {
-                        "success": True,
-                        "task_id": data["data"].get("task_id"),
-                        "share_id": share_id,
-                    }
-                else:
-                    error_msg = data.get("message", "Unknown error")
-                    error_code = data.get("code", -1)
+            if data.get("code") == 0:
+                logger.info(
+                    f"[QUARK] saved share_id={share_id}, task_id={data['data'].get('task_id')}"
+                )
+                return {
+                    "success": True,
+                    "task_id": data["data"].get("task_id"),
+                    "share_id": share_id,
+                }
+            else:
+                error_msg = data.get("message", "Unknown error")
+                error_code = data.get("code", -1)
 
-                    logger.error(f"[QUARK] failed for share_id={share_id}: {error_msg}")
+                logger.error(f"[QUARK] failed for share_id={share_id}: {error_msg}")
 
-                    is_cookie_expired = (
-                        error_code == 401
-                        or error_code == 403
-                        or "登录" in error_msg
-                        or "cookie" in error_msg.lower()
-                        or "token" in error_msg.lower()
-                        and "invalid" in error_msg.lower()
-                    )
+                error_class = classify_api_error(error_msg, error_code)
+                if error_class == "throttled":
+                    self._on_throttled("save")
 
-                    return {
-                        "success": False,
-                        "error": error_msg,
-                        "share_id": share_id,
-                        "cookie_expired": is_cookie_expired,
-                    }
+                return _failure(share_id, error_msg, error_class)
 
         except httpx.HTTPStatusError as e:
             logger.error(
                 f"[QUARK] HTTP error for share_id={share_id}: {e.response.status_code}"
             )
-            return {
-                "success": False,
-                "error": f"HTTP {e.response.status_code}",
-                "share_id": share_id,
-            }
+            return _failure(share_id, *classify_exception(e))
         except Exception as e:
             logger.error(f"[QUARK] exception for share_id={share_id}")
-            return {
-                "success": False,
-                "error": "HTTP request failed",
-                "share_id": share_id,
-            }
+            return _failure(share_id, *classify_exception(e))
+
+    @traced("get_task_status")
+    async def get_task_status(self, task_id: str, retry_index: int = 0) -> dict:
+        """
+        Query a server-side save task.
+
+        On success "state" is "running", "finished" (with the saved top-level
+        "fids") or "failed" (with "error"), the last only when the task
+        itself failed. A query Quark rejects is success False with an
+        "error_class", and the task should be checked again later.
+        """
+        base_url = self.base_url_app if self.mparam else self.base_url_pc
+        endpoint = "/1/clouddrive/task"
 
-    async def get_file_list(self, pdir_fid: str = "0") -> dict:
-        endpoint = "/1/clouddrive/file/sort"
         params = {
             "pr": "ucpro",
             "fr": "pc",
             "uc_param_str": "",
-            "pdir_fid": pdir_fid,
-            "_page": "1",
-            "_size": "100",
-            "__dt": "300",
-            "__t": str(int(__import__("time").time() * 1000)),
+            "task_id": task_id,
+            "retry_index": str(retry_index),
+            "__dt": "21192",
+            "__t": str(int(time.time() * 1000)),
         }
 
+        if self.mparam:
+            params.update(
+                {
+                    "kps": self.mparam.get("kps"),
+                    "sign": self.mparam.get("sign"),
+                    "vcode": self.mparam.get("vcode"),
+                    "device_model": "M2011K2C",
+                    "fr": "android",
+                    "pf": "3300",
+                }
+            )
+
+        url = f"{base_url}{endpoint}"
+
+        try:
+            response = await self._request(
+                "GET", url, endpoint="task", params=params, headers=self.headers
+            )
+            response.raise_for_status()
+
+            text = response.content.decode("utf-8", errors="ignore")
+            data = json.loads(text)
+
+            code = data.get("code", 0)
+            if code != 0:
+                # The query failed, not the task: throttling, an expired
+                # cookie or a hiccup say nothing about the save itself
+                message = str(data.get("message") or "Unknown error")
+                error_class = classify_api_error(message, code)
+                if error_class == "throttled":
+                    self._on_throttled("task")
+                return {"success": False, "error": message, "error_class": error_class}
+
+            task = data.get("data") or {}
+            # 2 = finished, 3 = failed, anything else is still running
+            if task.get("status") == 2:
+                fids = (task.get("save_as") or {}).get("save_as_top_fids") or []
+                return {"success": True, "state": "finished", "fids": fids}
+            if task.get("status") == 3:
+                return {
+                    "success": True,
+                    "state": "failed",
+                    "error": task.get("message") or "Save task failed",
+                }
+            return {"success": True, "state": "running"}
+
+        except Exception as e:
+            logger.error(f"[QUARK] exception getting task status task_id={task_id}")
+            error, error_class = classify_exception(e)
+            return {"success": False, "error": error, "error_class": error_class}
+
+    async def get_file_list(self, pdir_fid: str = "0", page_size: int = 100) -> dict:
+        """List every entry of a folder, following pages until the listing ends."""
+        endpoint = "/1/clouddrive/file/sort"
         url = f"{self.base_url_pc}{endpoint}"
+        files = []
+        page = 1
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, params=params, headers=self.headers)
-                response.raise_for_status()
+            while True:
+                params = {
+                    "pr": "ucpro",
+                    "fr": "pc",
+                    "uc_param_str": "",
+                    "pdir_fid": pdir_fid,
+                    "_page": str(page),
+                    "_size": str(page_size),
+                    "__dt": "300",
+                    "__t": str(int(time.time() * 1000)),
+                }
 
-                import json
+                response = await self._request(
+                    "GET", url, endpoint="sort", params=params, headers=self.headers
+                )
+                response.raise_for_status()
 
                 text = response.content.decode("utf-8", errors="ignore")
                 data = json.loads(text)
 
-                if data.get("status") == 200 and data.get("data", {}).get("list"):
-                    return {"success": True, "files": data["data"]["list"]}
-                else:
+                if data.get("status") != 200:
                     return {
                         "success": False,
                         "error": data.get("message", "Unknown error"),
                     }
 
+                # An empty folder is a valid listing
+                batch = (data.get("data") or {}).get("list") or []
+                files.extend(batch)
+
+                total = (data.get("metadata") or {}).get("_total")
+                if len(batch) < page_size or (
+                    total is not None and len(files) >= total
+                ):
+                    return {"success": True, "files": files}
+                page += 1
+
         except Exception as e:
             logger.error("[QUARK] exception getting file list")
             return {"success": False, "error": "HTTP request failed"}
 
-    async def find_folder_by_name(self, folder_name: str, pdir_fid: str = "0") -> str:
-        result = await self.get_file_list(pdir_fid)
+    async def create_folder(self, pdir_fid: str, folder_name: str) -> dict:
+        endpoint = "/1/clouddrive/file"
+        params = {"pr": "ucpro", "fr": "pc", "uc_param_str": ""}
+        payload = {
+            "pdir_fid": pdir_fid,
+            "file_name": folder_name,
+            "dir_path": "",
+            "dir_init_lock": False,
+        }
+
+        url = f"{self.base_url_pc}{endpoint}?{urlencode(params)}"
+
+        try:
+            response = await self._request(
+                "POST", url, endpoint="file", headers=self.headers, json=payload
+            )
+            response.raise_for_status()
+
+            text = response.content.decode("utf-8", errors="ignore")
+            data = json.loads(text)
 
-        if not result.get("success"):
-            return ""
+            if data.get("code") == 0:
+                return {"success": True, "fid": data["data"]["fid"]}
+            return {"success": False, "error": data.get("message", "Unknown error")}
 
-        for file in result.get("files", []):
-            if file.get("file_name") == folder_name and file.get("dir") == True:
-                return file.get("fid")
+        except Exception as e:
+            logger.error(f"[QUARK] exception creating folder {folder_name}")
+            return {"success": False, "error": "HTTP request failed"}
 
-        return ""
+    async def find_folder_by_name(self, folder_name: str, pdir_fid: str = "0") -> str:
+        return await self.tree.find_folder(folder_name, pdir_fid) or ""
@@ -0,0 +1,132 @@
+"""Test QuarkClient against canned Quark API responses."""
+
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.quark.client import QuarkClient
+from app.utils.metrics import QUARK_CALL_SECONDS
+
+TOKEN_OK = {"status": 200, "code": 0, "data": {"stoken": "st"}}
+
+# (case, endpoint that fails, its payload, error_class, retryable)
+CASES = [
+    (
+        "expired share",
+        "token",
+        {"status": 400, "code": 41012, "message": "分享地址已失效"},
+        "share_invalid",
+        False,
+    ),
+    (
+        "deleted share",
+        "token",
+        {"status": 404, "code": 41006, "message": "分享不存在"},
+        "share_invalid",
+        False,
+    ),
+    (
+        "bad passcode",
+        "token",
+        {"status": 400, "code": 41008, "message": "提取码错误"},
+        "share_invalid",
+        False,
+    ),
+    (
+        "throttled",
+        "save",
+        {"status": 429, "code": 32003, "message": "请求过于频繁，请稍后再试"},
+        "throttled",
+        True,
+    ),
+    (
+        "cookie expired",
+        "save",
+        {"status": 401, "code": 31001, "message": "require login [guest]"},
+        "cookie_expired",
+        True,
+    ),
+    (
+        "unknown save error",
+        "save",
+        {"status": 400, "code": 41033, "message": "分享者存储空间不足"},
+        "unknown",
+        True,
+    ),
+    (
+        "unknown stoken error",
+        "token",
+        {"status": 400, "code": 41099, "message": "系统错误"},
+        "stoken",
+        True,
+    ),
+]
+
+
+def save_with(endpoint: str, payload: dict) -> dict:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            body = payload if endpoint == "token" else TOKEN_OK
+        else:
+            body = payload
+        # Quark reports API errors in the body of a 200 response
+        return httpx.Response(200, json=body)
+
+    async def run():
+        client = QuarkClient("cookie", "test")
+        for bucket in client.buckets.values():
+            bucket.rate = 0
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.save_share("s1")
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_error_classes():
+    for case, endpoint, payload, error_class, retryable in CASES:
+        result = save_with(endpoint, payload)
+        assert not result["success"], case
+        assert (result["error_class"], result["retryable"]) == (
+            error_class,
+            retryable,
+        ), case
+        assert result["cookie_expired"] == (error_class == "cookie_expired"), case
+
+
+def test_save_timing_excludes_stoken():
+    def timed(call: str) -> tuple[float, int]:
+        _, total, count = QUARK_CALL_SECONDS.values.get((call,), (None, 0.0, 0))
+        return total, count
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json=TOKEN_OK)
+        return httpx.Response(200, json={"status": 200, "code": 0, "data": {}})
+
+    async def run():
+        client = QuarkClient("cookie", "test")
+        for bucket in client.buckets.values():
+            bucket.rate = 0
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.save_share("s1")
+        finally:
+            await client.close()
+
+    stoken_before, save_before = timed("get_stoken"), timed("save_share")
+    assert asyncio.run(run())["success"]
+    stoken_total, stoken_count = timed("get_stoken")
+    save_total, save_count = timed("save_share")
+    assert (stoken_count, save_count) == (stoken_before[1] + 1, save_before[1] + 1)
+    assert stoken_total - stoken_before[0] >= 0.2
+    assert save_total - save_before[0] < 0.2
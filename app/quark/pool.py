@@ -0,0 +1,194 @@
+"""Pool of Quark accounts that saves are spread across."""
+
+import logging
+import time
+from typing import Optional
+
+from app.config import QUARK_ACCOUNTS, QUARK_ACCOUNT_QUARANTINE
+from app.quark.client import QuarkClient
+from app.utils.metrics import ACCOUNT_QUARANTINED_UNTIL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACCOUNT = "default"
+
+
+class QuarkAccount:
+    """
+    One account of the pool: its client and the saves running on it.
+
+    target_folder and concurrency are None when the account follows the
+    worker's live TARGET_FOLDER_NAME and WORKER_CONCURRENT_TASKS.
+    """
+
+    def __init__(
+        self,
+        client: QuarkClient,
+        target_folder: Optional[str] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.client = client
+        self.target_folder = target_folder
+        self.concurrency = concurrency
+        self.in_flight = 0
+        # While quarantined no saves are routed here
+        self.quarantined_until = 0.0
+        self.last_error = ""
+        # Set once the expired cookie was alerted; cleared when it works again
+        self.alerted = False
+
+    @property
+    def name(self) -> str:
+        return self.client.name
+
+    @property
+    def limit(self) -> int:
+        return self.client.concurrency.limit
+
+    def quarantined(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.quarantined_until
+
+
+class AccountPool:
+    """
+    The main account (QUARK_COOKIE) plus the QUARK_ACCOUNTS extras.
+
+    Each account has its own client, so cookie, mparam, connection pool,
+    rate limits, adaptive concurrency and folder cache are all per account.
+    acquire() routes a save to the healthy account with the lowest share
+    of its concurrency limit in use. An account whose cookie expired is
+    quarantined for QUARK_ACCOUNT_QUARANTINE seconds, or until it gets a
+    new cookie, and the others carry on.
+
+    Accounts without a cookie are left out, unless the main account is
+    the only one. Used from the event loop only.
+    """
+
+    def __init__(
+        self,
+        accounts: Optional[dict[str, dict]] = None,
+        quarantine: float = QUARK_ACCOUNT_QUARANTINE,
+    ):
+        accounts = QUARK_ACCOUNTS if accounts is None else accounts
+        self.quarantine_seconds = quarantine
+        self.accounts: dict[str, QuarkAccount] = {
+            DEFAULT_ACCOUNT: QuarkAccount(QuarkClient())
+        }
+        for name, options in accounts.items():
+            concurrency = options.get("concurrency") or None
+            self.accounts[name] = QuarkAccount(
+                QuarkClient(options["cookie"], name, concurrency),
+                target_folder=options.get("target_folder"),
+                concurrency=concurrency,
+            )
+        for name in self.accounts:
+            ACCOUNT_QUARANTINED_UNTIL.set(0, account=name)
+
+    @property
+    def default(self) -> QuarkAccount:
+        return self.accounts[DEFAULT_ACCOUNT]
+
+    def get(self, name: Optional[str]) -> QuarkAccount:
+        """The named account; shares recorded before the pool used the main one."""
+        return self.accounts.get(name or DEFAULT_ACCOUNT, self.default)
+
+    def _enabled(self, account: QuarkAccount) -> bool:
+        return bool(account.client.cookie) or len(self.accounts) == 1
+
+    def healthy(self) -> list[QuarkAccount]:
+        now = time.time()
+        return [
+            account
+            for account in self.accounts.values()
+            if self._enabled(account) and not account.quarantined(now)
+        ]
+
+    @property
+    def capacity(self) -> int:
+        """In-flight save limit over all healthy accounts."""
+        return sum(account.limit for account in self.healthy())
+
+    def next_healthy_at(self) -> Optional[float]:
+        """When the first quarantined account may be tried again, if any."""
+        ends = [
+            account.quarantined_until
+            for account in self.accounts.values()
+            if self._enabled(account) and account.quarantined()
+        ]
+        return min(ends) if ends else None
+
+    def acquire(self) -> Optional[QuarkAccount]:
+        """
+        Take a save slot on the least loaded healthy account.
+
+        Load is the share of the account's own limit in use, so accounts
+        with more headroom take proportionally more. None if all are full.
+        """
+        candidates = [
+            account for account in self.healthy() if account.in_flight < account.limit
+        ]
+        if not candidates:
+            return None
+        account = min(candidates, key=lambda a: (a.in_flight / a.limit, a.in_flight))
+        account.in_flight += 1
+        return account
+
+    def release(self, account: QuarkAccount):
+        account.in_flight = max(0, account.in_flight - 1)
+
+    def quarantine(self, account: QuarkAccount, error: str) -> bool:
+        """Stop routing saves to the account; False if it already was quarantined."""
+        account.last_error = error
+        if account.quarantined():
+            return False
+        account.quarantined_until = time.time() + self.quarantine_seconds
+        ACCOUNT_QUARANTINED_UNTIL.set(account.quarantined_until, account=account.name)
+        logger.warning(
+            f"[ACCOUNTS] {account.name} quarantined for "
+            f"{self.quarantine_seconds:.0f}s: {error}"
+        )
+        return True
+
+    def mark_working(self, account: QuarkAccount):
+        """A save went through, so the account's cookie works again."""
+        if account.alerted:
+            account.alerted = False
+            logger.info(f"[ACCOUNTS] {account.name} is working again")
+
+    def set_cookie(self, name: str, cookie: str) -> bool:
+        """Give an account a new cookie, ending its quarantine. True if it changed."""
+        account = self.accounts[name]
+        if cookie == account.client.cookie:
+            return False
+        account.client.set_cookie(cookie)
+        account.quarantined_until = 0.0
+        account.alerted = False
+        ACCOUNT_QUARANTINED_UNTIL.set(0, account=name)
+        return True
+
+    def set_concurrency(self, maximum: int):
+        """Apply WORKER_CONCURRENT_TASKS to the accounts without their own limit."""
+        for account in self.accounts.values():
+            if account.concurrency is None:
+                account.client.concurrency.set_maximum(maximum)
+
+    def get_limits(self) -> dict:
+        """Each account's concurrency limit, rate limiters and quarantine."""
+        now = time.time()
+        return {
+            name: {
+                **account.client.get_limits(),
+                "in_flight": account.in_flight,
+                "quarantined_for": round(max(0.0, account.quarantined_until - now), 2),
+            }
+            for name, account in self.accounts.items()
+        }
+
+    async def warmup(self):
+        for account in self.accounts.values():
+            if self._enabled(account):
+                await account.client.warmup()
+
+    async def close(self):
+        for account in self.accounts.values():
+            await account.client.close()
@@ -0,0 +1,128 @@
+"""Test routing across Quark accounts and failover on an expired cookie."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app import db, db_async
+from app.db_test import reset_db
+from app.quark.pool import AccountPool
+from app.tasks.worker import QuarkWorker
+
+ACCOUNTS = {
+    "a": {"cookie": "cookie-a", "concurrency": 2},
+    "b": {"cookie": "cookie-b", "concurrency": 1},
+}
+
+
+def make_pool(quarantine: float = 3600) -> AccountPool:
+    pool = AccountPool(ACCOUNTS, quarantine=quarantine)
+    # Only the extra accounts, whatever QUARK_COOKIE holds
+    pool.set_cookie("default", "")
+    # As if a's adaptive limit had grown to its maximum
+    pool.accounts["a"].client.concurrency.value = 2.0
+    return pool
+
+
+def test_routing():
+    pool = make_pool()
+    a, b = pool.accounts["a"], pool.accounts["b"]
+    assert pool.healthy() == [a, b]
+    assert pool.capacity == 3
+
+    # Least loaded by share of each account's own limit
+    assert [pool.acquire() for _ in range(4)] == [a, b, a, None]
+    pool.release(b)
+    assert pool.acquire() is b
+    pool.release(a)
+    pool.release(a)
+    pool.release(b)
+
+    assert pool.quarantine(a, "expired")
+    assert not pool.quarantine(a, "expired")
+    assert pool.healthy() == [b]
+    assert [pool.acquire(), pool.acquire()] == [b, None]
+    pool.release(b)
+
+    # A new cookie ends the quarantine at once, otherwise it runs out
+    assert pool.set_cookie("a", "cookie-a2")
+    assert a.client.cookie == "cookie-a2" and pool.healthy() == [a, b]
+    pool = make_pool(quarantine=0)
+    assert pool.quarantine(pool.accounts["a"], "expired")
+    assert len(pool.healthy()) == 2
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.alerts = []
+
+    def record(self, event: str, count: int = 1):
+        pass
+
+    def send_cookie_expired_alert(self, error_message: str = ""):
+        self.alerts.append(error_message)
+
+
+def test_failover():
+    reset_db()
+    db.init_db()
+    db.ingest_messages([("chan", 1, ["s1", "s2", "s3"])])
+    notifier = FakeNotifier()
+    worker = QuarkWorker(notifier=notifier)
+    claimed = db.claim_tasks(worker.worker_id, limit=3)
+    assert len(claimed) == 3
+    db.mark_share_submitted("s3", "task-a", 60, account="a")
+
+    worker.accounts = make_pool()
+    a, b = worker.accounts.accounts["a"], worker.accounts.accounts["b"]
+    saves = []
+
+    async def expired(share_id, passcode=""):
+        saves.append(("a", share_id))
+        return {
+            "success": False,
+            "error": "need login",
+            "error_class": "cookie_expired",
+            "cookie_expired": True,
+        }
+
+    async def share_files(share_id, passcode=""):
+        return {"success": True, "stoken": "st", "files": [], "share_id": share_id}
+
+    async def save_share(share_id, **kwargs):
+        saves.append(("b", share_id))
+        return {"success": True, "task_id": f"task-{share_id}"}
+
+    a.client.get_share_files = expired
+    b.client.get_share_files = share_files
+    b.client.save_share = save_share
+
+    async def run():
+        await worker.process_task("s1", account=a)
+        await worker.process_task("s2", account=a)
+        await asyncio.gather(*worker._background)
+        # The shares a lost are queued again, then claimed and saved by b
+        await db_async.claim_tasks(worker.worker_id, share_ids=["s1", "s2"])
+        for share_id in ("s1", "s2"):
+            account = worker.accounts.acquire()
+            await worker.process_task(share_id, account=account)
+            worker.accounts.release(account)
+
+    try:
+        asyncio.run(run())
+    finally:
+        db_async.shutdown()
+
+    assert saves == [("a", "s1"), ("a", "s2"), ("b", "s1"), ("b", "s2")]
+    # One alert per quarantine, and the attempt isn't held against the share
+    assert notifier.alerts == ["a: need login"]
+    assert worker.accounts.healthy() == [b]
+    rows = {row["share_id"]: row for row in db.list_shares()}
+    assert rows["s1"]["status"] == "submitted" and rows["s1"]["account"] == "b"
+    assert rows["s1"]["attempts"] == 0
+    # a's submitted save can't be checked any more, so it is queued again
+    assert rows["s3"]["status"] == "pending" and rows["s3"]["account"] is None
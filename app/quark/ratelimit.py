@@ -0,0 +1,145 @@
+"""Rate limiting and adaptive concurrency for Quark API calls."""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `burst`.
+
+    Waiters are served in arrival order. A rate of 0 or less disables the
+    bucket. penalize() pauses the bucket after a throttling response.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        if self.rate > 0:
+            self._refill(now)
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "paused_for": round(max(0.0, self.paused_until - now), 2),
+        }
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    Each healthy response (latency under target) grows the limit by
+    1/limit, i.e. roughly +1 per full window of requests. A throttling
+    response, or an error rate above `max_error_rate` over the recent
+    window, multiplies it by `decrease_factor`, at most once per `cooldown`.
+    """
+
+    def __init__(
+        self,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        decrease_factor: float = 0.5,
+        cooldown: float = 10.0,
+        max_error_rate: float = 0.2,
+        window: int = 50,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.max_error_rate = max_error_rate
+        self.value = float(self.minimum)
+        self.last_decrease = 0.0
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.throttle_count = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self.value)
+
+    def on_success(self, latency: float):
+        self.outcomes.append(True)
+        if latency <= self.target_latency and self.value < self.maximum:
+            before = self.limit
+            self.value = min(self.maximum, self.value + 1 / self.value)
+            if self.limit != before:
+                logger.info(f"[QUARK] concurrency limit raised to {self.limit}")
+
+    def on_error(self):
+        self.outcomes.append(False)
+        if len(self.outcomes) >= 10:
+            error_rate = self.outcomes.count(False) / len(self.outcomes)
+            if error_rate > self.max_error_rate:
+                self._decrease(f"error rate {error_rate:.0%}")
+
+    def on_throttle(self):
+        self.outcomes.append(False)
+        self.throttle_count += 1
+        self._decrease("throttled")
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return
+
+        self.last_decrease = now
+        before = self.limit
+        self.value = max(self.minimum, self.value * self.decrease_factor)
+        if self.limit != before:
+            logger.warning(
+                f"[QUARK] concurrency limit lowered {before} -> {self.limit} ({reason})"
+            )
+
+    def set_maximum(self, maximum: int):
+        """Change the upper bound; a current limit above it is cut down at once."""
+        self.maximum = max(self.minimum, maximum)
+        self.value = min(self.value, float(self.maximum))
+
+    def snapshot(self) -> dict:
+        errors = self.outcomes.count(False)
+        return {
+            "limit": self.limit,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "error_rate": errors / len(self.outcomes) if self.outcomes else 0.0,
+            "throttled": self.throttle_count,
+        }
@@ -0,0 +1,64 @@
+"""Test Quark rate limiting and adaptive concurrency."""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.quark.ratelimit import AIMDController, TokenBucket
+
+
+def test_token_bucket_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, burst=2)
+        started = time.monotonic()
+        for _ in range(7):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 2 burst tokens, then 5 more at 50/s
+    elapsed = asyncio.run(run())
+    assert 0.08 <= elapsed < 0.5
+
+
+def test_token_bucket_penalty():
+    async def run():
+        bucket = TokenBucket(rate=1000, burst=10)
+        bucket.penalize(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_aimd_controller():
+    controller = AIMDController(minimum=1, maximum=8, target_latency=1.0, cooldown=0)
+
+    for _ in range(20):
+        controller.on_success(0.1)
+    grown = controller.limit
+    assert 4 <= grown <= 8
+
+    # Slow responses hold the limit steady
+    for _ in range(20):
+        controller.on_success(5.0)
+    assert controller.limit == grown
+
+    controller.on_throttle()
+    assert controller.limit == grown // 2
+
+    for _ in range(10):
+        controller.on_throttle()
+    assert controller.limit == 1
+
+
+if __name__ == "__main__":
+    test_token_bucket_rate()
+    test_token_bucket_penalty()
+    test_aimd_controller()
+    print("✅ All tests passed!")
@@ -0,0 +1,125 @@
+"""Cached view of the Quark drive's folder tree."""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DriveTree:
+    """
+    Folder listings cached per parent fid, with a TTL and explicit invalidation.
+
+    Only sub-folders are kept (name -> fid). Concurrent lookups of the same
+    folder share one listing. Resolved paths are served from the cache, so
+    routing a save to a folder costs no listing calls once warm.
+    """
+
+    def __init__(self, client, ttl: float = 600):
+        self.client = client
+        self.ttl = ttl
+        # pdir_fid -> (expires_at, {folder name: fid})
+        self._folders: dict[str, tuple[float, dict[str, str]]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._create_lock = asyncio.Lock()
+        self.listings = 0
+
+    def _cached(self, pdir_fid: str) -> Optional[dict[str, str]]:
+        entry = self._folders.get(pdir_fid)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    async def list_folders(self, pdir_fid: str = "0") -> Optional[dict[str, str]]:
+        """Sub-folders of pdir_fid by name, or None if the listing failed."""
+        folders = self._cached(pdir_fid)
+        if folders is not None:
+            return folders
+
+        lock = self._locks.setdefault(pdir_fid, asyncio.Lock())
+        async with lock:
+            # Another caller may have listed it while we waited
+            folders = self._cached(pdir_fid)
+            if folders is not None:
+                return folders
+
+            result = await self.client.get_file_list(pdir_fid)
+            self.listings += 1
+            if not result.get("success"):
+                logger.warning(
+                    f"[TREE] listing {pdir_fid} failed: {result.get('error')}"
+                )
+                return None
+
+            folders = {
+                file["file_name"]: file["fid"]
+                for file in result.get("files", [])
+                if file.get("dir")
+            }
+            self._folders[pdir_fid] = (time.monotonic() + self.ttl, folders)
+            return folders
+
+    async def find_folder(self, name: str, pdir_fid: str = "0") -> Optional[str]:
+        folders = await self.list_folders(pdir_fid)
+        return folders.get(name) if folders else None
+
+    async def resolve_path(self, path: str, create: bool = False) -> Optional[str]:
+        """
+        Fid of a folder path like "Archive/2026/Movies", relative to the root.
+
+        Missing folders are created when create is set, otherwise None is
+        returned (and stays cached until the TTL). An empty path is the root ("0").
+        """
+        fid = "0"
+        for name in [part for part in path.strip().split("/") if part]:
+            folders = await self.list_folders(fid)
+            if folders is None:
+                return None
+
+            child = folders.get(name)
+            if child is None and create:
+                child = await self._find_or_create(fid, name)
+
+            if child is None:
+                return None
+
+            fid = child
+        return fid
+
+    async def _find_or_create(self, pdir_fid: str, name: str) -> Optional[str]:
+        # Serialised so concurrent resolves don't create the same folder twice
+        async with self._create_lock:
+            folders = self._cached(pdir_fid)
+            if folders and name in folders:
+                return folders[name]
+
+            # The cached listing may be stale; check again before creating
+            self.invalidate(pdir_fid)
+            folders = await self.list_folders(pdir_fid)
+            if folders is None:
+                return None
+            return folders.get(name) or await self._create(pdir_fid, name)
+
+    async def _create(self, pdir_fid: str, name: str) -> Optional[str]:
+        result = await self.client.create_folder(pdir_fid, name)
+        if not result.get("success"):
+            logger.error(
+                f"[TREE] failed to create folder {name}: {result.get('error')}"
+            )
+            return None
+
+        fid = result["fid"]
+        logger.info(f"[TREE] created folder {name} (fid={fid})")
+        folders = self._cached(pdir_fid)
+        if folders is not None:
+            folders[name] = fid
+        return fid
+
+    def invalidate(self, pdir_fid: Optional[str] = None):
+        """Drop one cached listing, or all of them."""
+        if pdir_fid is None:
+            self._folders.clear()
+        else:
+            self._folders.pop(pdir_fid, None)
@@ -0,0 +1,81 @@
+"""Test the cached drive folder tree."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.quark.tree import DriveTree
+
+
+class FakeDrive:
+    def __init__(self):
+        self.folders = {"0": {"Archive": "fid-archive"}, "fid-archive": {}}
+        self.listings = []
+        self.created = []
+
+    async def get_file_list(self, pdir_fid):
+        self.listings.append(pdir_fid)
+        return {
+            "success": True,
+            "files": [
+                {"file_name": name, "fid": fid, "dir": True}
+                for name, fid in self.folders[pdir_fid].items()
+            ]
+            + [{"file_name": "notes.txt", "fid": "fid-notes", "dir": False}],
+        }
+
+    async def create_folder(self, pdir_fid, name):
+        fid = f"fid-{name.lower()}"
+        self.folders[pdir_fid][name] = fid
+        self.folders[fid] = {}
+        self.created.append(name)
+        return {"success": True, "fid": fid}
+
+
+def test_resolve_path_cached():
+    async def run():
+        drive = FakeDrive()
+        tree = DriveTree(drive)
+
+        assert await tree.resolve_path("") == "0"
+        assert await tree.resolve_path("Archive") == "fid-archive"
+        assert await tree.resolve_path("notes.txt") is None
+        assert await tree.resolve_path("Archive/2026") is None
+
+        listings = len(drive.listings)
+        await asyncio.gather(*(tree.resolve_path("Archive") for _ in range(10)))
+        assert len(drive.listings) == listings
+
+        tree.invalidate("0")
+        await tree.resolve_path("Archive")
+        assert len(drive.listings) == listings + 1
+
+    asyncio.run(run())
+
+
+def test_resolve_path_create():
+    async def run():
+        drive = FakeDrive()
+        tree = DriveTree(drive)
+
+        paths = await asyncio.gather(
+            *(tree.resolve_path("Archive/2026/Movies", create=True) for _ in range(5))
+        )
+        assert paths == ["fid-movies"] * 5
+        assert drive.created == ["2026", "Movies"]
+
+        listings = len(drive.listings)
+        assert await tree.resolve_path("Archive/2026/Movies") == "fid-movies"
+        assert len(drive.listings) == listings
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_resolve_path_cached()
+    test_resolve_path_create()
+    print("✅ All tests passed!")
@@ -0,0 +1,192 @@
+"""Live settings, reloaded from .env and the DB settings table while running."""
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Optional
+from dotenv import dotenv_values
+
+from app import config, db_async
+from app.config import (
+    CONFIG_WATCH_INTERVAL,
+    ENV_FILE,
+    _safe_bool,
+    _safe_int,
+    clean_cookie,
+)
+
+logger = logging.getLogger(__name__)
+
+# Settings that can change without a restart, with their parsers. Anything
+# else in .env still needs one.
+LIVE_SETTINGS: dict[str, Callable[[str], object]] = {
+    "QUARK_COOKIE": clean_cookie,
+    "WORKER_POLL_INTERVAL": lambda value: max(
+        1, _safe_int(value, config.WORKER_POLL_INTERVAL)
+    ),
+    "WORKER_CONCURRENT_TASKS": lambda value: max(
+        1, _safe_int(value, config.WORKER_CONCURRENT_TASKS)
+    ),
+    "TARGET_FOLDER_NAME": lambda value: (value or "").strip(),
+    "TARGET_FOLDER_CREATE": lambda value: _safe_bool(
+        value, config.TARGET_FOLDER_CREATE
+    ),
+}
+# Cookies of the extra accounts (QUARK_COOKIE_<NAME> -> account name), so an
+# expired one can be replaced without a restart too
+ACCOUNT_COOKIES = {
+    f"QUARK_COOKIE_{name.upper()}": name for name in config.QUARK_ACCOUNTS
+}
+LIVE_SETTINGS.update({key: clean_cookie for key in ACCOUNT_COOKIES})
+# Never echoed back by the WebUI
+SECRET_SETTINGS = {"QUARK_COOKIE", *ACCOUNT_COOKIES}
+
+
+def _startup_value(key: str):
+    """The value app.config read at import."""
+    if key in ACCOUNT_COOKIES:
+        return config.QUARK_ACCOUNTS[ACCOUNT_COOKIES[key]]["cookie"]
+    return getattr(config, key)
+
+
+SettingsCallback = Callable[[dict, set[str]], None]
+
+
+class LiveSettings:
+    """
+    Current values of LIVE_SETTINGS, keyed by their .env names.
+
+    .env is re-read only when its mtime or size changes, and the settings
+    table only for rows updated since the last look, so a check is a stat()
+    and one indexed query. Whichever source changed a key last wins. Each
+    change replaces `values` with a new dict and calls the subscribers with
+    it and the changed keys; subscribers apply it without awaiting, so no
+    coroutine sees half a change.
+    """
+
+    def __init__(
+        self,
+        env_file: Path = ENV_FILE,
+        interval: float = CONFIG_WATCH_INTERVAL,
+    ):
+        self.env_file = Path(env_file)
+        self.interval = interval
+        # Startup values, as app.config read them
+        self.values = {key: _startup_value(key) for key in LIVE_SETTINGS}
+        self.running = False
+        self._callbacks: list[SettingsCallback] = []
+        self._env_stat = None
+        self._env_values: dict[str, Optional[str]] = {}
+        self._db_version = 0.0
+        self._lock = asyncio.Lock()
+
+    def get(self, key: str):
+        return self.values[key]
+
+    def subscribe(self, callback: SettingsCallback):
+        """Call callback(values, changed) on every change, and once right away."""
+        self._callbacks.append(callback)
+        callback(self.values, set(self.values))
+
+    def unsubscribe(self, callback: SettingsCallback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def _env_changed(self) -> bool:
+        try:
+            stat = os.stat(self.env_file)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._env_stat:
+            return False
+        self._env_stat = signature
+        return True
+
+    def _read_env(self) -> dict[str, Optional[str]]:
+        if self._env_stat is None:
+            return {}
+        values = dotenv_values(self.env_file)
+        return {key: values.get(key) for key in LIVE_SETTINGS if key in values}
+
+    async def load(self):
+        """
+        Take the current .env as the baseline and apply DB settings newer than it.
+
+        app.config already read .env at import, so only later edits count as
+        changes. A setting stored in the DB after .env was last written wins.
+        """
+        async with self._lock:
+            self._env_changed()
+            self._env_values = self._read_env()
+            env_mtime = self._env_stat[0] / 1e9 if self._env_stat else 0.0
+
+            rows = await db_async.get_settings_since(0.0)
+            updates = {
+                row["key"]: row["value"]
+                for row in rows
+                if row["key"] in LIVE_SETTINGS and row["updated_at"] > env_mtime
+            }
+            if rows:
+                self._db_version = rows[-1]["updated_at"]
+            self._apply(updates, "database")
+
+    async def refresh(self) -> set[str]:
+        """Pick up changes from both sources; returns the keys that changed."""
+        async with self._lock:
+            changed = set()
+
+            if self._env_changed():
+                env_values = self._read_env()
+                updates = {
+                    key: value
+                    for key, value in env_values.items()
+                    if value is not None and value != self._env_values.get(key)
+                }
+                self._env_values = env_values
+                changed |= self._apply(updates, ".env")
+
+            rows = await db_async.get_settings_since(self._db_version)
+            if rows:
+                self._db_version = rows[-1]["updated_at"]
+                changed |= self._apply(
+                    {
+                        row["key"]: row["value"]
+                        for row in rows
+                        if row["key"] in LIVE_SETTINGS
+                    },
+                    "database",
+                )
+            return changed
+
+    def _apply(self, updates: dict[str, str], source: str) -> set[str]:
+        values = dict(self.values)
+        for key, raw in updates.items():
+            values[key] = LIVE_SETTINGS[key](raw)
+
+        changed = {key for key in updates if values[key] != self.values[key]}
+        if not changed:
+            return changed
+
+        self.values = values
+        logger.info(f"[CONFIG] {', '.join(sorted(changed))} changed in {source}")
+        for callback in list(self._callbacks):
+            try:
+                callback(values, changed)
+            except Exception as e:
+                logger.error(f"[CONFIG] failed to apply settings: {e}")
+        return changed
+
+    async def run(self):
+        """Check for changes every interval until stop()."""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"[CONFIG] settings refresh failed: {e}")
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,58 @@
+"""Test live settings reloading."""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, db_async
+from app.db import close_db, init_db, set_settings
+from app.db_test import reset_db
+from app.settings import LiveSettings
+
+
+def test_live_settings(tmp_path):
+    reset_db()
+    init_db()
+    env_file = tmp_path / ".env"
+    env_file.write_text('QUARK_COOKIE="old"\nWORKER_POLL_INTERVAL=60\n')
+
+    async def run():
+        settings = LiveSettings(env_file)
+        seen = []
+        await settings.load()
+        settings.subscribe(lambda values, changed: seen.append(changed))
+        # The current .env is the baseline, not a change
+        assert await settings.refresh() == set()
+
+        env_file.write_text('QUARK_COOKIE="new"\nWORKER_POLL_INTERVAL=5\n')
+        assert await settings.refresh() == {"QUARK_COOKIE", "WORKER_POLL_INTERVAL"}
+        assert settings.get("QUARK_COOKIE") == "new"
+        assert settings.get("WORKER_POLL_INTERVAL") == 5
+
+        # A later DB setting wins, and unparseable values keep a sane default
+        set_settings({"QUARK_COOKIE": "db", "WORKER_CONCURRENT_TASKS": "x"})
+        assert await settings.refresh() == {"QUARK_COOKIE"}
+        assert settings.get("QUARK_COOKIE") == "db"
+        assert await settings.refresh() == set()
+        assert seen[-1] == {"QUARK_COOKIE"}
+
+        # On restart, DB settings only win if stored after .env was written
+        time.sleep(0.01)
+        env_file.write_text('QUARK_COOKIE="newest"\n')
+        restarted = LiveSettings(env_file)
+        await restarted.load()
+        assert restarted.get("QUARK_COOKIE") == config.QUARK_COOKIE
+
+        set_settings({"QUARK_COOKIE": "db2"})
+        restarted = LiveSettings(env_file)
+        await restarted.load()
+        assert restarted.get("QUARK_COOKIE") == "db2"
+
+    try:
+        asyncio.run(run())
+    finally:
+        db_async.shutdown()
+        close_db()
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from app import db_async
+from app.config import (
+    RETENTION_MESSAGE_DAYS,
+    RETENTION_SHARE_DAYS,
+    RETENTION_ARCHIVE_DAYS,
+    RETENTION_INTERVAL,
+    RETENTION_BATCH_SIZE,
+    RETENTION_VACUUM_PAGES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionJob:
+    """
+    Keeps the database from growing without bound.
+
+    Every RETENTION_INTERVAL seconds it deletes message-dedup rows past
+    their horizon, archives old terminal shares, purges old archive rows
+    and returns the freed pages to the OS with incremental vacuum. All of
+    it goes through the writer thread in jobs of RETENTION_BATCH_SIZE rows
+    or RETENTION_VACUUM_PAGES pages, so ingestion writes queued meanwhile
+    run in between instead of waiting for the whole pass.
+    """
+
+    def __init__(
+        self,
+        message_days: float = RETENTION_MESSAGE_DAYS,
+        share_days: float = RETENTION_SHARE_DAYS,
+        archive_days: float = RETENTION_ARCHIVE_DAYS,
+        interval: float = RETENTION_INTERVAL,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        vacuum_pages: int = RETENTION_VACUUM_PAGES,
+    ):
+        self.message_days = message_days
+        self.share_days = share_days
+        self.archive_days = archive_days
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.vacuum_pages = max(1, vacuum_pages)
+        self.running = False
+        # Stops a pass between write jobs
+        self._stopped = False
+        self.last_run: Optional[dict] = None
+        self.totals = {
+            "runs": 0,
+            "messages_deleted": 0,
+            "shares_archived": 0,
+            "archive_purged": 0,
+            "bytes_reclaimed": 0,
+        }
+        self._wakeup = asyncio.Event()
+
+    async def _prune_messages(self) -> int:
+        deleted = 0
+        while not self._stopped:
+            rowids = await db_async.find_expired_messages(
+                self.message_days, self.batch_size
+            )
+            if not rowids:
+                break
+            count = await db_async.delete_messages(rowids, self.message_days)
+            deleted += count
+            if not count:
+                break
+        return deleted
+
+    async def _archive_shares(self) -> int:
+        archived = 0
+        while not self._stopped:
+            share_ids = await db_async.find_archivable_shares(
+                self.share_days, self.batch_size
+            )
+            if not share_ids:
+                break
+            count = await db_async.archive_shares(share_ids, self.share_days)
+            archived += count
+            if not count:
+                break
+        return archived
+
+    async def _purge_archive(self) -> int:
+        purged = 0
+        while not self._stopped:
+            count = await db_async.purge_archive(self.archive_days, self.batch_size)
+            purged += count
+            if count < self.batch_size:
+                break
+        return purged
+
+    async def _vacuum(self, page_size: int) -> int:
+        pages = 0
+        while not self._stopped:
+            freed = await db_async.incremental_vacuum(self.vacuum_pages)
+            pages += freed
+            if freed < self.vacuum_pages:
+                break
+        if pages:
+            await db_async.checkpoint()
+        return pages * page_size
+
+    async def run_once(self) -> dict:
+        """One retention pass; returns what it did."""
+        started = time.perf_counter()
+        before = await db_async.get_storage_stats()
+        result = {
+            "started_at": time.time(),
+            "messages_deleted": 0,
+            "shares_archived": 0,
+            "archive_purged": 0,
+            "bytes_reclaimed": 0,
+        }
+
+        if self.message_days > 0:
+            result["messages_deleted"] = await self._prune_messages()
+        if self.share_days > 0:
+            result["shares_archived"] = await self._archive_shares()
+        if self.archive_days > 0:
+            result["archive_purged"] = await self._purge_archive()
+        if before["auto_vacuum"] == "incremental":
+            result["bytes_reclaimed"] = await self._vacuum(before["page_size"])
+
+        after = await db_async.get_storage_stats()
+        result["size_bytes_before"] = before["size_bytes"]
+        result["size_bytes_after"] = after["size_bytes"]
+        result["duration_s"] = time.perf_counter() - started
+
+        self.last_run = result
+        self.totals["runs"] += 1
+        for key in ("messages_deleted", "shares_archived", "archive_purged"):
+            self.totals[key] += result[key]
+        self.totals["bytes_reclaimed"] += result["bytes_reclaimed"]
+
+        logger.info(
+            f"[RETENTION] deleted {result['messages_deleted']} messages, archived "
+            f"{result['shares_archived']} shares, purged {result['archive_purged']} "
+            f"archive rows, reclaimed {result['bytes_reclaimed'] / 1024 / 1024:.1f} MB "
+            f"in {result['duration_s']:.1f}s"
+        )
+        if before["auto_vacuum"] != "incremental" and after["free_bytes"]:
+            logger.info(
+                f"[RETENTION] {after['free_bytes'] / 1024 / 1024:.1f} MB free in the "
+                "database file; run `python -m app.main compact` once to enable "
+                "incremental vacuum"
+            )
+        return result
+
+    async def report(self) -> dict:
+        """Current storage, the last pass and totals since startup."""
+        return {
+            "storage": await db_async.get_storage_stats(),
+            "last_run": self.last_run,
+            "totals": dict(self.totals),
+            "config": {
+                "message_days": self.message_days,
+                "share_days": self.share_days,
+                "archive_days": self.archive_days,
+                "interval": self.interval,
+            },
+        }
+
+    def wake(self):
+        """Run a pass now instead of waiting for the interval."""
+        self._wakeup.set()
+
+    async def run(self):
+        if self.interval <= 0:
+            logger.info("[RETENTION] disabled")
+            return
+
+        self.running = True
+        logger.info(
+            f"[RETENTION] started (every {self.interval:.0f}s; messages "
+            f"{self.message_days:g}d, shares {self.share_days:g}d, archive "
+            f"{self.archive_days:g}d)"
+        )
+
+        while self.running:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"[RETENTION] error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stop(self):
+        self.running = False
+        self._stopped = True
+        self._wakeup.set()
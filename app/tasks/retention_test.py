@@ -0,0 +1,67 @@
+"""Test retention: message aging, share archival, archive purge and vacuum."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app import db, db_async
+from app.db_test import reset_db
+from app.tasks.retention import RetentionJob
+
+
+def test_retention():
+    reset_db()
+    db.init_db()
+    db.ingest_messages([("chan", i, [f"share{i}"]) for i in range(1, 2001)])
+    db.mark_share_saved("share1", "fid1")
+    db.mark_share_failed("share2", "x" * 1000)
+    with db.get_db() as conn:
+        conn.execute(
+            "UPDATE tg_messages SET processed_at = datetime('now', '-100 days') "
+            "WHERE message_id <= 1000"
+        )
+        conn.execute("UPDATE quark_shares SET updated_at = datetime('now', '-40 days')")
+
+    job = RetentionJob(message_days=90, share_days=30, archive_days=0, batch_size=300)
+    result = asyncio.run(job.run_once())
+
+    assert result["messages_deleted"] == 1000
+    # Only terminal shares are archived; pending ones stay queued
+    assert result["shares_archived"] == 2
+    assert db.get_status_counts() == {"pending": 1998}
+    assert db.get_share_status("share1") == "saved"
+    with db.get_db() as conn:
+        error = conn.execute(
+            "SELECT last_error FROM share_archive WHERE share_id = 'share2'"
+        ).fetchone()[0]
+    assert len(error) == 200
+
+    # Archived shares are still duplicates, also once their archive row is gone
+    assert db.ingest_messages([("chan", 5000, ["share1", "new"])]) == [["new"]]
+    with db.get_db() as conn:
+        conn.execute(
+            "UPDATE share_archive SET archived_at = datetime('now', '-2 days')"
+        )
+    job = RetentionJob(message_days=0, share_days=0, archive_days=1)
+    assert asyncio.run(job.run_once())["archive_purged"] == 2
+    assert db.get_share_status("share2") == "archived"
+    assert not db.insert_share_pending("share2")
+
+    # A channel's newest message survives any horizon, for catch-up
+    db.ingest_messages([("quiet", 7, []), ("quiet", 8, [])])
+    with db.get_db() as conn:
+        conn.execute(
+            "UPDATE tg_messages SET processed_at = datetime('now', '-1000 days')"
+        )
+    asyncio.run(RetentionJob(message_days=90, share_days=0).run_once())
+    assert db.get_last_message_id("quiet") == 8
+
+    stats = db.get_storage_stats()
+    assert stats["auto_vacuum"] == "incremental"
+    assert stats["free_bytes"] == 0
+    assert job.totals["runs"] == 1
+    db_async.shutdown()
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from app import db_async
+from app.config import (
+    TRACKER_BATCH_SIZE,
+    TRACKER_POLL_INTERVAL,
+    TRACKER_INITIAL_DELAY,
+    TRACKER_MAX_DELAY,
+    TRACKER_MAX_CHECKS,
+)
+from app.quark.pool import AccountPool
+from app.utils.metrics import SAVE_FAILURES
+from app.utils.tracing import span, trace_share
+
+logger = logging.getLogger(__name__)
+
+
+def task_check_delay(checks: int) -> float:
+    """Delay before the next status check of a task already checked `checks` times."""
+    return min(TRACKER_MAX_DELAY, TRACKER_INITIAL_DELAY * 2**checks)
+
+
+class SaveTaskTracker:
+    """
+    Follows submitted save tasks until the server reports them finished.
+
+    Runs beside the worker as its own task, so polling never takes a save
+    slot. Due tasks are claimed in batches and checked concurrently; a
+    share only becomes 'saved' once its task has finished. Failed tasks go
+    to on_failed(share_id, attempts, error, retryable, task_id). Results are
+    written only while the share still waits on that task.
+
+    Each task is checked through the account it was submitted with. Tasks
+    of a quarantined account go back to the queue while another account
+    is healthy, since their status can't be read any more.
+    """
+
+    def __init__(
+        self,
+        accounts: AccountPool,
+        on_failed: Callable[[str, int, str, bool, str], Awaitable[None]],
+        on_saved: Optional[Callable[[str], None]] = None,
+    ):
+        self.accounts = accounts
+        self.on_failed = on_failed
+        self.on_saved = on_saved
+        self.running = False
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        """Check due tasks now instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def check_task(self, row: dict):
+        # Each check is its own trace, stored under the share's id
+        async with trace_share(row["share_id"]):
+            with span("check_task"):
+                await self._check_task(row)
+
+    async def _check_task(self, row: dict):
+        share_id = row["share_id"]
+        checks = row["task_checks"]
+        account = self.accounts.get(row.get("account"))
+
+        if account.quarantined() and self.accounts.healthy():
+            # The worker releases these on quarantine; this catches saves
+            # that were submitted while it did
+            await db_async.release_account_tasks(account.name)
+            return
+
+        result = await account.client.get_task_status(row["task_id"])
+
+        if not result["success"]:
+            # Couldn't ask; that says nothing about the task itself
+            logger.warning(
+                f"[TRACKER] status check failed for share_id={share_id}: {result['error']}"
+            )
+            await db_async.schedule_task_check(share_id, task_check_delay(checks))
+            return
+
+        state = result["state"]
+
+        if state == "finished":
+            file_id = ",".join(result["fids"])
+            saved = await db_async.mark_share_saved(
+                share_id, file_id, task_id=row["task_id"]
+            )
+            if saved and self.on_saved:
+                self.on_saved(share_id)
+            return
+
+        if state == "failed":
+            error = f"Save task failed: {result['error']}"
+            SAVE_FAILURES.inc(error_class="task_failed")
+        elif checks >= TRACKER_MAX_CHECKS:
+            error = f"Save task still running after {checks} checks"
+            SAVE_FAILURES.inc(error_class="task_timeout")
+        else:
+            await db_async.schedule_task_check(share_id, task_check_delay(checks))
+            return
+
+        logger.error(f"[TRACKER] share_id={share_id}: {error}")
+        await self.on_failed(share_id, row["attempts"], error, True, row["task_id"])
+
+    async def check_due(self) -> int:
+        """Check one batch of due tasks; returns how many were checked."""
+        rows = await db_async.claim_submitted_tasks(
+            TRACKER_BATCH_SIZE, recheck_after=TRACKER_MAX_DELAY
+        )
+        if not rows:
+            return 0
+
+        results = await asyncio.gather(
+            *(self.check_task(row) for row in rows), return_exceptions=True
+        )
+        for row, result in zip(rows, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"[TRACKER] exception for share_id={row['share_id']}: {result}"
+                )
+        return len(rows)
+
+    async def run(self):
+        self.running = True
+        logger.info(f"[TRACKER] started (poll every {TRACKER_POLL_INTERVAL}s)")
+
+        while self.running:
+            try:
+                # A full batch means more may be due already
+                if await self.check_due() >= TRACKER_BATCH_SIZE:
+                    continue
+            except Exception as e:
+                logger.error(f"[TRACKER] error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), TRACKER_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
@@ -0,0 +1,61 @@
+"""Test save task tracking against canned Quark task responses."""
+
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app import db, db_async
+from app.db_test import reset_db
+from app.quark.pool import AccountPool
+from app.tasks.tracker import SaveTaskTracker
+
+THROTTLED = {"status": 200, "code": 32003, "message": "请求过于频繁，请稍后再试"}
+TASK_FAILED = {"status": 200, "code": 0, "data": {"status": 3, "message": "容量不足"}}
+
+
+def run_check(payload: dict) -> list:
+    reset_db()
+    db.init_db()
+    db.insert_share_pending("s1")
+    db.claim_tasks("w")
+    db.mark_share_submitted("s1", "task-1", check_delay=-1)
+
+    pool = AccountPool({})
+    client = pool.default.client
+    client.buckets["task"].rate = 0
+    client._http = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=payload))
+    )
+    failures = []
+
+    async def on_failed(share_id, attempts, error, retryable, task_id):
+        failures.append((share_id, error))
+
+    async def run():
+        tracker = SaveTaskTracker(pool, on_failed=on_failed)
+        assert await tracker.check_due() == 1
+        await pool.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        db_async.shutdown()
+    return failures
+
+
+def test_throttled_check_is_retried():
+    # A rejected status query says nothing about the task: check again later
+    assert run_check(THROTTLED) == []
+    assert db.get_share_status("s1") == "submitted"
+    # Rescheduled with backoff, so not due again right away
+    assert db.claim_submitted_tasks(10, recheck_after=300) == []
+
+
+def test_failed_task():
+    assert run_check(TASK_FAILED) == [("s1", "Save task failed: 容量不足")]
@@ -1,106 +1,736 @@
 import asyncio
+import hashlib
 import logging
-from app.db import get_pending_tasks, mark_share_saved, mark_share_failed
-from app.config import WORKER_POLL_INTERVAL, WORKER_CONCURRENT_TASKS, TARGET_FOLDER_NAME
-from app.quark.client import QuarkClient
+import os
+import random
+import socket
+import time
+import uuid
+from collections import deque
+from typing import Optional
+from app import db_async
+from app.db import add_share_listener, remove_share_listener
+from app.config import (
+    WORKER_BATCH_SIZE,
+    WORKER_LEASE_SECONDS,
+    WORKER_MAX_ATTEMPTS,
+    WORKER_RETRY_BASE_DELAY,
+    WORKER_RETRY_MAX_DELAY,
+    WORKER_SHUTDOWN_TIMEOUT,
+    TRACKER_INITIAL_DELAY,
+    CONTENT_DEDUP,
+)
+from app.quark.pool import DEFAULT_ACCOUNT, AccountPool, QuarkAccount
+from app.settings import ACCOUNT_COOKIES, LiveSettings
+from app.tasks.tracker import SaveTaskTracker
 from app.utils.notifier import TelegramNotifier
+from app.utils.metrics import (
+    CONCURRENCY_LIMIT,
+    DUPLICATES,
+    IN_FLIGHT,
+    SAVE_FAILURES,
+    SAVE_LATENCY,
+    SAVES,
+)
+from app.utils.tracing import record_span, span, trace_share
 
 logger = logging.getLogger(__name__)
 
 
+def compute_backoff(attempt: int) -> float:
+    """Exponential backoff with equal jitter for the given 1-based attempt."""
+    delay = min(WORKER_RETRY_MAX_DELAY, WORKER_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def content_fingerprint(file: dict) -> str:
+    """Identify a shared file by name and size, whatever share it comes from."""
+    key = f"{file['file_name']}\0{file['size']}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
 class QuarkWorker:
-    def __init__(self):
-        self.semaphore = asyncio.Semaphore(WORKER_CONCURRENT_TASKS)
+    def __init__(
+        self,
+        notifier: Optional[TelegramNotifier] = None,
+        settings: Optional[LiveSettings] = None,
+    ):
+        # Lease owner id, unique per process so several workers can share a DB
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.in_flight: dict[str, asyncio.Task] = {}
+        # Shares claimed by this worker but not started yet
+        self.backlog: deque[dict] = deque()
+        self.queued: set[str] = set()
+        # Shares announced by the listener, claimed on the next loop pass
+        self.announced: list[str] = []
+        # When the earliest backed-off retry becomes due, if any
+        self.next_due_at = None
         self.running = False
-        self.quark_client = QuarkClient()
-        self.notifier = TelegramNotifier()
-        self.cookie_expired_notified = False
-        self.target_folder_fid = None
+        self._wakeup = asyncio.Event()
+        self._loop = None
+
+        # Wall-clock time each share was announced by the listener, used to
+        # measure message-to-saved latency. Kept until the save task finishes.
+        self.enqueued_at: dict[str, float] = {}
+        self.latency_samples: deque[float] = deque(maxlen=1000)
+
+        # Quark accounts saves are routed across, see app.quark.pool
+        self.accounts = AccountPool()
+        self.tracker = SaveTaskTracker(
+            self.accounts,
+            on_failed=self._handle_failure,
+            on_saved=self._on_saved,
+        )
+        # Pass the listener's notifier to share its Telegram connection;
+        # without one alerts are stored for the listener's process to send
+        self.notifier = notifier or TelegramNotifier()
+        self.owns_notifier = notifier is None
+
+        # Live settings, applied by apply_settings(); pass the app's instance
+        # to share its watcher, otherwise the worker runs its own
+        self.settings = settings or LiveSettings()
+        self.owns_settings = settings is None
+        self.poll_interval = self.settings.get("WORKER_POLL_INTERVAL")
+        self.target_folder = self.settings.get("TARGET_FOLDER_NAME")
+        self.target_folder_create = self.settings.get("TARGET_FOLDER_CREATE")
+        self._background: set[asyncio.Task] = set()
+
+    @property
+    def max_in_flight(self) -> int:
+        """In-flight save limit: the AIMD limits of all healthy accounts."""
+        return self.accounts.capacity
 
     async def initialize(self):
-        if TARGET_FOLDER_NAME:
-            logger.info(f"[WORKER] Looking for target folder: {TARGET_FOLDER_NAME}")
-            fid = await self.quark_client.find_folder_by_name(TARGET_FOLDER_NAME)
-            if fid:
-                self.target_folder_fid = fid
-                logger.info(
-                    f"[WORKER] Found target folder {TARGET_FOLDER_NAME} (fid={fid})"
+        await self.accounts.warmup()
+        for account in self.accounts.healthy():
+            await self._check_target_folder(account)
+
+    def _target_folder(self, account: QuarkAccount) -> str:
+        if account.target_folder is not None:
+            return account.target_folder
+        return self.target_folder
+
+    async def _check_target_folder(self, account: QuarkAccount):
+        target = self._target_folder(account)
+        if not target:
+            return
+
+        logger.info(f"[WORKER] {account.name}: looking for target folder: {target}")
+        fid = await self._resolve_target_folder(account)
+        if fid != "0":
+            logger.info(
+                f"[WORKER] {account.name}: found target folder {target} (fid={fid})"
+            )
+        else:
+            logger.warning(
+                f"[WORKER] {account.name}: target folder '{target}' not found in "
+                f"Quark. Files will be saved to root directory. "
+                f"Create it in Quark web UI or set TARGET_FOLDER_CREATE=true."
+            )
+
+    async def _resolve_target_folder(self, account: QuarkAccount) -> str:
+        """
+        The account's target folder fid, "0" (root) if unset or missing.
+
+        Each account has its own drive, so its own folder fid, served from
+        the tree cache of its client.
+        """
+        target = self._target_folder(account)
+        if not target:
+            return "0"
+        fid = await account.client.tree.resolve_path(
+            target, create=self.target_folder_create
+        )
+        return fid or "0"
+
+    def apply_settings(self, values: dict, changed: set[str]):
+        """
+        Apply live settings to the worker and its client.
+
+        Runs on the loop without awaiting, so saves see either the old or
+        the new settings; saves already in flight finish with the old ones.
+        """
+        cookies = {DEFAULT_ACCOUNT: values["QUARK_COOKIE"]}
+        cookies.update(
+            (name, values[key])
+            for key, name in ACCOUNT_COOKIES.items()
+            if key in values
+        )
+        # Also ends the quarantine of an account whose cookie was replaced
+        cookie_changed = [
+            name
+            for name, cookie in cookies.items()
+            if self.accounts.set_cookie(name, cookie)
+        ]
+        self.accounts.set_concurrency(values["WORKER_CONCURRENT_TASKS"])
+        self.poll_interval = values["WORKER_POLL_INTERVAL"]
+        target_changed = (
+            values["TARGET_FOLDER_NAME"],
+            values["TARGET_FOLDER_CREATE"],
+        ) != (
+            self.target_folder,
+            self.target_folder_create,
+        )
+        self.target_folder = values["TARGET_FOLDER_NAME"]
+        self.target_folder_create = values["TARGET_FOLDER_CREATE"]
+
+        if cookie_changed:
+            self._spawn(self._retry_cookie_expired())
+        if target_changed:
+            for account in self.accounts.healthy():
+                if account.target_folder is None:
+                    self._spawn(self._check_target_folder(account))
+        # A shorter poll interval or higher limit takes effect right away
+        self._wakeup.set()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _retry_cookie_expired(self):
+        """Shares waiting for a working cookie are due again with the new one."""
+        try:
+            retried = await db_async.retry_cookie_expired()
+        except Exception as e:
+            logger.error(f"[WORKER] failed to requeue shares after cookie update: {e}")
+            return
+        if retried:
+            logger.info(f"[WORKER] retrying {retried} shares with the new cookie")
+            self.next_due_at = None
+            self._wakeup.set()
+
+    async def _release_account(self, account: QuarkAccount):
+        """Hand a quarantined account's submitted shares to the other accounts."""
+        try:
+            if self.accounts.healthy():
+                await db_async.release_account_tasks(account.name)
+                return
+
+            # No account left to save with: give the claimed shares back so
+            # other workers can take them
+            unstarted = [row["share_id"] for row in self.backlog]
+            self.backlog.clear()
+            self.queued.clear()
+            await db_async.release_tasks(self.worker_id, unstarted)
+        except Exception as e:
+            logger.error(f"[WORKER] failed to release work of {account.name}: {e}")
+
+    def _on_cookie_expired(self, account: QuarkAccount, error: str):
+        if not self.accounts.quarantine(account, error):
+            return
+        if not account.alerted:
+            # Once per outage: a retry after the quarantine that fails
+            # again doesn't alert twice
+            account.alerted = True
+            self.notifier.send_cookie_expired_alert(
+                error
+                if len(self.accounts.accounts) == 1
+                else f"{account.name}: {error}"
+            )
+        self._spawn(self._release_account(account))
+
+    async def process_task(
+        self,
+        share_id: str,
+        attempts: int = 0,
+        passcode: Optional[str] = None,
+        account: Optional[QuarkAccount] = None,
+    ):
+        """Save one claimed share; attempts is the number of earlier failed tries."""
+        async with trace_share(share_id):
+            enqueued_at = self.enqueued_at.get(share_id)
+            if enqueued_at is not None:
+                record_span("queue_wait", enqueued_at, time.time())
+            with span("process_task"):
+                await self._process_task(
+                    share_id, attempts, passcode, account or self.accounts.default
+                )
+
+    async def _process_task(
+        self,
+        share_id: str,
+        attempts: int,
+        passcode: Optional[str],
+        account: QuarkAccount,
+    ):
+        logger.info(f"[WORKER] processing share_id={share_id} via {account.name}")
+        started = time.perf_counter()
+        submitted = False
+
+        try:
+            to_pdir_fid = await self._resolve_target_folder(account)
+            if CONTENT_DEDUP:
+                result = await self._save_new_content(
+                    account, share_id, to_pdir_fid, passcode
                 )
             else:
-                logger.warning(
-                    f"[WORKER] Target folder '{TARGET_FOLDER_NAME}' not found in Quark. "
-                    f"Files will be saved to root directory. "
-                    f"Please create the folder manually in Quark web UI."
+                result = await account.client.save_share(
+                    share_id=share_id, to_pdir_fid=to_pdir_fid, passcode=passcode or ""
                 )
 
-    async def process_task(self, share_id: str):
-        async with self.semaphore:
-            logger.info(f"[WORKER] processing share_id={share_id}")
+            if result["success"]:
+                task_id = result.get("task_id")
+                if result.get("duplicate"):
+                    updated = await db_async.mark_share_duplicate(
+                        share_id,
+                        result["dedup_files"],
+                        result["dedup_bytes"],
+                        owner=self.worker_id,
+                    )
+                    if not self._lease_lost(share_id, updated):
+                        logger.info("[WORKER] done, status=duplicate")
+                        self.notifier.record("duplicate")
+                        DUPLICATES.inc(kind="content")
+                elif task_id:
+                    # Accepted, but the server may still fail the save; the
+                    # tracker marks it saved once the task finishes
+                    updated = await db_async.mark_share_submitted(
+                        share_id,
+                        task_id,
+                        TRACKER_INITIAL_DELAY,
+                        account.name,
+                        owner=self.worker_id,
+                    )
+                    if not self._lease_lost(share_id, updated):
+                        logger.info(
+                            f"[WORKER] done, status=submitted, task_id={task_id}"
+                        )
+                        self.tracker.wake()
+                        submitted = True
+                else:
+                    updated = await db_async.mark_share_saved(
+                        share_id, "", account.name, owner=self.worker_id
+                    )
+                    if not self._lease_lost(share_id, updated):
+                        logger.info("[WORKER] done, status=saved (no task_id)")
+                        self._on_saved(share_id)
 
-            try:
-                result = await self.quark_client.save_share(
-                    share_id=share_id, to_pdir_fid=self.target_folder_fid or "0"
-                )
+                self.accounts.mark_working(account)
 
-                if result["success"]:
-                    task_id = result.get("task_id", "")
-                    logger.info(f"[WORKER] done, status=saved, task_id={task_id}")
-                    mark_share_saved(share_id, task_id)
+            else:
+                error = result.get("error", "Unknown error")
+                SAVE_FAILURES.inc(error_class=result.get("error_class", "unknown"))
 
-                    if self.cookie_expired_notified:
-                        self.cookie_expired_notified = False
-                        logger.info("Cookie is working again, cleared expired flag")
+                if result.get("cookie_expired"):
+                    logger.error(f"[WORKER] Cookie expired for {account.name}: {error}")
+                    self._on_cookie_expired(account, error)
 
+                    # Not the share's fault, so no attempt is used up: another
+                    # account takes it now, or it waits for a new cookie
+                    await db_async.mark_share_retry(
+                        share_id,
+                        f"Cookie expired: {error}",
+                        0 if self.accounts.healthy() else WORKER_RETRY_MAX_DELAY,
+                        count_attempt=False,
+                        owner=self.worker_id,
+                    )
                 else:
-                    error = result.get("error", "Unknown error")
+                    logger.error(
+                        f"[WORKER] failed for share_id={share_id}: {error} "
+                        f"({result.get('error_class', 'unknown')})"
+                    )
+                    await self._handle_failure(
+                        share_id, attempts, error, result.get("retryable", False)
+                    )
 
-                    if result.get("cookie_expired"):
-                        logger.error(f"[WORKER] Cookie expired: {error}")
+        except Exception as e:
+            logger.error(f"[WORKER] exception for share_id={share_id}: {e}")
+            SAVE_FAILURES.inc(error_class="exception")
+            await self._handle_failure(share_id, attempts, str(e), retryable=True)
 
-                        if not self.cookie_expired_notified:
-                            await self.notifier.start()
-                            await self.notifier.send_cookie_expired_alert(error)
-                            await self.notifier.stop()
-                            self.cookie_expired_notified = True
+        finally:
+            if not submitted:
+                self.enqueued_at.pop(share_id, None)
+            stats = account.client.get_pool_stats()
+            logger.info(
+                f"[WORKER] share_id={share_id} via {account.name} took "
+                f"{(time.perf_counter() - started) * 1000:.0f}ms "
+                f"(connections opened={stats['connections_opened']}, "
+                f"reused={stats['connections_reused']})"
+            )
 
-                        mark_share_failed(share_id, f"Cookie expired: {error}")
-                    else:
-                        logger.error(
-                            f"[WORKER] failed for share_id={share_id}: {error}"
-                        )
-                        mark_share_failed(share_id, error)
+    async def _save_new_content(
+        self,
+        account: QuarkAccount,
+        share_id: str,
+        to_pdir_fid: str,
+        passcode: Optional[str] = None,
+    ) -> dict:
+        """
+        Save only the files of a share that aren't in the content index yet.
 
-            except Exception as e:
-                logger.error(f"[WORKER] exception for share_id={share_id}: {e}")
-                mark_share_failed(share_id, str(e))
+        The index spans all accounts: a file saved to any of them is skipped.
+        Folders aren't fingerprinted, so a folder-only share is always saved,
+        at the cost of the detail listing that tells it apart.
+        """
+        detail = await account.client.get_share_files(share_id, passcode or "")
+        if not detail["success"]:
+            return detail
 
-    async def run(self):
-        self.running = True
-        await self.initialize()
-        logger.info(f"Worker started (polling every {WORKER_POLL_INTERVAL}s)")
+        files = detail["files"]
+        # Folders can't be fingerprinted without listing them, always save those
+        content = {content_fingerprint(file): file for file in files if not file["dir"]}
+        if not content:
+            # Folders only: nothing to look up or index, save it all with
+            # the stoken already fetched
+            return await account.client.save_share(
+                share_id=share_id, to_pdir_fid=to_pdir_fid, stoken=detail["stoken"]
+            )
+
+        known = await db_async.find_indexed_content(list(content))
+        skipped = [content[fingerprint] for fingerprint in known]
+        skipped_bytes = sum(file["size"] for file in skipped)
+
+        if len(skipped) == len(files):
+            return {
+                "success": True,
+                "duplicate": True,
+                "share_id": share_id,
+                "dedup_files": len(skipped),
+                "dedup_bytes": skipped_bytes,
+            }
+
+        await db_async.record_share_content(
+            share_id,
+            [
+                (fingerprint, file["file_name"], file["size"])
+                for fingerprint, file in content.items()
+                if fingerprint not in known
+            ],
+            len(skipped),
+            skipped_bytes,
+            owner=self.worker_id,
+        )
+
+        if skipped:
+            logger.info(
+                f"[WORKER] share_id={share_id}: skipping {len(skipped)} of "
+                f"{len(files)} files already saved"
+            )
+        return await account.client.save_share(
+            share_id=share_id,
+            to_pdir_fid=to_pdir_fid,
+            stoken=detail["stoken"],
+            files=(
+                [
+                    file
+                    for file in files
+                    if file["dir"] or content_fingerprint(file) not in known
+                ]
+                if skipped
+                else None
+            ),
+        )
 
+    async def _handle_failure(
+        self,
+        share_id: str,
+        attempts: int,
+        error: str,
+        retryable: bool,
+        task_id: Optional[str] = None,
+    ):
+        """
+        Retry or fail a share held by this worker's lease, or by its save
+        task when the tracker reports task_id failed.
+        """
+        owner = None if task_id else self.worker_id
+        attempt = attempts + 1
+        if retryable and attempt < WORKER_MAX_ATTEMPTS:
+            updated = await db_async.mark_share_retry(
+                share_id,
+                error,
+                compute_backoff(attempt),
+                owner=owner,
+                task_id=task_id,
+            )
+            self._lease_lost(share_id, updated)
+        else:
+            updated = await db_async.mark_share_failed(
+                share_id, error, owner=owner, task_id=task_id
+            )
+            if not self._lease_lost(share_id, updated):
+                self.notifier.record("failed")
+
+    def _lease_lost(self, share_id: str, updated: int) -> bool:
+        """
+        True if a result found the share taken over, e.g. its lease expired
+        and another worker claimed it; the result is dropped.
+        """
+        if updated:
+            return False
+        logger.warning(
+            f"[WORKER] share_id={share_id} is no longer ours, dropping the result"
+        )
+        return True
+
+    def _on_saved(self, share_id: str):
+        self.notifier.record("saved")
+        SAVES.inc()
+        self._record_latency(share_id)
+
+    def _record_latency(self, share_id: str):
+        enqueued_at = self.enqueued_at.pop(share_id, None)
+        if enqueued_at is None:
+            return
+
+        latency = time.time() - enqueued_at
+        self.latency_samples.append(latency)
+        SAVE_LATENCY.observe(latency)
+        logger.info(f"[WORKER] share_id={share_id} message-to-saved {latency:.2f}s")
+
+    def get_latency_stats(self) -> dict:
+        """Message-to-saved latency over the most recent saves, in seconds."""
+        samples = sorted(self.latency_samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": len(samples),
+            "avg": sum(samples) / len(samples),
+            "p50": percentile(0.50),
+            "p99": percentile(0.99),
+            "max": samples[-1],
+        }
+
+    def notify_new_share(self, share_id: str):
+        """Wake the worker for a freshly queued share. Safe to call from any thread."""
+        if self._loop is None or not self.running:
+            return
+
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, share_id, time.time())
+        except RuntimeError:
+            # Loop already closed, the fallback poll will pick the share up
+            pass
+
+    def _enqueue(self, share_id: str, enqueued_at: float):
+        # Bounded, since saves the tracker never sees finish keep their entry
+        if len(self.enqueued_at) >= 10000:
+            self.enqueued_at.pop(next(iter(self.enqueued_at)))
+        self.enqueued_at.setdefault(share_id, enqueued_at)
+        if share_id not in self.queued and share_id not in self.in_flight:
+            self.announced.append(share_id)
+        self._wakeup.set()
+
+    def _free_slots(self) -> int:
+        """Saves that could start now on top of those already claimed."""
+        return self.max_in_flight - len(self.in_flight) - len(self.backlog)
+
+    async def _claim_announced(self):
+        free = self._free_slots()
+        if not self.announced or free <= 0:
+            # Kept for the next pass, when a slot frees up
+            return
+
+        share_ids = list(dict.fromkeys(self.announced))
+        self.announced.clear()
+
+        rows = await db_async.claim_tasks(
+            self.worker_id,
+            limit=free,
+            lease_seconds=WORKER_LEASE_SECONDS,
+            share_ids=share_ids,
+        )
+        if len(rows) == free:
+            # Out of slots; the rest may still be claimable
+            claimed = {row["share_id"] for row in rows}
+            self.announced = [
+                share_id for share_id in share_ids if share_id not in claimed
+            ]
+        # Fresh shares go first, they are the most likely to expire
+        for row in reversed(rows):
+            self.backlog.appendleft(row)
+            self.queued.add(row["share_id"])
+
+    async def _refill_backlog(self):
+        """
+        Claim due shares for the free slots only, so shares wait in the
+        queue where other workers can take them, not leased to this one.
+        """
+        free = self._free_slots()
+        if free <= 0:
+            return
+
+        rows = await db_async.claim_tasks(
+            self.worker_id,
+            limit=min(WORKER_BATCH_SIZE, free),
+            lease_seconds=WORKER_LEASE_SECONDS,
+        )
+        if rows:
+            logger.info(f"[WORKER] claimed {len(rows)} pending tasks")
+            for row in rows:
+                self.backlog.append(row)
+                self.queued.add(row["share_id"])
+            self.next_due_at = None
+        else:
+            self.next_due_at = await db_async.get_next_attempt_at()
+
+    async def _renew_leases(self):
+        """Keep leases alive for every share this worker holds."""
         while self.running:
+            await asyncio.sleep(WORKER_LEASE_SECONDS / 3)
+
             try:
-                self.quark_client.reload_cookie()
+                # Recover shares from workers that died mid-save
+                if await db_async.reclaim_expired_leases():
+                    self._wakeup.set()
 
-                tasks = get_pending_tasks(limit=10)
+                held = list(self.in_flight) + [row["share_id"] for row in self.backlog]
+                if not held:
+                    continue
 
-                if tasks:
-                    logger.info(f"[WORKER] found {len(tasks)} pending tasks")
+                renewed = await db_async.renew_leases(
+                    self.worker_id, held, WORKER_LEASE_SECONDS
+                )
+                if renewed < len(held):
+                    logger.warning(
+                        f"[WORKER] lost lease on {len(held) - renewed} of {len(held)} shares"
+                    )
+            except Exception as e:
+                logger.error(f"[WORKER] lease renewal failed: {e}")
 
-                    for share_id in tasks:
-                        if not self.running:
-                            break
-                        await self.process_task(share_id)
-                else:
-                    logger.debug("[WORKER] no pending tasks")
+    def _fill_slots(self):
+        while self.backlog:
+            # Least loaded healthy account with a free slot, if any
+            account = self.accounts.acquire()
+            if account is None:
+                break
 
-                await asyncio.sleep(WORKER_POLL_INTERVAL)
+            row = self.backlog.popleft()
+            share_id = row["share_id"]
+            self.queued.discard(share_id)
+            if share_id in self.in_flight:
+                self.accounts.release(account)
+                continue
 
-            except Exception as e:
-                logger.error(f"[WORKER] error: {e}")
-                await asyncio.sleep(WORKER_POLL_INTERVAL)
+            task = asyncio.create_task(
+                self.process_task(
+                    share_id, row.get("attempts", 0), row.get("passcode"), account
+                )
+            )
+            self.in_flight[share_id] = task
+            task.add_done_callback(
+                lambda _task, share_id=share_id, account=account: self._on_task_done(
+                    share_id, account
+                )
+            )
+        IN_FLIGHT.set(len(self.in_flight))
+        CONCURRENCY_LIMIT.set(self.max_in_flight)
+
+    def _on_task_done(self, share_id: str, account: QuarkAccount):
+        self.accounts.release(account)
+        self.in_flight.pop(share_id, None)
+        IN_FLIGHT.set(len(self.in_flight))
+        self._wakeup.set()
+
+    async def _wait_for_activity(self, timeout: float):
+        """Sleep until a slot frees up, the worker is woken, or timeout elapses."""
+        waiter = asyncio.create_task(self._wakeup.wait())
+        try:
+            await asyncio.wait(
+                [waiter, *self.in_flight.values()],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            waiter.cancel()
+        self._wakeup.clear()
+
+    def _poll_timeout(self) -> float:
+        """Fallback poll interval, shortened when a backed-off retry is due sooner."""
+        if self.next_due_at is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(1.0, self.next_due_at - time.time()))
+
+    async def _drain(self):
+        # Claimed but never started: hand straight back to the queue
+        unstarted = [row["share_id"] for row in self.backlog]
+        self.backlog.clear()
+        self.queued.clear()
+
+        cancelled = []
+        if self.in_flight:
+            logger.info(f"[WORKER] draining {len(self.in_flight)} in-flight tasks...")
+            in_flight = dict(self.in_flight)
+            _, pending = await asyncio.wait(
+                list(in_flight.values()), timeout=WORKER_SHUTDOWN_TIMEOUT
+            )
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                cancelled = [
+                    share_id for share_id, task in in_flight.items() if task in pending
+                ]
+                logger.warning(f"[WORKER] cancelled {len(cancelled)} tasks")
+
+        released = await db_async.release_tasks(self.worker_id, unstarted + cancelled)
+        if released:
+            logger.info(f"[WORKER] released {released} claimed shares back to pending")
+
+    async def run(self):
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        add_share_listener(self.notify_new_share)
+        if self.owns_notifier:
+            notifier_task = asyncio.create_task(self.notifier.run())
+        if self.owns_settings:
+            await self.settings.load()
+            settings_task = asyncio.create_task(self.settings.run())
+        self.settings.subscribe(self.apply_settings)
+        await self.initialize()
+        await db_async.reclaim_expired_leases()
+        lease_task = asyncio.create_task(self._renew_leases())
+        tracker_task = asyncio.create_task(self.tracker.run())
+        logger.info(
+            f"Worker {self.worker_id} started (event-driven, fallback poll every "
+            f"{self.poll_interval}s, {len(self.accounts.healthy())} Quark accounts)"
+        )
+
+        try:
+            while self.running:
+                try:
+                    if self.accounts.healthy():
+                        await self._claim_announced()
+                        await self._refill_backlog()
+                        self._fill_slots()
+                    else:
+                        # Every account is quarantined: claim nothing until
+                        # one is tried again or gets a new cookie
+                        self.announced.clear()
+                        self.next_due_at = self.accounts.next_healthy_at()
+
+                    if not self.in_flight:
+                        logger.debug("[WORKER] no pending tasks")
+
+                    await self._wait_for_activity(self._poll_timeout())
+
+                except Exception as e:
+                    logger.error(f"[WORKER] error: {e}")
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            remove_share_listener(self.notify_new_share)
+            self.settings.unsubscribe(self.apply_settings)
+            if self.owns_settings:
+                self.settings.stop()
+                settings_task.cancel()
+            lease_task.cancel()
+            await self._drain()
+            # Unfinished checks are simply due again on the next start
+            self.tracker.stop()
+            tracker_task.cancel()
+            await asyncio.gather(tracker_task, return_exceptions=True)
+            await self.accounts.close()
+            if self.owns_notifier:
+                await self.notifier.stop()
+                await asyncio.gather(notifier_task, return_exceptions=True)
 
     def stop(self):
         logger.info("Worker stopping...")
         self.running = False
+        self._wakeup.set()
@@ -0,0 +1,138 @@
+"""Test the worker's save path against a fake Quark client."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app import db, db_async
+from app.db_test import reset_db
+from app.tasks.worker import QuarkWorker
+
+
+class FakeNotifier:
+    def record(self, event: str, count: int = 1):
+        pass
+
+
+def folder(name: str) -> dict:
+    return {
+        "fid": name,
+        "share_fid_token": name,
+        "file_name": name,
+        "size": 0,
+        "dir": True,
+    }
+
+
+def test_folder_only_share(monkeypatch):
+    reset_db()
+    db.init_db()
+    db.insert_share_pending("s1")
+    worker = QuarkWorker(notifier=FakeNotifier())
+    db.claim_tasks(worker.worker_id)
+    worker.target_folder = ""
+    client = worker.accounts.default.client
+    saves = []
+
+    async def share_files(share_id, passcode=""):
+        return {"success": True, "stoken": "st", "files": [folder("Season 1")]}
+
+    async def save_share(share_id, **kwargs):
+        saves.append(kwargs)
+        return {"success": True, "task_id": "task-1"}
+
+    async def no_lookup(fingerprints):
+        raise AssertionError("folder-only shares have nothing to look up")
+
+    client.get_share_files = share_files
+    client.save_share = save_share
+    monkeypatch.setattr(db_async, "find_indexed_content", no_lookup)
+
+    try:
+        asyncio.run(worker.process_task("s1"))
+    finally:
+        db_async.shutdown()
+
+    # Saved whole, reusing the stoken of the listing
+    assert saves == [{"to_pdir_fid": "0", "stoken": "st"}]
+    row = db.list_shares()[0]
+    assert row["status"] == "submitted" and row["dedup_files"] == 0
+
+
+def test_claims_only_free_slots():
+    reset_db()
+    db.init_db()
+    db.ingest_messages([("chan", 1, [f"s{i}" for i in range(5)])])
+
+    worker = QuarkWorker(notifier=FakeNotifier())
+    worker.target_folder = ""
+    client = worker.accounts.default.client
+    client.concurrency.value = 2.0
+    release = asyncio.Event()
+    started = []
+
+    async def share_files(share_id, passcode=""):
+        started.append(share_id)
+        await release.wait()
+        return {"success": True, "stoken": "st", "files": []}
+
+    async def save_share(share_id, **kwargs):
+        return {"success": True, "task_id": f"task-{share_id}"}
+
+    client.get_share_files = share_files
+    client.save_share = save_share
+
+    def statuses():
+        return {row["share_id"]: row["status"] for row in db.list_shares()}
+
+    async def run():
+        worker.running = True
+        worker._loop = asyncio.get_running_loop()
+        db.add_share_listener(worker.notify_new_share)
+        try:
+            # Two slots: two shares leased, the rest stay in the queue
+            await worker._refill_backlog()
+            worker._fill_slots()
+            await asyncio.sleep(0)
+            assert started == ["s0", "s1"] and not worker.backlog
+            assert list(statuses().values()).count("processing") == 2
+
+            # A new share wakes the worker, but waits for a free slot
+            await db_async.insert_share_pending("fresh")
+            await asyncio.sleep(0)
+            assert worker._wakeup.is_set() and worker.announced == ["fresh"]
+            await worker._claim_announced()
+            assert worker.announced == ["fresh"]
+            assert statuses()["fresh"] == "pending"
+
+            # Once one is, the fresh share takes it ahead of older ones
+            release.set()
+            await asyncio.gather(*worker.in_flight.values())
+            release.clear()
+            await worker._claim_announced()
+            await worker._refill_backlog()
+            worker._fill_slots()
+            await asyncio.sleep(0)
+            assert started[2:] == ["fresh", "s2"]
+            release.set()
+            await asyncio.gather(*worker.in_flight.values())
+        finally:
+            db.remove_share_listener(worker.notify_new_share)
+
+    try:
+        asyncio.run(run())
+    finally:
+        db_async.shutdown()
+
+    assert statuses() == {
+        "s0": "submitted",
+        "s1": "submitted",
+        "s2": "submitted",
+        "s3": "pending",
+        "s4": "pending",
+        "fresh": "submitted",
+    }
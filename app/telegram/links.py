@@ -0,0 +1,86 @@
+"""Quark share link extraction from Telegram messages."""
+
+import re
+
+# A share URL and its query string or fragment, where a pwd= passcode may
+# hide. ASCII URL characters only, so text glued to the link ("提取码：ab12")
+# is not swallowed with it
+_SHARE_RE = re.compile(r"pan\.quark\.cn/s/([a-zA-Z0-9]+)([a-zA-Z0-9_\-./?=&#%]*)")
+_URL_PASSCODE_RE = re.compile(r"[?&#](?:pwd|passcode)=([a-zA-Z0-9]+)")
+# Passcode written out next to the link, e.g. "提取码：ab12"; an archive's
+# "解压密码" is not one
+_TEXT_PASSCODE_RE = re.compile(
+    r"(?:提取码|(?<!解压)密码|访问码|passcode|pwd)\s*[:：=]?\s*([a-zA-Z0-9]{4,8})(?![a-zA-Z0-9])",
+    re.IGNORECASE,
+)
+
+
+def extract_quark_links(text: str) -> list[str]:
+    """Share ids of every Quark link in text."""
+    if not text:
+        return []
+
+    return [match.group(1) for match in _SHARE_RE.finditer(text)]
+
+
+def _extract_from_text(text: str) -> list[tuple[str, str]]:
+    if not text or "pan.quark.cn" not in text:
+        return []
+
+    matches = list(_SHARE_RE.finditer(text))
+    links = []
+    for i, match in enumerate(matches):
+        passcode = _URL_PASSCODE_RE.search(match.group(2))
+        if passcode is None:
+            # A written passcode belongs to the link before it
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            passcode = _TEXT_PASSCODE_RE.search(text, match.end(), end)
+        links.append((match.group(1), passcode.group(1) if passcode else ""))
+    return links
+
+
+def _message_urls(message) -> list[str]:
+    """URLs hidden behind text links and inline buttons."""
+    urls = [
+        entity.url
+        for entity in getattr(message, "entities", None) or []
+        if getattr(entity, "url", None)
+    ]
+
+    markup = getattr(message, "reply_markup", None)
+    for row in getattr(markup, "rows", None) or []:
+        for button in row.buttons:
+            # Older layers put the URL on the button, newer ones on its type
+            url = getattr(button, "url", None) or getattr(
+                getattr(button, "type", None), "url", None
+            )
+            if url:
+                urls.append(url)
+    return urls
+
+
+def extract_links(message) -> list[tuple[str, str]]:
+    """
+    (share_id, passcode) pairs from a message, in order of appearance.
+
+    Covers the text (or media caption), text-link entities and inline URL
+    buttons in one pass. Each share id appears once; a passcode found in any
+    place wins over an empty one. passcode is "" when there is none.
+    """
+    text = getattr(message, "message", None) or ""
+    links: dict[str, str] = {}
+    for share_id, passcode in _extract_from_text(text):
+        if not links.get(share_id):
+            links[share_id] = passcode
+    in_text = bool(links)
+
+    # Links behind entities/buttons may have their passcode in the text
+    # ("点击转存 提取码：ab12"); only trusted when it is unambiguous
+    written = set() if in_text else set(_TEXT_PASSCODE_RE.findall(text))
+    fallback = written.pop() if len(written) == 1 else ""
+
+    for url in _message_urls(message):
+        for share_id, passcode in _extract_from_text(url):
+            if not links.get(share_id):
+                links[share_id] = passcode or fallback
+    return list(links.items())
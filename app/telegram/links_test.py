@@ -0,0 +1,29 @@
+"""Test link extraction against the message corpus."""
+
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.telegram.links import extract_links, extract_quark_links
+from bench.links_bench import load_corpus
+
+
+def test_corpus():
+    for record in load_corpus():
+        expected = [tuple(pair) for pair in record["expected"]]
+        assert extract_links(record["message"]) == expected, record["name"]
+
+
+def test_extract_quark_links():
+    text = "a pan.quark.cn/s/abc123 b https://pan.quark.cn/s/def456?pwd=x1y2"
+    assert extract_quark_links(text) == ["abc123", "def456"]
+    assert extract_quark_links("") == []
+
+
+if __name__ == "__main__":
+    test_corpus()
+    test_extract_quark_links()
+    print("✅ All tests passed!")
@@ -2,36 +2,62 @@
 
 import asyncio
 import logging
-import re
-from telethon import TelegramClient, events
-from telethon.errors import SessionPasswordNeededError
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+from telethon import TelegramClient, events, utils
+from telethon.errors import FloodWaitError, SessionPasswordNeededError
 
-from app.config import TG_API_ID, TG_API_HASH, TG_CHANNEL, TG_SESSION_NAME, DATA_DIR
-from app.db import insert_tg_message, insert_share_pending
+from app.config import (
+    TG_API_ID,
+    TG_API_HASH,
+    TG_CHANNELS,
+    TG_CHANNEL_REFRESH,
+    TG_SESSION_NAME,
+    DATA_DIR,
+    BACKFILL_BATCH_SIZE,
+    BACKFILL_WAIT_TIME,
+)
+from app import db_async
+from app.telegram.links import extract_links
+from app.utils.metrics import DUPLICATES, LINKS_FOUND, MESSAGES_SEEN
 
 logger = logging.getLogger(__name__)
 
 
-def extract_quark_links(text: str) -> list[str]:
-    if not text:
-        return []
-
-    pattern = r"pan\.quark\.cn/s/([a-zA-Z0-9]+)"
-    matches = re.findall(pattern, text)
-    return matches
+def channel_key(entity) -> str:
+    """Key a channel's messages are stored under: its stable (marked) peer id."""
+    return str(utils.get_peer_id(entity))
 
 
 class TelegramListener:
     def __init__(self):
         self.client = None
+        self.running = False
+        # Set by the WebUI after signing in on this client
+        self.authorized = asyncio.Event()
+        # Resolved peer id -> channel as configured (e.g. "@D_wusun")
+        self.peers: dict[int, str] = {}
+        self._unresolved: set[str] = set()
+        # Per-channel counters: totals since start, and deltas not yet
+        # written to tg_channels
+        self.counts: dict[str, Counter] = defaultdict(Counter)
+        self._pending_counts: dict[str, Counter] = defaultdict(Counter)
+        self.started_at = time.monotonic()
 
     def _create_client(self):
         session_path = DATA_DIR / TG_SESSION_NAME
         return TelegramClient(str(session_path), TG_API_ID, TG_API_HASH)
 
+    async def connect(self):
+        """Connect without requiring a login, so the WebUI can sign in with this client."""
+        if self.client is None:
+            self.client = self._create_client()
+        if not self.client.is_connected():
+            await self.client.connect()
+
     async def start(self):
-        self.client = self._create_client()
-        await self.client.connect()
+        await self.connect()
 
         while not await self.client.is_user_authorized():
             logger.warning(
@@ -39,49 +65,283 @@ class TelegramListener:
                 "Please login via WebUI: http://localhost:8080/telegram/login"
             )
             logger.info("Will retry authorization check in 30 seconds...")
-            await asyncio.sleep(30)
-            await self.client.disconnect()
-            self.client = self._create_client()
-            await self.client.connect()
+            # The WebUI signs in on this same client and sets the event
+            try:
+                await asyncio.wait_for(self.authorized.wait(), 30)
+            except asyncio.TimeoutError:
+                pass
+            self.authorized.clear()
 
         me = await self.client.get_me()
         logger.info(f"Logged in as {me.first_name} (@{me.username or 'no username'})")
 
+    async def refresh_channels(self) -> list[str]:
+        """
+        Pick up channels from config and the tg_channels table.
+
+        New channels are resolved to peer ids once; removed ones stop being
+        handled. Returns the channels that were added.
+        """
+        rows = await db_async.sync_channels(TG_CHANNELS)
+        enabled = {row["channel"] for row in rows}
+        self.peers = {
+            peer_id: channel
+            for peer_id, channel in self.peers.items()
+            if channel in enabled
+        }
+
+        known = set(self.peers.values())
+        added = []
+        for channel in enabled - known:
+            try:
+                entity = await self.client.get_entity(channel)
+            except Exception as e:
+                if channel not in self._unresolved:
+                    self._unresolved.add(channel)
+                    logger.error(f"[TELEGRAM] cannot resolve channel {channel}: {e}")
+                continue
+
+            self._unresolved.discard(channel)
+            peer_id = utils.get_peer_id(entity)
+            username = getattr(entity, "username", None)
+            await db_async.set_channel_peer(
+                channel,
+                peer_id,
+                getattr(entity, "title", channel),
+                legacy_key=f"@{username}" if username else None,
+            )
+            self.peers[peer_id] = channel
+            added.append(channel)
+            logger.info(f"[TELEGRAM] watching {channel} (peer_id={peer_id})")
+
+        return added
+
+    def _count(self, channel: str, **deltas: int):
+        self.counts[channel].update(deltas)
+        self._pending_counts[channel].update(deltas)
+
+    async def flush_counts(self):
+        if not self._pending_counts:
+            return
+        counts = {
+            channel: dict(delta) for channel, delta in self._pending_counts.items()
+        }
+        self._pending_counts.clear()
+        await db_async.add_channel_counts(counts)
+
+    def get_channel_stats(self) -> dict[str, dict]:
+        """Per-channel throughput and duplicate ratio since start."""
+        minutes = max(time.monotonic() - self.started_at, 1) / 60
+        stats = {}
+        for channel in self.peers.values():
+            counts = self.counts[channel]
+            shares = counts["new_shares"] + counts["duplicate_shares"]
+            stats[channel] = {
+                "messages": counts["messages"],
+                "link_messages": counts["link_messages"],
+                "new_shares": counts["new_shares"],
+                "duplicate_shares": counts["duplicate_shares"],
+                "messages_per_min": counts["messages"] / minutes,
+                "duplicate_ratio": (
+                    counts["duplicate_shares"] / shares if shares else 0.0
+                ),
+            }
+        return stats
+
     async def on_new_message(self, event):
         message = event.message
-
-        channel_id = event.chat.username if event.chat else "unknown"
+        channel = self.peers.get(event.chat_id, str(event.chat_id))
         message_id = message.id
-        message_text = message.text or ""
 
-        logger.info(f"[TELEGRAM] new message id={message_id} from @{channel_id}")
+        logger.info(f"[TELEGRAM] new message id={message_id} from {channel}")
+        self._count(channel, messages=1)
+        MESSAGES_SEEN.inc(channel=channel)
 
-        if not extract_quark_links(message_text):
+        links = extract_links(message)
+        if not links:
             logger.debug(f"[TELEGRAM] no quark link in message {message_id}")
             return
 
-        if not insert_tg_message(f"@{channel_id}", message_id):
+        self._count(channel, link_messages=1)
+        LINKS_FOUND.inc(len(links), channel=channel)
+        new_share_ids = await db_async.ingest_message(
+            str(event.chat_id), message_id, links
+        )
+        if new_share_ids is None:
             logger.info(f"[DEDUP] message {message_id} already processed")
             return
 
-        share_ids = extract_quark_links(message_text)
-        for share_id in share_ids:
-            logger.info(f"[LINK] found pan.quark.cn/s/{share_id}")
+        self._count(
+            channel,
+            new_shares=len(new_share_ids),
+            duplicate_shares=len(links) - len(new_share_ids),
+        )
+        DUPLICATES.inc(len(links) - len(new_share_ids), kind="share")
+        for share_id, passcode in links:
+            logger.info(
+                f"[LINK] found pan.quark.cn/s/{share_id}"
+                + (" (with passcode)" if passcode else "")
+            )
 
-            if not insert_share_pending(share_id):
+            if share_id not in new_share_ids:
                 logger.info(f"[DEDUP] share_id={share_id} already exists")
                 continue
 
             logger.info(f"[NEW] share_id={share_id} queued for processing")
 
+    async def backfill(
+        self,
+        channel: str,
+        min_id: int = 0,
+        wait_time: float = BACKFILL_WAIT_TIME,
+    ) -> int:
+        """
+        Ingest a channel's messages newer than min_id, oldest first.
+
+        Messages with links go through ingest_messages() in batches, so
+        already-processed ones are skipped as usual. Flood waits are slept
+        off and iteration resumes after the last message seen. Returns the
+        number of messages scanned.
+        """
+        entity = await self.client.get_entity(channel)
+        key = channel_key(entity)
+        last_id = min_id
+        scanned = 0
+        queued = 0
+        batch = []
+
+        async def flush():
+            nonlocal queued
+            if batch:
+                results = await db_async.ingest_messages(batch)
+                queued += sum(len(new) for new in results if new)
+                batch.clear()
+
+        while True:
+            try:
+                async for message in self.client.iter_messages(
+                    entity, min_id=last_id, reverse=True, wait_time=wait_time
+                ):
+                    last_id = message.id
+                    scanned += 1
+                    links = extract_links(message)
+                    if links:
+                        batch.append((key, message.id, links))
+                    if len(batch) >= BACKFILL_BATCH_SIZE:
+                        await flush()
+                    if scanned % 1000 == 0:
+                        logger.info(
+                            f"[BACKFILL] {key}: scanned {scanned} messages, up to id={last_id}"
+                        )
+                break
+            except FloodWaitError as e:
+                await flush()
+                logger.warning(f"[BACKFILL] {key}: flood wait {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+
+        await flush()
+        logger.info(
+            f"[BACKFILL] {key}: scanned {scanned} messages after id={min_id}, "
+            f"queued {queued} new shares"
+        )
+        return scanned
+
+    async def catch_up(self, channel: str) -> Optional[int]:
+        """Backfill what was posted since the channel's last processed message."""
+        entity = await self.client.get_entity(channel)
+        last_id = await db_async.get_last_message_id(channel_key(entity))
+        if last_id is None:
+            logger.info(
+                f"[BACKFILL] no processed messages for {channel} yet, skipping catch-up "
+                f"(run `python -m app.main backfill {channel}` for full history)"
+            )
+            return None
+
+        logger.info(f"[BACKFILL] catching up {channel} from message id={last_id}")
+        return await self.backfill(channel, min_id=last_id)
+
+    async def _catch_up_safely(self, channels: Optional[list[str]] = None):
+        for channel in self.peers.values() if channels is None else channels:
+            try:
+                await self.catch_up(channel)
+            except Exception as e:
+                logger.error(f"[BACKFILL] catch-up failed for {channel}: {e}")
+
+    async def _backfill_loop(self):
+        """Run the backfills queued by `python -m app.main backfill`, one at a time."""
+        while self.running:
+            try:
+                for request in await db_async.get_backfill_requests():
+                    try:
+                        await self.backfill(
+                            request["channel"], min_id=request["from_id"], wait_time=0
+                        )
+                    except Exception as e:
+                        logger.error(
+                            f"[BACKFILL] requested backfill of {request['channel']} "
+                            f"failed: {e}"
+                        )
+                    await db_async.finish_backfill_request(request["id"])
+            except Exception as e:
+                # e.g. a locked database; the requests are still there next time
+                logger.error(f"[BACKFILL] reading backfill requests failed: {e}")
+            await asyncio.sleep(TG_CHANNEL_REFRESH)
+
+    async def _refresh_loop(self):
+        """Watch channels added at runtime and persist the counters."""
+        while self.running:
+            await asyncio.sleep(TG_CHANNEL_REFRESH)
+            try:
+                added = await self.refresh_channels()
+                if added:
+                    await self._catch_up_safely(added)
+                await self.flush_counts()
+            except Exception as e:
+                logger.error(f"[TELEGRAM] channel refresh failed: {e}")
+
+    async def _watch_connection(self, interval: float = 5):
+        """Catch up after Telethon reconnects from a network drop."""
+        connected = True
+        while self.running:
+            await asyncio.sleep(interval)
+            if self.client.is_connected():
+                if not connected:
+                    logger.info("[TELEGRAM] reconnected")
+                    await self._catch_up_safely()
+                connected = True
+            else:
+                if connected:
+                    logger.warning("[TELEGRAM] connection lost, waiting for reconnect")
+                connected = False
+
     async def listen(self):
+        self.running = True
+        await self.refresh_channels()
+        # One handler for every channel, filtered on the resolved peer ids so
+        # channels added later need no new handler. Registered before the
+        # catch-up so nothing posted meanwhile falls in a gap.
         self.client.add_event_handler(
-            self.on_new_message, events.NewMessage(chats=TG_CHANNEL)
+            self.on_new_message,
+            events.NewMessage(func=lambda event: event.chat_id in self.peers),
         )
+        await self._catch_up_safely()
+        watcher = asyncio.create_task(self._watch_connection())
+        refresher = asyncio.create_task(self._refresh_loop())
+        backfiller = asyncio.create_task(self._backfill_loop())
 
-        logger.info(f"Listening for messages in {TG_CHANNEL}...")
-        await self.client.run_until_disconnected()
+        logger.info(f"Listening for messages in {len(self.peers)} channels...")
+        try:
+            await self.client.run_until_disconnected()
+        finally:
+            self.running = False
+            watcher.cancel()
+            refresher.cancel()
+            backfiller.cancel()
+            await self.flush_counts()
 
     async def stop(self):
+        self.running = False
+        if self.client is None:
+            return
         await self.client.disconnect()
         logger.info("Telegram client disconnected")
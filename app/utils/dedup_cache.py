@@ -0,0 +1,187 @@
+"""Bounded in-memory front for message and share id dedup."""
+
+import hashlib
+import math
+import sys
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.config import DEDUP_BLOOM_CAPACITY, DEDUP_BLOOM_ERROR_RATE, DEDUP_CACHE_SIZE
+from app.utils.metrics import DEDUP_CACHE
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized for capacity keys at error_rate.
+
+    A key that was added is always reported present; an absent key is
+    reported present with about error_rate probability. Adding more than
+    capacity keys raises that rate but keeps the first guarantee.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        error_rate = min(max(error_rate, 1e-6), 0.5)
+        self.capacity = capacity
+        self.size = max(
+            64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> list[int]:
+        # Double hashing over one digest instead of k separate hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _message_key(channel_id: str, message_id: int) -> str:
+    return f"{channel_id}:{message_id}"
+
+
+class DedupCache:
+    """
+    Recently seen message keys and share ids in front of the DB's dedup.
+
+    Only keys the DB has confirmed are added, so an LRU hit is a known
+    duplicate and can be rejected without a query; a miss falls through to
+    the DB, which stays authoritative. A share cached without a passcode is
+    a miss for a message carrying one, so the DB can still fill it in.
+
+    The Bloom filter holds every processed message key (warmed from the DB
+    at startup). A message missing from the LRU that the filter rules out
+    is certainly new and goes straight to its write; only filter positives
+    need an existence check first.
+
+    Used from the event loop only, apart from warm_messages().
+    """
+
+    def __init__(
+        self,
+        size: int = DEDUP_CACHE_SIZE,
+        bloom_capacity: int = DEDUP_BLOOM_CAPACITY,
+        bloom_error_rate: float = DEDUP_BLOOM_ERROR_RATE,
+    ):
+        self.size = max(0, size)
+        self.messages: OrderedDict[tuple[str, int], None] = OrderedDict()
+        # share_id -> whether its row is known to have a passcode
+        self.shares: OrderedDict[str, bool] = OrderedDict()
+        self.bloom: Optional[BloomFilter] = (
+            BloomFilter(bloom_capacity, bloom_error_rate)
+            if bloom_capacity > 0
+            else None
+        )
+        self.counts: dict[tuple[str, str], int] = {}
+
+    def _count(self, kind: str, result: str, amount: int = 1):
+        key = (kind, result)
+        self.counts[key] = self.counts.get(key, 0) + amount
+        DEDUP_CACHE.inc(amount, kind=kind, result=result)
+
+    def _remember(self, lru: OrderedDict, key, value):
+        if not self.size:
+            return
+        lru[key] = value
+        lru.move_to_end(key)
+        if len(lru) > self.size:
+            lru.popitem(last=False)
+
+    def has_message(self, channel_id: str, message_id: int) -> bool:
+        """Whether the message is known to be processed, without a query."""
+        key = (channel_id, message_id)
+        if key in self.messages:
+            self.messages.move_to_end(key)
+            self._count("message", "hit")
+            return True
+        self._count("message", "miss")
+        return False
+
+    def needs_check(self, channel_id: str, message_id: int) -> bool:
+        """False if the Bloom filter proves the message new (or there is none)."""
+        if self.bloom is None:
+            return False
+        if _message_key(channel_id, message_id) in self.bloom:
+            self._count("bloom", "maybe")
+            return True
+        self._count("bloom", "new")
+        return False
+
+    def record_false_positives(self, count: int):
+        """Bloom positives the DB then found to be new messages."""
+        if count:
+            self._count("bloom", "false_positive", count)
+
+    def add_message(self, channel_id: str, message_id: int):
+        channel_id = sys.intern(channel_id)
+        self._remember(self.messages, (channel_id, message_id), None)
+        if self.bloom is not None:
+            self.bloom.add(_message_key(channel_id, message_id))
+
+    def has_share(self, share_id: str, passcode: str = "") -> bool:
+        """Whether the share is known and a passcode would change nothing."""
+        has_passcode = self.shares.get(share_id)
+        if has_passcode is not None and (has_passcode or not passcode):
+            self.shares.move_to_end(share_id)
+            self._count("share", "hit")
+            return True
+        self._count("share", "miss")
+        return False
+
+    def add_share(self, share_id: str, has_passcode: bool = False):
+        self._remember(
+            self.shares, share_id, has_passcode or self.shares.get(share_id, False)
+        )
+
+    def warm_shares(self, shares: Iterable[tuple[str, bool]]):
+        """
+        Add (share_id, has_passcode) pairs, newest first, behind live entries.
+
+        Keys added since startup stay the most recent; warming stops once
+        the LRU is full.
+        """
+        for share_id, has_passcode in shares:
+            if len(self.shares) >= self.size:
+                break
+            if share_id not in self.shares:
+                self.shares[share_id] = bool(has_passcode)
+                self.shares.move_to_end(share_id, last=False)
+
+    def warm_messages(self, keys: Iterable[tuple[str, int]]) -> int:
+        """
+        Add processed message keys to the Bloom filter; returns how many.
+
+        Safe to run on a DB thread while the loop uses the cache: a bit lost
+        to a concurrent update only makes a duplicate take the DB path.
+        """
+        if self.bloom is None:
+            return 0
+        added = 0
+        for channel_id, message_id in keys:
+            self.bloom.add(_message_key(channel_id, message_id))
+            added += 1
+        return added
+
+    def stats(self) -> dict:
+        stats = {
+            "size": self.size,
+            "messages": len(self.messages),
+            "shares": len(self.shares),
+            "bloom_keys": self.bloom.count if self.bloom else 0,
+            "bloom_capacity": self.bloom.capacity if self.bloom else 0,
+            "bloom_bytes": len(self.bloom.bits) if self.bloom else 0,
+        }
+        for (kind, result), count in sorted(self.counts.items()):
+            stats[f"{kind}_{result}"] = count
+        return stats
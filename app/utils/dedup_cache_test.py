@@ -0,0 +1,75 @@
+"""Test the in-memory dedup cache and the ingestion path in front of the DB."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app import db, db_async
+from app.db_test import reset_db
+from app.utils.dedup_cache import BloomFilter, DedupCache
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"key{i}")
+
+    assert all(f"key{i}" in bloom for i in range(10000))
+    false_positives = sum(f"other{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_lru():
+    cache = DedupCache(size=2, bloom_capacity=0)
+    cache.add_share("a")
+    cache.add_share("b", has_passcode=True)
+    assert cache.has_share("a")
+    # A passcode could still fill in "a", so that is left to the DB
+    assert not cache.has_share("a", "pwd")
+    assert cache.has_share("b", "pwd")
+
+    cache.add_share("c")
+    assert not cache.has_share("a")
+    assert cache.has_share("b") and cache.has_share("c")
+    assert not cache.needs_check("chan", 1)
+
+
+def test_ingest_through_cache():
+    reset_db()
+    db.init_db()
+    db.ingest_messages([("chan", 1, ["old"])])
+    db_async.dedup_cache = DedupCache(size=100, bloom_capacity=1000)
+
+    async def run():
+        await db_async.warm_dedup_cache()
+        cache = db_async.dedup_cache
+        assert cache.has_share("old")
+
+        # Known message and known share: rejected without touching the DB
+        assert await db_async.ingest_message("chan", 1, ["new"]) is None
+        assert await db_async.ingest_message("chan", 2, ["old", "new"]) == ["new"]
+        assert await db_async.ingest_message("chan", 2, ["new"]) is None
+        assert await db_async.ingest_messages(
+            [("chan", 3, ["new", ("newer", "pwd")]), ("chan", 2, ["x"])]
+        ) == [["newer"], None]
+        assert not await db_async.insert_share_pending("newer")
+
+        # A key the cache has forgotten is still caught by the DB
+        db_async.dedup_cache = DedupCache(size=100, bloom_capacity=0)
+        assert await db_async.ingest_message("chan", 3, ["x"]) is None
+        assert await db_async.ingest_message("chan", 4, ["new"]) == []
+        return cache.stats()
+
+    try:
+        stats = asyncio.run(run())
+    finally:
+        db_async.shutdown()
+        db_async.dedup_cache = DedupCache()
+
+    assert stats["message_hit"] >= 2
+    assert stats["share_hit"] >= 2
+    assert db.get_status_counts() == {"pending": 3}
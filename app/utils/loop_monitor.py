@@ -0,0 +1,70 @@
+"""Event loop lag monitor."""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a fixed-interval sleep.
+
+    Any synchronous work on the loop (blocking DB calls, CPU-heavy parsing)
+    shows up as lag, so this is a cheap way to spot stalls in production.
+    """
+
+    def __init__(self, interval: float = 0.1, report_every: float = 60.0):
+        self.interval = interval
+        self.report_every = report_every
+        self.running = False
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_time = 0.0
+
+    def record(self, lag: float):
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.interval:
+            self.blocked_time += lag
+
+    def get_stats(self) -> dict:
+        """Lag stats in milliseconds since the last reset."""
+        return {
+            "samples": self.samples,
+            "avg_ms": self.total_lag / self.samples * 1000 if self.samples else 0.0,
+            "max_ms": self.max_lag * 1000,
+            "blocked_ms": self.blocked_time * 1000,
+        }
+
+    def reset(self):
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_time = 0.0
+
+    async def run(self):
+        self.running = True
+        last_report = time.perf_counter()
+
+        while self.running:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.record(max(0.0, now - started - self.interval))
+
+            if now - last_report >= self.report_every:
+                stats = self.get_stats()
+                logger.info(
+                    f"[LOOP] lag avg={stats['avg_ms']:.1f}ms "
+                    f"max={stats['max_ms']:.1f}ms blocked={stats['blocked_ms']:.0f}ms "
+                    f"over {now - last_report:.0f}s"
+                )
+                self.reset()
+                last_report = now
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,252 @@
+"""In-process metrics, exposed in the Prometheus text format at /metrics."""
+
+import functools
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+# Seconds; suits HTTP calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Updated from the loop and from the DB threads
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; observe() takes seconds."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> ([count per bucket], sum, count)
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager (or decorator, also for coroutines) observing its duration."""
+        return _Timer(self, labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+    def __call__(self, fn: Callable) -> Callable:
+        histogram, labels = self.histogram, self.labels
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with _Timer(histogram, labels):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self.metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Listener
+MESSAGES_SEEN = REGISTRY.register(
+    Counter("quarkflow_messages_total", "Telegram messages seen", ("channel",))
+)
+LINKS_FOUND = REGISTRY.register(
+    Counter("quarkflow_links_total", "Quark share links found", ("channel",))
+)
+DUPLICATES = REGISTRY.register(
+    Counter(
+        "quarkflow_duplicates_total",
+        "Shares skipped as duplicates: a known share id, or content already saved",
+        ("kind",),
+    )
+)
+DEDUP_CACHE = REGISTRY.register(
+    Counter(
+        "quarkflow_dedup_cache_total",
+        "In-memory dedup lookups: message/share hit or miss, bloom new/maybe/false_positive",
+        ("kind", "result"),
+    )
+)
+
+# Worker
+SAVES = REGISTRY.register(Counter("quarkflow_saves_total", "Shares saved"))
+SAVE_FAILURES = REGISTRY.register(
+    Counter(
+        "quarkflow_save_failures_total",
+        "Failed save attempts by error class",
+        ("error_class",),
+    )
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge("quarkflow_queue_depth", "Shares in each status", ("status",))
+)
+IN_FLIGHT = REGISTRY.register(
+    Gauge("quarkflow_in_flight", "Saves in flight in this process")
+)
+CONCURRENCY_LIMIT = REGISTRY.register(
+    Gauge("quarkflow_concurrency_limit", "Current adaptive in-flight save limit")
+)
+SAVE_LATENCY = REGISTRY.register(
+    Histogram(
+        "quarkflow_message_to_saved_seconds",
+        "Time from a message being seen to its share being saved",
+        buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+    )
+)
+
+# Quark client
+ACCOUNT_QUARANTINED_UNTIL = REGISTRY.register(
+    Gauge(
+        "quarkflow_quark_account_quarantined_until",
+        "Unix time a Quark account with an expired cookie is tried again, 0 if in use",
+        ("account",),
+    )
+)
+QUARK_CALL_SECONDS = REGISTRY.register(
+    Histogram("quarkflow_quark_call_seconds", "Quark API call latency", ("call",))
+)
+
+# DB layer
+DB_OPERATION_SECONDS = REGISTRY.register(
+    Histogram(
+        "quarkflow_db_operation_seconds",
+        "app.db operation latency, run through app.db_async",
+        ("operation",),
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+)
@@ -0,0 +1,49 @@
+"""Test the metrics registry and its text format."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.metrics import Counter, Histogram, Registry
+
+
+def test_render():
+    registry = Registry()
+    failures = registry.register(
+        Counter("failures_total", "Failures", ("error_class",))
+    )
+    latency = registry.register(Histogram("latency_seconds", "Latency", buckets=(1, 5)))
+
+    failures.inc(error_class="network")
+    failures.inc(2, error_class='say "hi"')
+    latency.observe(0.5)
+    latency.observe(3)
+    latency.observe(30)
+
+    text = registry.render()
+    assert "# TYPE failures_total counter" in text
+    assert 'failures_total{error_class="network"} 1' in text
+    assert 'failures_total{error_class="say \\"hi\\""} 2' in text
+    # Buckets are cumulative
+    assert 'latency_seconds_bucket{le="1"} 1' in text
+    assert 'latency_seconds_bucket{le="5"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 33.5" in text
+    assert "latency_seconds_count 3" in text
+
+
+def test_timer_decorator():
+    latency = Histogram("call_seconds", "Latency", ("call",))
+
+    @latency.time(call="test")
+    async def call():
+        await asyncio.sleep(0.01)
+        return 42
+
+    assert asyncio.run(call()) == 42
+    _, total, count = latency.values[("test",)]
+    assert count == 1 and total >= 0.01
@@ -1,46 +1,146 @@
 """Telegram notification service."""
 
+import asyncio
 import logging
+from collections import Counter
+from typing import Optional
 from telethon import TelegramClient
 from telethon.errors import MessageEmptyError
 
-from app.config import TG_API_ID, TG_API_HASH, TG_SESSION_NAME
+from app.config import (
+    NOTIFY_DIGEST_INTERVAL,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_RELAY_INTERVAL,
+)
+from app import db_async
 
 logger = logging.getLogger(__name__)
 
+_EVENT_LABELS = {"saved": "已转存", "failed": "失败", "duplicate": "重复跳过"}
+
 
 class TelegramNotifier:
-    def __init__(self):
-        self.client = TelegramClient(f"data/{TG_SESSION_NAME}", TG_API_ID, TG_API_HASH)
+    """
+    Sends messages to the logged-in account's Saved Messages.
+
+    Messages are queued and sent by run(), so callers never wait on
+    Telegram. Pass the listener's client to share its connection. Without
+    one (worker-only processes) the notifier never touches the Telegram
+    session, which belongs to the listener's process: messages are stored
+    in the notifications table instead, and the notifier with a client
+    sends them every NOTIFY_RELAY_INTERVAL seconds. Events counted with
+    record() are sent as a periodic digest instead of one message each, by
+    the notifier with a client only.
+    """
 
-    async def start(self):
-        await self.client.start()
-        logger.info("Notifier: Telegram client started")
+    def __init__(self, client: Optional[TelegramClient] = None):
+        self.client = client
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        self.events: Counter = Counter()
+        self.running = False
+        self._me = None
 
-    async def send_cookie_expired_alert(self, error_message: str = ""):
+    def notify(self, message: str):
+        """Queue a message; dropped with a warning if the queue is full."""
         try:
-            me = await self.client.get_me()
-            user_id = me.id
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Notifier: queue full, message dropped")
+
+    def record(self, event: str, count: int = 1):
+        """Count an event (e.g. "saved", "failed") for the next digest."""
+        self.events[event] += count
 
-            message = f"""⚠️ QuarkFlow Cookie 已过期！
+    def send_cookie_expired_alert(self, error_message: str = ""):
+        self.notify(f"""⚠️ QuarkFlow Cookie 已过期！
 
 错误信息：{error_message}
 
 请立即更新：
 1. 访问 http://your-vps:8080/login
-2. 重新获取 Cookie
-3. 重启容器：docker compose restart
+2. 重新获取并提交 Cookie（无需重启，新 Cookie 会立即生效）
 
-Cookie 过期会导致转存失败。"""
+Cookie 过期会导致转存失败。""")
 
-            await self.client.send_message(user_id, message)
-            logger.info("Notifier: Cookie expired alert sent")
+    async def _send(self, message: str):
+        if self.client is None:
+            try:
+                await db_async.queue_notifications([message])
+            except Exception as e:
+                logger.error(f"Notifier: Failed to store message: {e}")
+            return
 
+        try:
+            if self._me is None:
+                self._me = await self.client.get_me(input_peer=True)
+            await self.client.send_message(self._me, message)
+            logger.info("Notifier: message sent")
         except MessageEmptyError:
             logger.error("Notifier: Failed to send message - empty message")
         except Exception as e:
-            logger.error(f"Notifier: Failed to send alert: {e}")
+            logger.error(f"Notifier: Failed to send message: {e}")
+
+    async def build_digest(self) -> Optional[str]:
+        """Digest of events since the last one, or None if there is nothing to say."""
+        events, self.events = self.events, Counter()
+        statuses = await db_async.get_status_counts()
+        backlog = statuses.get("pending", 0) + statuses.get("processing", 0)
+        if not events and not backlog:
+            return None
+
+        lines = ["📊 QuarkFlow 摘要"]
+        lines += [
+            f"{_EVENT_LABELS.get(event, event)}: {count}"
+            for event, count in sorted(events.items())
+        ]
+        lines.append(f"待处理: {backlog}")
+        if statuses.get("submitted"):
+            lines.append(f"转存中: {statuses['submitted']}")
+        return "\n".join(lines)
+
+    async def _digest_loop(self):
+        while self.running:
+            await asyncio.sleep(NOTIFY_DIGEST_INTERVAL)
+            try:
+                digest = await self.build_digest()
+                if digest:
+                    self.notify(digest)
+            except Exception as e:
+                logger.error(f"Notifier: failed to build digest: {e}")
+
+    async def _relay_loop(self):
+        """Send messages stored by notifiers without a client."""
+        while self.running:
+            await asyncio.sleep(NOTIFY_RELAY_INTERVAL)
+            try:
+                free = self.queue.maxsize - self.queue.qsize()
+                for message in await db_async.take_notifications(free):
+                    self.notify(message)
+            except Exception as e:
+                logger.error(f"Notifier: failed to read stored messages: {e}")
+
+    async def run(self):
+        """Send queued messages until stop()."""
+        self.running = True
+        background = []
+        if self.client is not None:
+            background.append(asyncio.create_task(self._relay_loop()))
+            if NOTIFY_DIGEST_INTERVAL > 0:
+                background.append(asyncio.create_task(self._digest_loop()))
+
+        try:
+            while self.running:
+                message = await self.queue.get()
+                if message is None:
+                    break
+                await self._send(message)
+        finally:
+            for task in background:
+                task.cancel()
 
     async def stop(self):
-        await self.client.disconnect()
-        logger.info("Notifier: Telegram client disconnected")
+        """Send (or store) what is still queued."""
+        self.running = False
+        while not self.queue.empty():
+            await self._send(self.queue.get_nowait())
+        self.queue.put_nowait(None)
@@ -0,0 +1,51 @@
+"""Test that notifiers without a Telegram client relay through the DB."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app import db, db_async
+from app.db_test import reset_db
+from app.utils.notifier import TelegramNotifier
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    async def get_me(self, input_peer=False):
+        return "me"
+
+    async def send_message(self, peer, message):
+        self.sent.append(message)
+
+
+def test_relay():
+    reset_db()
+    db.init_db()
+
+    async def run():
+        # A worker-only process: nothing to start, alerts go to the DB
+        worker_side = TelegramNotifier()
+        worker_side.send_cookie_expired_alert("need login")
+        worker_side.notify("second")
+        await worker_side.stop()
+
+        client = FakeClient()
+        main_side = TelegramNotifier(client)
+        for message in await db_async.take_notifications(10):
+            await main_side._send(message)
+        return client.sent
+
+    try:
+        sent = asyncio.run(run())
+    finally:
+        db_async.shutdown()
+
+    assert len(sent) == 2
+    assert "need login" in sent[0] and sent[1] == "second"
+    assert db.take_notifications(10) == []
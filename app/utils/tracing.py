@@ -0,0 +1,110 @@
+"""Per-share execution traces."""
+
+import functools
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from app.config import TRACE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Spans recorded for one share while its work runs, written out together."""
+
+    def __init__(self, share_id: str):
+        self.share_id = share_id
+        # (name, started_at, duration_ms, depth, error)
+        self.spans: list[tuple] = []
+
+
+# Context variables follow the work into awaited calls and tasks created
+# from it, so nested calls attach their spans without being passed anything
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_depth: ContextVar[int] = ContextVar("trace_depth", default=0)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def record_span(
+    name: str, started_at: float, ended_at: float, error: Optional[str] = None
+):
+    """Add a span with known wall-clock bounds to the current trace, if any."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append(
+            (name, started_at, (ended_at - started_at) * 1000, _depth.get(), error)
+        )
+
+
+@contextmanager
+def span(name: str):
+    """Time a block as a span of the current trace; a no-op outside one."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _depth.reset(token)
+        trace.spans.append(
+            (name, started_at, (time.perf_counter() - started) * 1000, depth, error)
+        )
+
+
+def traced(name: str) -> Callable:
+    """Decorator running a coroutine function inside span(name)."""
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@asynccontextmanager
+async def trace_share(share_id: str):
+    """
+    Collect spans for share_id inside the block, then store them.
+
+    Nothing is recorded when tracing is disabled or a trace is already
+    active. A failure to store spans is logged, never raised.
+    """
+    if not TRACE_ENABLED or _trace.get() is not None:
+        yield None
+        return
+
+    trace = Trace(share_id)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+        if trace.spans:
+            from app import db_async
+
+            try:
+                await db_async.record_spans(
+                    [(share_id, *entry) for entry in trace.spans]
+                )
+            except Exception as e:
+                logger.error(f"[TRACE] failed to store spans for {share_id}: {e}")
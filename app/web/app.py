@@ -1,177 +1,534 @@
 """Web UI for QuarkFlow configuration."""
 
-from flask import Flask, render_template, request, jsonify
+from aiohttp import web
+import base64
+import json
 import logging
-import os
-import asyncio
+import re
+import time
 from pathlib import Path
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError
 import string
 import random
 
+from app import db_async
+from app.config import ENV_FILE
+from app.settings import ACCOUNT_COOKIES, LIVE_SETTINGS, SECRET_SETTINGS
+from app.utils.metrics import QUEUE_DEPTH, REGISTRY
+
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET_KEY", "quarkflow-secret-key")
+TEMPLATES_DIR = Path(__file__).parent / "templates"
 
-BASE_DIR = Path(__file__).parent.parent.parent
-ENV_FILE = BASE_DIR / ".env"
+routes = web.RouteTableDef()
 
 telegram_login_sessions = {}
 
 
-@app.route("/")
-def index():
-    return render_template("index.html")
+def _page(name: str):
+    async def handler(request):
+        return web.FileResponse(TEMPLATES_DIR / name)
+
+    return handler
+
+
+routes.get("/")(_page("index.html"))
+routes.get("/login")(_page("login.html"))
+routes.get("/telegram/login")(_page("telegram_login.html"))
 
 
-@app.route("/login")
-def login():
-    return render_template("login.html")
+async def _get_telegram_client(request) -> TelegramClient:
+    """
+    The running listener's client, so login uses the live connection.
 
+    Standalone, one client is opened on first use and kept for the app's
+    lifetime.
+    """
+    listener = request.app["listener"]
+    if listener is not None and listener.client is not None:
+        return listener.client
 
-@app.route("/telegram/login")
-def telegram_login():
-    return render_template("telegram_login.html")
+    client = request.app.get("telegram_client")
+    if client is None:
+        from app.config import TG_API_ID, TG_API_HASH, TG_SESSION_NAME, DATA_DIR
 
+        client = TelegramClient(str(DATA_DIR / TG_SESSION_NAME), TG_API_ID, TG_API_HASH)
+        request.app["telegram_client"] = client
+    if not client.is_connected():
+        await client.connect()
+    return client
 
-@app.route("/api/cookie", methods=["POST"])
-def update_cookie():
-    data = request.json
+
+@routes.post("/api/cookie")
+async def update_cookie(request):
+    data = await request.json()
 
     cookie = data.get("cookie", "").strip()
+    # An extra account from QUARK_ACCOUNTS, or the main one
+    account = (data.get("account") or "default").strip().lower()
+    key = "QUARK_COOKIE" if account == "default" else f"QUARK_COOKIE_{account.upper()}"
 
     if not cookie:
-        return jsonify({"success": False, "error": "Cookie is required"}), 400
+        return web.json_response(
+            {"success": False, "error": "Cookie is required"}, status=400
+        )
+    if key != "QUARK_COOKIE" and key not in ACCOUNT_COOKIES:
+        return web.json_response(
+            {"success": False, "error": f"Unknown account: {account}"}, status=400
+        )
 
     try:
         update_env_file(
             {
-                "QUARK_COOKIE": f'"{cookie}"',
+                key: f'"{cookie}"',
             }
         )
+        # Also in the DB, so workers running elsewhere pick it up
+        await db_async.set_settings({key: cookie})
+        applied = await _refresh_settings(request)
 
-        logger.info("Cookie updated via WebUI")
+        logger.info(f"Cookie of account {account} updated via WebUI")
 
-        return jsonify(
+        return web.json_response(
             {
                 "success": True,
-                "message": "Cookie updated successfully. Please restart the container.",
+                "message": (
+                    "Cookie updated and applied."
+                    if applied
+                    else "Cookie updated, running workers apply it within seconds."
+                ),
             }
         )
 
     except Exception as e:
         logger.error(f"Failed to update cookie: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def _refresh_settings(request) -> bool:
+    """Apply stored changes now instead of on the next check, if running with settings."""
+    settings = request.app["settings"]
+    if settings is None:
+        return False
+    await settings.refresh()
+    return True
+
+
+@routes.get("/api/settings")
+async def get_settings(request):
+    settings = request.app["settings"]
+    if settings is None:
+        return web.json_response(
+            {"success": False, "error": "Settings are not loaded"}, status=503
+        )
+
+    values = dict(settings.values)
+    # Never echo the cookies back
+    for key in SECRET_SETTINGS:
+        values[key] = bool(values[key])
+    return web.json_response(values)
 
 
-@app.route("/api/status")
-def status():
+@routes.post("/api/settings")
+async def update_settings(request):
+    data = await request.json()
+
+    unknown = set(data) - set(LIVE_SETTINGS)
+    if unknown or not data:
+        return web.json_response(
+            {
+                "success": False,
+                "error": f"Settings must be some of {', '.join(LIVE_SETTINGS)}",
+            },
+            status=400,
+        )
+
+    await db_async.set_settings({key: str(value) for key, value in data.items()})
+    applied = await _refresh_settings(request)
+    logger.info(f"Settings {', '.join(sorted(data))} updated via WebUI")
+    return web.json_response({"success": True, "applied": applied})
+
+
+@routes.get("/api/status")
+async def status(request):
     from app.config import QUARK_COOKIE, TG_SESSION_NAME, DATA_DIR
 
-    TG_SESSION_FILE = DATA_DIR / f"{TG_SESSION_NAME}.session"
-    telegram_configured = TG_SESSION_FILE.exists()
+    listener = request.app["listener"]
+    if listener is not None and listener.client is not None:
+        telegram_configured = await listener.client.is_user_authorized()
+    else:
+        TG_SESSION_FILE = DATA_DIR / f"{TG_SESSION_NAME}.session"
+        telegram_configured = TG_SESSION_FILE.exists()
 
-    return jsonify(
+    settings = request.app["settings"]
+    cookie = settings.get("QUARK_COOKIE") if settings is not None else QUARK_COOKIE
+
+    return web.json_response(
         {
-            "quark_configured": bool(QUARK_COOKIE),
+            "quark_configured": bool(cookie),
             "telegram_configured": telegram_configured,
         }
     )
 
 
-@app.route("/api/telegram/send-code", methods=["POST"])
-def send_telegram_code():
-    from app.config import TG_API_ID, TG_API_HASH, TG_SESSION_NAME, DATA_DIR
+@routes.get("/metrics")
+async def metrics(request):
+    """Prometheus text exposition of app.utils.metrics."""
+    counts = await db_async.get_status_counts()
+    for status in ("pending", "processing", "submitted", "failed"):
+        QUEUE_DEPTH.set(counts.get(status, 0), status=status)
+
+    return web.Response(
+        body=REGISTRY.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+@routes.get("/api/traces")
+async def slowest_traces(request):
+    """Slowest shares traced in the last `window` seconds (default one hour)."""
+    try:
+        window = float(request.query.get("window", 3600))
+        limit = min(int(request.query.get("limit", 20)), 200)
+    except ValueError:
+        return web.json_response(
+            {"success": False, "error": "window and limit must be numbers"},
+            status=400,
+        )
+
+    traces = await db_async.get_slowest_traces(time.time() - window, limit)
+    return web.json_response(traces)
+
+
+@routes.get("/api/traces/{share_id}")
+async def share_trace(request):
+    """A share's spans in start order, with offsets from the first one."""
+    share_id = request.match_info["share_id"]
+    spans = await db_async.get_trace(share_id)
+    if not spans:
+        return web.json_response(
+            {"success": False, "error": "No trace for this share"}, status=404
+        )
+
+    start = spans[0]["started_at"]
+    end = max(span["started_at"] + span["duration_ms"] / 1000 for span in spans)
+    for span in spans:
+        span["offset_ms"] = (span["started_at"] - start) * 1000
+    return web.json_response(
+        {
+            "share_id": share_id,
+            "status": await db_async.get_share_status(share_id),
+            "total_ms": (end - start) * 1000,
+            "spans": spans,
+        }
+    )
+
+
+@routes.get("/api/dedup")
+async def dedup_report(request):
+    report = await db_async.get_dedup_report()
+    report["cache"] = db_async.dedup_cache.stats()
+    return web.json_response(report)
+
+
+@routes.get("/api/limits")
+async def limits(request):
+    """Per-account concurrency limit, token buckets and throttle pauses."""
+    worker = request.app["worker"]
+    if worker is None:
+        return web.json_response(
+            {"success": False, "error": "No worker runs in this process"}, status=503
+        )
+    return web.json_response(worker.accounts.get_limits())
+
+
+@routes.get("/api/latency")
+async def latency(request):
+    """Message-to-saved latency percentiles over the worker's recent saves."""
+    worker = request.app["worker"]
+    if worker is None:
+        return web.json_response(
+            {"success": False, "error": "No worker runs in this process"}, status=503
+        )
+    return web.json_response(worker.get_latency_stats())
+
+
+@routes.get("/api/retention")
+async def retention_report(request):
+    """Database size and free space, and what retention has cleaned up."""
+    retention = request.app["retention"]
+    if retention is None:
+        return web.json_response({"storage": await db_async.get_storage_stats()})
+    return web.json_response(await retention.report())
+
+
+@routes.post("/api/retention/run")
+async def run_retention(request):
+    retention = request.app["retention"]
+    if retention is None or not retention.running:
+        return web.json_response(
+            {"success": False, "error": "Retention is not running"}, status=503
+        )
+    retention.wake()
+    return web.json_response({"success": True})
+
+
+# Rows per page of /api/shares, and per write job of the bulk actions
+SHARES_PAGE_MAX = 500
+SHARE_STATUSES = {
+    "pending",
+    "processing",
+    "submitted",
+    "saved",
+    "failed",
+    "duplicate",
+    "cancelled",
+}
+
+
+def _encode_cursor(row: dict) -> str:
+    key = json.dumps([row["updated_at"], row["share_id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not (isinstance(key, list) and len(key) == 2):
+        raise ValueError("bad cursor")
+    return str(key[0]), str(key[1])
+
+
+def _share_filter(params) -> dict:
+    """status, since, until (unix timestamps) and error from a query or JSON body."""
+    status = params.get("status") or None
+    if status is not None and status not in SHARE_STATUSES:
+        raise ValueError(f"unknown status {status}")
+    return {
+        "status": status,
+        "since": float(params["since"]) if params.get("since") is not None else None,
+        "until": float(params["until"]) if params.get("until") is not None else None,
+        "error": params.get("error") or None,
+    }
+
+
+@routes.get("/api/shares")
+async def list_shares(request):
+    """
+    Shares, most recently updated first, optionally filtered by status,
+    since/until and an error substring. Pass next_cursor back as cursor
+    for the next page; it is null on the last one.
+    """
+    query = request.query
+    try:
+        filters = _share_filter(query)
+        limit = min(max(int(query.get("limit", 50)), 1), SHARES_PAGE_MAX)
+        after = _decode_cursor(query["cursor"]) if query.get("cursor") else None
+    except ValueError:
+        return web.json_response(
+            {
+                "success": False,
+                "error": "Invalid status, limit, since, until or cursor",
+            },
+            status=400,
+        )
+
+    shares = await db_async.list_shares(**filters, after=after, limit=limit)
+    return web.json_response(
+        {
+            "shares": shares,
+            "next_cursor": _encode_cursor(shares[-1]) if len(shares) == limit else None,
+        }
+    )
+
+
+async def _requeue(share_ids: list[str]) -> int:
+    return len(await db_async.requeue_shares(share_ids))
+
+
+_BULK_ACTIONS = {"requeue": _requeue, "cancel": db_async.cancel_shares}
+
+
+@routes.post("/api/shares/{action}")
+async def update_shares(request):
+    """
+    Requeue or cancel shares: {"share_ids": [...]}, or {"filter": {...}}
+    with the filters of GET /api/shares to act on every match.
+
+    Only failed, duplicate, cancelled and pending shares are requeued, and
+    only pending ones cancelled. Matches are read and updated a page at a
+    time, so the worker's writes interleave with a large action.
+    """
+    name = request.match_info["action"]
+    action = _BULK_ACTIONS.get(name)
+    if action is None:
+        raise web.HTTPNotFound()
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    share_ids = data.get("share_ids") if isinstance(data, dict) else None
+    filters = None
+    try:
+        if isinstance(data, dict) and not isinstance(share_ids, list):
+            filters = _share_filter(data.get("filter") or {})
+    except (AttributeError, TypeError, ValueError):
+        pass
+    if not isinstance(share_ids, list) and not (filters and any(filters.values())):
+        return web.json_response(
+            {
+                "success": False,
+                "error": "Give share_ids, or a filter with status, since, until or error",
+            },
+            status=400,
+        )
+
+    updated = 0
+    if isinstance(share_ids, list):
+        share_ids = [str(share_id) for share_id in share_ids]
+        for start in range(0, len(share_ids), SHARES_PAGE_MAX):
+            updated += await action(share_ids[start : start + SHARES_PAGE_MAX])
+    else:
+        # Updated rows move ahead of the cursor, so each match is seen once
+        after = None
+        while True:
+            page = await db_async.list_shares(
+                **filters, after=after, limit=SHARES_PAGE_MAX
+            )
+            if not page:
+                break
+            updated += await action([row["share_id"] for row in page])
+            after = (page[-1]["updated_at"], page[-1]["share_id"])
+
+    logger.info(f"Bulk {name} of {updated} shares via WebUI")
+    return web.json_response({"success": True, "updated": updated})
+
+
+@routes.get("/api/channels")
+async def channels(request):
+    """
+    Channels with their stored counters. With the listener in this process,
+    each also has "live": messages/min and duplicate ratio since it started.
+    """
+    rows = await db_async.list_channels()
+    listener = request.app["listener"]
+    if listener is not None:
+        stats = listener.get_channel_stats()
+        for row in rows:
+            row["live"] = stats.get(row["channel"])
+    return web.json_response(rows)
+
+
+@routes.post("/api/channels")
+async def add_channel(request):
+    data = await request.json()
+    channel = data.get("channel", "").strip()
+
+    if not channel:
+        return web.json_response(
+            {"success": False, "error": "Channel is required"}, status=400
+        )
+
+    added = await db_async.add_channel(channel)
+    logger.info(f"Channel {channel} added via WebUI")
+    return web.json_response({"success": True, "added": added})
+
+
+@routes.delete("/api/channels/{channel:.+}")
+async def remove_channel(request):
+    channel = request.match_info["channel"]
+
+    if not await db_async.remove_channel(channel):
+        return web.json_response(
+            {"success": False, "error": "Channel not found"}, status=404
+        )
+
+    logger.info(f"Channel {channel} removed via WebUI")
+    return web.json_response({"success": True})
 
-    data = request.json
+
+@routes.post("/api/telegram/send-code")
+async def send_telegram_code(request):
+    from app.config import TG_API_ID, TG_API_HASH
+
+    data = await request.json()
     phone = data.get("phone", "").strip()
 
     if not phone:
-        return jsonify({"success": False, "error": "Phone number is required"}), 400
+        return web.json_response(
+            {"success": False, "error": "Phone number is required"}, status=400
+        )
 
     if not TG_API_ID or not TG_API_HASH:
-        return jsonify(
-            {"success": False, "error": "Telegram API credentials not configured"}
-        ), 500
+        return web.json_response(
+            {"success": False, "error": "Telegram API credentials not configured"},
+            status=500,
+        )
 
     phone_hash = "".join(random.choices(string.ascii_letters + string.digits, k=16))
-    TG_SESSION_FILE = DATA_DIR / f"{TG_SESSION_NAME}.session"
-
-    async def send_code():
-        client = TelegramClient(str(TG_SESSION_FILE), TG_API_ID, TG_API_HASH)
-        try:
-            await client.connect()
-            result = await client.send_code_request(phone)
-            await client.disconnect()
-            telegram_login_sessions[phone_hash] = {
-                "phone": phone,
-                "phone_code_hash": result.phone_code_hash,
-            }
-            return {"success": True, "phone_hash": phone_hash}
-        except Exception as e:
-            logger.error(f"Failed to send code: {e}")
-            await client.disconnect()
-            return {"success": False, "error": str(e)}
-
-    result = asyncio.run(send_code())
-    return jsonify(result)
 
+    try:
+        client = await _get_telegram_client(request)
+        result = await client.send_code_request(phone)
+        telegram_login_sessions[phone_hash] = {
+            "phone": phone,
+            "phone_code_hash": result.phone_code_hash,
+        }
+        return web.json_response({"success": True, "phone_hash": phone_hash})
+    except Exception as e:
+        logger.error(f"Failed to send code: {e}")
+        return web.json_response({"success": False, "error": str(e)})
 
-@app.route("/api/telegram/sign-in", methods=["POST"])
-def sign_in_telegram():
-    from app.config import TG_API_ID, TG_API_HASH, TG_SESSION_NAME, DATA_DIR
 
-    data = request.json
+@routes.post("/api/telegram/sign-in")
+async def sign_in_telegram(request):
+    data = await request.json()
     phone_hash = data.get("phone_hash", "")
     code = data.get("code", "").strip()
     password = data.get("password", "")
 
     if phone_hash not in telegram_login_sessions:
-        return jsonify({"success": False, "error": "Invalid or expired session"}), 400
+        return web.json_response(
+            {"success": False, "error": "Invalid or expired session"}, status=400
+        )
 
     session = telegram_login_sessions[phone_hash]
-    TG_SESSION_FILE = DATA_DIR / f"{TG_SESSION_NAME}.session"
-
-    async def do_sign_in():
-        client = TelegramClient(str(TG_SESSION_FILE), TG_API_ID, TG_API_HASH)
-        try:
-            await client.connect()
-            if password:
-                await client.sign_in(password=password)
-            else:
-                await client.sign_in(
-                    session["phone"], code, phone_code_hash=session["phone_code_hash"]
-                )
-
-            await client.disconnect()
-
-            del telegram_login_sessions[phone_hash]
-
-            return {"success": True}
-        except SessionPasswordNeededError:
-            await client.disconnect()
-            return {
+
+    try:
+        client = await _get_telegram_client(request)
+        if password:
+            await client.sign_in(password=password)
+        else:
+            await client.sign_in(
+                session["phone"], code, phone_code_hash=session["phone_code_hash"]
+            )
+
+        del telegram_login_sessions[phone_hash]
+
+        # Let a listener waiting for authorization start right away
+        listener = request.app["listener"]
+        if listener is not None:
+            listener.authorized.set()
+
+        return web.json_response({"success": True})
+    except SessionPasswordNeededError:
+        return web.json_response(
+            {
                 "success": False,
                 "error": "Two-factor authentication enabled",
                 "requires_password": True,
             }
-        except Exception as e:
-            logger.error(f"Failed to sign in: {e}")
-            await client.disconnect()
-            return {"success": False, "error": str(e)}
-
-    result = asyncio.run(do_sign_in())
-    return jsonify(result)
+        )
+    except Exception as e:
+        logger.error(f"Failed to sign in: {e}")
+        return web.json_response({"success": False, "error": str(e)})
 
 
 def update_env_file(updates):
     env_content = ENV_FILE.read_text()
 
     for key, value in updates.items():
-        import re
-
         pattern = f"^{key}=.*$"
         replacement = f"{key}={value}"
 
@@ -183,9 +540,56 @@ def update_env_file(updates):
     ENV_FILE.write_text(env_content)
 
 
+async def _close_telegram_client(app):
+    client = app.get("telegram_client")
+    if client is not None:
+        await client.disconnect()
+
+
+def create_app(
+    listener=None, settings=None, retention=None, worker=None
+) -> web.Application:
+    """
+    Build the WebUI app.
+
+    With a listener, Telegram login and status go through its client instead
+    of opening a second connection on the same session file. With the app's
+    LiveSettings, setting changes are applied as soon as they are saved.
+    With its RetentionJob, /api/retention also reports and triggers passes.
+    With the in-process QuarkWorker, /api/limits and /api/latency report on it.
+    """
+    app = web.Application()
+    app["listener"] = listener
+    app["settings"] = settings
+    app["retention"] = retention
+    app["worker"] = worker
+    app.add_routes(routes)
+    app.on_cleanup.append(_close_telegram_client)
+    return app
+
+
+async def start_web_server(
+    host="0.0.0.0",
+    port=8080,
+    listener=None,
+    settings=None,
+    retention=None,
+    worker=None,
+) -> web.AppRunner:
+    """Serve the WebUI on the running loop; cleanup() the returned runner to stop."""
+    runner = web.AppRunner(
+        create_app(listener, settings, retention, worker), access_log=None
+    )
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Starting WebUI on http://{host}:{port}")
+    return runner
+
+
 def run_web_server(host="0.0.0.0", port=8080):
+    """Standalone WebUI, without listener or worker."""
     logger.info(f"Starting WebUI on http://{host}:{port}")
-    app.run(host=host, port=port, debug=False)
+    web.run_app(create_app(), host=host, port=port, print=None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+"""
+Synthetic Telegram NewMessage events for driving TelegramListener offline.
+
+Messages are built as real Telethon Message objects, so on_new_message
+runs its normal extraction and ingestion path. A share of them carry no
+link, and some repost a link already seen, like busy channels do.
+"""
+
+import asyncio
+import random
+import string
+import time
+from typing import Iterator
+
+from telethon.tl.custom import Message
+
+BENCH_CHAT_ID = -1000000000777
+
+_TEMPLATES = (
+    "【资源】合集 {n}\n链接：https://pan.quark.cn/s/{share_id}",
+    "https://pan.quark.cn/s/{share_id} 提取码：{passcode}",
+    "更新第 {n} 集 👉 https://pan.quark.cn/s/{share_id}?pwd={passcode}",
+    "夸克网盘 pan.quark.cn/s/{share_id} #每日更新",
+)
+_NO_LINK = (
+    "今日更新预告",
+    "群公告：请勿发广告",
+    "https://example.com/post/{n}",
+)
+
+
+class SyntheticEvent:
+    """The parts of events.NewMessage.Event that on_new_message reads."""
+
+    def __init__(self, message: Message, chat_id: int):
+        self.message = message
+        self.chat_id = chat_id
+
+
+def synthetic_events(
+    count: int,
+    chat_id: int = BENCH_CHAT_ID,
+    link_ratio: float = 0.8,
+    duplicate_ratio: float = 0.1,
+    seed: int = 0,
+) -> Iterator[SyntheticEvent]:
+    """
+    count events with increasing message ids.
+
+    link_ratio of them carry a Quark link; of those, duplicate_ratio repost
+    a share id used earlier in the stream.
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    seen: list[str] = []
+
+    for n in range(1, count + 1):
+        if rng.random() >= link_ratio:
+            text = rng.choice(_NO_LINK).format(n=n)
+        else:
+            if seen and rng.random() < duplicate_ratio:
+                share_id = rng.choice(seen)
+            else:
+                share_id = "".join(rng.choices(alphabet, k=12))
+                seen.append(share_id)
+            text = rng.choice(_TEMPLATES).format(
+                n=n,
+                share_id=share_id,
+                passcode="".join(rng.choices(alphabet, k=4)),
+            )
+        yield SyntheticEvent(Message(id=n, peer_id=None, message=text), chat_id)
+
+
+async def replay(handler, events, rate: float = 0.0) -> float:
+    """
+    Feed events to handler (e.g. listener.on_new_message); returns seconds taken.
+
+    Like Telethon, each event is handled in its own task. With a rate, events
+    are paced to that many per second, otherwise sent as fast as possible.
+    """
+    started = time.perf_counter()
+    tasks = []
+    for i, event in enumerate(events):
+        if rate > 0:
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(handler(event)))
+        if not rate and i % 100 == 99:
+            # Let handlers run instead of queueing every event up front
+            await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started
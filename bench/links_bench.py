@@ -0,0 +1,84 @@
+"""
+Benchmark link extraction over the message corpus.
+
+    python -m bench.links_bench [--repeat N]
+
+Each corpus line is a message shape seen in real channels: text or caption,
+optional text-link entities and inline URL buttons, and the expected
+(share_id, passcode) pairs. The same corpus backs app/telegram/links_test.py.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from telethon.tl.custom import Message
+from telethon.tl import types
+
+from app.telegram.links import extract_links
+
+CORPUS_PATH = Path(__file__).parent / "link_corpus.jsonl"
+
+
+def _url_button(url: str):
+    # The URL button type changed between Telegram layers
+    if hasattr(types, "KeyboardButtonUrl"):
+        return types.KeyboardButtonUrl("open", url)
+    return types.KeyboardButton("open", types.InlineButtonTypeUrl(url))
+
+
+def load_corpus() -> list[dict]:
+    """Corpus records, each with a Telethon "message" built from it."""
+    records = []
+    for line in CORPUS_PATH.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        entities = [
+            types.MessageEntityTextUrl(
+                entity["offset"], entity["length"], entity["url"]
+            )
+            for entity in record.get("entities", [])
+        ]
+        markup = None
+        if record.get("buttons"):
+            markup = types.ReplyInlineMarkup(
+                [
+                    types.KeyboardButtonRow([_url_button(url) for url in row])
+                    for row in record["buttons"]
+                ]
+            )
+        record["message"] = Message(
+            id=len(records) + 1,
+            peer_id=None,
+            message=record["text"],
+            entities=entities or None,
+            reply_markup=markup,
+        )
+        records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.links_bench")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    messages = [record["message"] for record in load_corpus()]
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for message in messages:
+            extract_links(message)
+    elapsed = time.perf_counter() - started
+
+    total = args.repeat * len(messages)
+    print(
+        f"{total} messages in {elapsed:.2f}s: "
+        f"{total / elapsed:,.0f} msg/s, {elapsed / total * 1e6:.2f} us/msg"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Local stand-in for the Quark drive API.
+
+    python -m bench.mock_quark [--port 8765] [--profile realistic]
+
+Implements what QuarkClient calls: sharepage/token, sharepage/detail,
+sharepage/save, task, file/sort and file (create folder). Every response
+waits for the profile's latency; a fraction fail with HTTP 500 (errors) or
+HTTP 429 (throttling). A save task finishes task_delay seconds after the
+save. Point QUARK_BASE_URL_PC and QUARK_BASE_URL_APP at the server to use
+it. GET /stats returns request counts per endpoint and outcome.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+
+class Profile:
+    """Latency in seconds; error_rate and throttle_rate are per request."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        task_delay: float = 0.0,
+        files_per_share: int = 1,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.task_delay = task_delay
+        self.files_per_share = files_per_share
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+PROFILES = {
+    "fast": Profile(),
+    "realistic": Profile(
+        latency=0.08,
+        jitter=0.04,
+        error_rate=0.01,
+        throttle_rate=0.01,
+        task_delay=0.5,
+    ),
+    "flaky": Profile(latency=0.08, jitter=0.04, error_rate=0.1, task_delay=0.5),
+    "throttled": Profile(latency=0.08, jitter=0.04, throttle_rate=0.2, task_delay=0.5),
+}
+
+
+def _ok(data: dict, **extra) -> web.Response:
+    return web.json_response({"status": 200, "code": 0, "data": data, **extra})
+
+
+def _share_files(share_id: str, count: int) -> list[dict]:
+    """The same files for a share id every time, so content dedup sees repeats."""
+    files = []
+    for i in range(count):
+        digest = hashlib.sha1(f"{share_id}/{i}".encode()).hexdigest()
+        files.append(
+            {
+                "fid": digest[:32],
+                "share_fid_token": digest[8:40],
+                "file_name": f"{share_id}-{i}.mkv",
+                "size": int(digest[:8], 16) % 4_000_000_000,
+                "dir": False,
+            }
+        )
+    return files
+
+
+class MockQuark:
+    def __init__(self, profile: Profile, seed: int = 0):
+        self.profile = profile
+        self.random = random.Random(seed)
+        # task_id -> (finishes_at, saved fids)
+        self.tasks: dict[str, tuple[float, list[str]]] = {}
+        self.stats: Counter = Counter()
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        name = request.path.rsplit("/", 1)[-1] or "root"
+        if name == "stats":
+            return await handler(request)
+
+        profile = self.profile
+        delay = profile.latency + self.random.uniform(-1, 1) * profile.jitter
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = self.random.random()
+        if roll < profile.error_rate:
+            self.stats[f"{name} 500"] += 1
+            raise web.HTTPInternalServerError()
+        if roll < profile.error_rate + profile.throttle_rate:
+            self.stats[f"{name} 429"] += 1
+            raise web.HTTPTooManyRequests()
+
+        self.stats[f"{name} ok"] += 1
+        return await handler(request)
+
+    async def root(self, request):
+        return web.Response()
+
+    async def token(self, request):
+        data = await request.json()
+        return _ok({"stoken": f"st-{data['pwd_id']}"})
+
+    async def detail(self, request):
+        files = _share_files(request.query["pwd_id"], self.profile.files_per_share)
+        return _ok({"list": files}, metadata={"_total": len(files)})
+
+    async def save(self, request):
+        data = await request.json()
+        fids = data.get("fid_list") or [
+            file["fid"]
+            for file in _share_files(data["pwd_id"], self.profile.files_per_share)
+        ]
+        task_id = uuid.uuid4().hex
+        self.tasks[task_id] = (time.monotonic() + self.profile.task_delay, fids)
+        return _ok({"task_id": task_id})
+
+    async def task(self, request):
+        task = self.tasks.get(request.query.get("task_id"))
+        if task is None:
+            return web.json_response(
+                {"status": 404, "code": 1, "message": "task not found"}
+            )
+
+        finishes_at, fids = task
+        if time.monotonic() < finishes_at:
+            return _ok({"status": 1})
+        return _ok({"status": 2, "save_as": {"save_as_top_fids": fids}})
+
+    async def file_sort(self, request):
+        return _ok({"list": []}, metadata={"_total": 0})
+
+    async def create_folder(self, request):
+        return _ok({"fid": uuid.uuid4().hex})
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+
+def create_app(profile: Profile, seed: int = 0) -> web.Application:
+    mock = MockQuark(profile, seed)
+    app = web.Application(middlewares=[mock.middleware])
+    app["mock"] = mock
+    app.add_routes(
+        [
+            web.get("/", mock.root),
+            web.post("/1/clouddrive/share/sharepage/token", mock.token),
+            web.get("/1/clouddrive/share/sharepage/detail", mock.detail),
+            web.post("/1/clouddrive/share/sharepage/save", mock.save),
+            web.get("/1/clouddrive/task", mock.task),
+            web.get("/1/clouddrive/file/sort", mock.file_sort),
+            web.post("/1/clouddrive/file", mock.create_folder),
+            web.get("/stats", mock.get_stats),
+        ]
+    )
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.mock_quark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", choices=PROFILES, default="realistic")
+    parser.add_argument("--seed", type=int, default=0)
+    # Override single fields of the profile
+    for field in Profile().as_dict():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=float)
+    args = parser.parse_args()
+
+    profile = Profile(**PROFILES[args.profile].as_dict())
+    for field in profile.as_dict():
+        if getattr(args, field) is not None:
+            setattr(profile, field, type(getattr(profile, field))(getattr(args, field)))
+
+    print(
+        f"mock Quark API on http://{args.host}:{args.port} {profile.as_dict()}",
+        flush=True,
+    )
+    web.run_app(
+        create_app(profile, args.seed),
+        host=args.host,
+        port=args.port,
+        print=None,
+        access_log=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+End-to-end benchmark of the listener, DB layer and worker, fully offline.
+
+    python -m bench.pipeline_bench [--concurrency 1,4,16] [--messages 2000]
+                                   [--profile realistic] [--output results.json]
+
+Starts bench.mock_quark in a subprocess, then runs each concurrency setting
+in a fresh process with its own scratch database, so peak RSS is measured
+per setting. Each run:
+
+1. replays synthetic NewMessage events (bench.events) into
+   TelegramListener.on_new_message while a QuarkWorker saves the shares
+   against the mock API, until the queue is drained;
+2. hammers the DB layer through app.db_async with as many concurrent
+   coroutines as the concurrency setting (ingest writes and status reads).
+
+Rate limits are off and retry/tracker delays shortened unless
+--rate-limits is given, so the numbers reflect the code rather than the
+limits. The worker runs at a fixed concurrency unless --adaptive is given.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.events import BENCH_CHAT_ID, replay, synthetic_events
+from bench.mock_quark import PROFILES
+
+# Env for a benchmark child; app.config reads it at import
+_BENCH_ENV = {
+    "QUARK_COOKIE": "bench=1",
+    "TARGET_FOLDER_NAME": "",
+    "TG_CHANNEL": "@bench",
+    "NOTIFY_DIGEST_INTERVAL": "0",
+    "TRACKER_INITIAL_DELAY": "0.1",
+    "TRACKER_POLL_INTERVAL": "0.1",
+    "TRACKER_MAX_DELAY": "1",
+    "WORKER_RETRY_BASE_DELAY": "0.2",
+    "WORKER_RETRY_MAX_DELAY": "2",
+}
+_NO_RATE_LIMITS = {
+    "QUARK_RATE_TOKEN": "0",
+    "QUARK_RATE_SAVE": "0",
+    "QUARK_RATE_LIST": "0",
+    "QUARK_RATE_TASK": "0",
+}
+
+
+def _percentile(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class _NullNotifier:
+    def record(self, event: str, count: int = 1):
+        pass
+
+    def notify(self, message: str):
+        pass
+
+    def send_cookie_expired_alert(self, error_message: str = ""):
+        pass
+
+
+async def _drained(timeout: float) -> bool:
+    from app import db_async
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        counts = await db_async.get_status_counts()
+        if not any(counts.get(s) for s in ("pending", "processing", "submitted")):
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def bench_pipeline(args) -> dict:
+    from app.settings import LiveSettings
+    from app.tasks.worker import QuarkWorker
+    from app.telegram.listener import TelegramListener
+    from app import db_async
+
+    # No .env to watch: the run uses exactly the env it was started with
+    settings = LiveSettings(env_file=Path(tempfile.mkdtemp()) / ".env")
+    worker = QuarkWorker(notifier=_NullNotifier(), settings=settings)
+    worker_task = asyncio.create_task(worker.run())
+    # Let the worker register for new shares and warm up its connections
+    while not worker.tracker.running and not worker_task.done():
+        await asyncio.sleep(0.01)
+
+    listener = TelegramListener()
+    listener.peers = {BENCH_CHAT_ID: "@bench"}
+
+    started = time.perf_counter()
+    ingest_seconds = await replay(
+        listener.on_new_message,
+        synthetic_events(args.messages, duplicate_ratio=args.duplicates),
+        rate=args.rate,
+    )
+    drained = await _drained(args.timeout)
+    elapsed = time.perf_counter() - started
+
+    worker.stop()
+    await worker_task
+
+    counts = await db_async.get_status_counts()
+    latency = worker.get_latency_stats()
+    return {
+        "messages": args.messages,
+        "messages_per_s": args.messages / ingest_seconds,
+        "shares": sum(counts.values()),
+        "saved": counts.get("saved", 0),
+        "failed": counts.get("failed", 0),
+        "drained": drained,
+        "elapsed_s": elapsed,
+        "saves_per_s": counts.get("saved", 0) / elapsed,
+        "latency_p50_s": latency.get("p50", 0.0),
+        "latency_p99_s": latency.get("p99", 0.0),
+        "concurrency_limit": worker.max_in_flight,
+    }
+
+
+async def bench_db(concurrency: int, ops: int) -> dict:
+    """Concurrent ingest writes and status reads through app.db_async."""
+    from app import db_async
+
+    write_ms: list[float] = []
+    read_ms: list[float] = []
+
+    async def client(n: int):
+        for i in range(n * ops, (n + 1) * ops):
+            share_id = f"dbbench{i}"
+            started = time.perf_counter()
+            await db_async.ingest_message("db-bench", i, [(share_id, "")])
+            write_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await db_async.get_share_status(share_id)
+            read_ms.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "db_ops_per_s": (len(write_ms) + len(read_ms)) / elapsed,
+        "db_write_p50_ms": _percentile(write_ms, 0.50),
+        "db_write_p99_ms": _percentile(write_ms, 0.99),
+        "db_read_p50_ms": _percentile(read_ms, 0.50),
+        "db_read_p99_ms": _percentile(read_ms, 0.99),
+    }
+
+
+async def run_one(args) -> dict:
+    from app import db_async
+    from app.db import close_db, init_db
+
+    init_db()
+    try:
+        result = {"concurrency": args.run}
+        result.update(await bench_pipeline(args))
+        result.update(await bench_db(args.run, args.db_ops))
+    finally:
+        db_async.shutdown()
+        close_db()
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"mock Quark API did not start on port {port}")
+
+
+def _child_env(args, concurrency: int, mock_url: str, db_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update(_BENCH_ENV)
+    if not args.rate_limits:
+        env.update(_NO_RATE_LIMITS)
+    env.update(
+        {
+            "DB_PATH": os.path.join(db_dir, "bench.db"),
+            "QUARK_BASE_URL_PC": mock_url,
+            "QUARK_BASE_URL_APP": mock_url,
+            "WORKER_CONCURRENT_TASKS": str(concurrency),
+            "WORKER_MIN_CONCURRENCY": "1" if args.adaptive else str(concurrency),
+            "TRACE_ENABLED": "false" if args.no_trace else "true",
+        }
+    )
+    return env
+
+
+def _child_args(args) -> list[str]:
+    return [
+        f"--messages={args.messages}",
+        f"--duplicates={args.duplicates}",
+        f"--rate={args.rate}",
+        f"--db-ops={args.db_ops}",
+        f"--timeout={args.timeout}",
+    ] + (["--verbose"] if args.verbose else [])
+
+
+def _print_table(results: list[dict]):
+    columns = [
+        ("concurrency", "conc", "{:d}"),
+        ("messages_per_s", "msg/s", "{:,.0f}"),
+        ("saves_per_s", "saves/s", "{:,.1f}"),
+        ("latency_p50_s", "p50 s", "{:.2f}"),
+        ("latency_p99_s", "p99 s", "{:.2f}"),
+        ("failed", "failed", "{:d}"),
+        ("db_ops_per_s", "db ops/s", "{:,.0f}"),
+        ("db_write_p99_ms", "db w p99 ms", "{:.1f}"),
+        ("db_read_p99_ms", "db r p99 ms", "{:.1f}"),
+        ("peak_rss_mb", "RSS MB", "{:.0f}"),
+    ]
+    rows = [[title for _, title, _ in columns]]
+    for result in results:
+        rows.append([fmt.format(result[key]) for key, _, fmt in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.pipeline_bench")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument(
+        "--duplicates", type=float, default=0.1, help="share of reposted links"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0, help="messages/s to replay (0 = flat out)"
+    )
+    parser.add_argument("--db-ops", type=int, default=500, help="per DB client")
+    parser.add_argument("--profile", choices=PROFILES, default="realistic")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--rate-limits", action="store_true")
+    parser.add_argument("--adaptive", action="store_true")
+    parser.add_argument("--no-trace", action="store_true")
+    parser.add_argument(
+        "--verbose", action="store_true", help="show the app's log output"
+    )
+    parser.add_argument("--output", help="also write the results as JSON")
+    # Internal: run one setting in this process and print its result
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        if not args.verbose:
+            # The profiles inject errors; their log lines are expected noise
+            logging.disable(logging.CRITICAL)
+        print(json.dumps(asyncio.run(run_one(args))))
+        return
+
+    port = _free_port()
+    mock_url = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "bench.mock_quark"]
+        + ["--port", str(port), "--profile", args.profile],
+        stdout=subprocess.DEVNULL,
+    )
+    results = []
+    try:
+        _wait_for_port(port)
+        for concurrency in [int(n) for n in args.concurrency.split(",")]:
+            with tempfile.TemporaryDirectory(prefix="quarkflow-bench-") as db_dir:
+                child = subprocess.run(
+                    [sys.executable, "-m", "bench.pipeline_bench"]
+                    + ["--run", str(concurrency)]
+                    + _child_args(args),
+                    env=_child_env(args, concurrency, mock_url, db_dir),
+                    stdout=subprocess.PIPE,
+                    text=True,
+                    check=True,
+                )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            if not result["drained"]:
+                print(f"warning: queue not drained at concurrency {concurrency}")
+            results.append(result)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    print(f"profile={args.profile} messages={args.messages}")
+    _print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()